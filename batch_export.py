@@ -0,0 +1,156 @@
+"""
+命令行批量导出：不需要打开页面登录，直接生成报表
+
+读取与页面上传相同列的款式文件（Excel/CSV/Parquet），或各账号已保存的款式，
+可选先按生产班组连续排产，再把总览Excel报表、部门Excel报表ZIP、生产流程图ZIP
+和部门时间线图ZIP写入目标目录（每个款式文件或账号一个子目录，重名时加 _2、_3 等后缀）。
+各导出在独立进程中并行生成（matplotlib 的 pyplot 不能在线程间共享），
+内容未变化的导出直接使用导出缓存，适合由 cron 每晚为所有账号重新生成计划。
+
+需要在应用目录下运行（与页面共用 user_data 中的工厂日历、账号数据和导出缓存）。
+
+用法:
+    python batch_export.py season.xlsx --output exports
+    python batch_export.py season.csv other.parquet --output exports --sequencing 按生产顺序衔接 --workers 4
+    python batch_export.py --all-accounts --output exports --sequencing 按生产顺序衔接
+    python batch_export.py --all-accounts --output exports --types excel,department_excel
+"""
+import os
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import argparse
+import pathlib
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import production_test as engine
+
+
+def load_sources(args):
+    """返回 [(名称, 款式列表)]，款式文件有错误时打印错误并跳过，返回值第二项为是否有来源被跳过"""
+    sources = []
+    skipped = False
+    for file in args.files:
+        path = pathlib.Path(file)
+        try:
+            styles, errors = engine.import_style_file(path)
+        except (OSError, ValueError) as e:
+            print(f"[跳过] {path}: {e}", file=sys.stderr)
+            skipped = True
+            continue
+        if errors:
+            print(f"[跳过] {path}: 发现 {len(errors)} 处错误", file=sys.stderr)
+            for error in errors[:args.max_reports]:
+                print(f"    第{error['行号']}行 款号={error['款号']} {error['原因']}", file=sys.stderr)
+            skipped = True
+            continue
+        sources.append((path.stem, styles))
+    if args.all_accounts:
+        for account_id in engine.VALID_CREDENTIALS:
+            if not (engine.DATA_DIR / f"{account_id}.json").exists():
+                continue
+            styles = engine.load_user_data(account_id)["all_styles"]
+            if styles:
+                sources.append((account_id, styles))
+    return unique_source_names(sources), skipped
+
+
+def unique_source_names(sources):
+    """同名的款式文件或账号写入同一目录时会互相覆盖，重名的来源依次加上 _2、_3 等后缀"""
+    used = set()
+    renamed = []
+    for name, styles in sources:
+        unique_name = name
+        suffix = 2
+        while unique_name in used:
+            unique_name = f"{name}_{suffix}"
+            suffix += 1
+        if unique_name != name:
+            print(f"[重名] {name} 输出到 {unique_name}", file=sys.stderr)
+        used.add(unique_name)
+        renamed.append((unique_name, styles))
+    return renamed
+
+
+def run_export(name, export_type, styles, target):
+    """在工作进程中生成一个导出并写入目标路径，返回 (导出类型, 目标路径, 耗时)"""
+    # 工作进程中的耗时记录归属款式文件或账号，进程结束前由本进程写入性能日志
+    engine.PERF_CONTEXT.user = name
+    started = time.perf_counter()
+    try:
+        result = engine.cached_export(export_type, styles)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(result, bytes):
+            target.write_bytes(result)
+        else:
+            try:
+                shutil.copyfile(result, target)
+            except FileNotFoundError:
+                # 缓存文件在复制前被其他进程清理，不经过缓存重新生成一次
+                with engine.EXPORT_TYPES[export_type]["func"](styles) as buffer, open(target, 'wb') as f:
+                    shutil.copyfileobj(buffer, f)
+        return export_type, target, time.perf_counter() - started
+    finally:
+        engine.flush_perf_log()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="命令行批量生成排产报表")
+    parser.add_argument("files", nargs="*", help="款式文件（xlsx/xls/csv/parquet），列与页面上传相同")
+    parser.add_argument("--all-accounts", action="store_true", help="同时导出所有账号已保存的款式")
+    parser.add_argument("--output", required=True, help="输出目录，每个款式文件或账号一个子目录")
+    parser.add_argument("--sequencing", choices=engine.SEQUENCING_METHODS, default=None,
+                        help="导出前按生产班组连续排产的方式，不指定时使用款式自身的缝纫开始时间")
+    parser.add_argument("--line-capacity", type=int, default=1, help="按产线产能排产时每个生产班组的产线数")
+    parser.add_argument("--types", default=",".join(engine.EXPORT_TYPES),
+                        help=f"导出类型，逗号分隔，可选 {','.join(engine.EXPORT_TYPES)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--max-reports", type=int, default=20, help="每个文件最多打印的错误行数")
+    args = parser.parse_args(argv)
+
+    export_types = [t for t in args.types.split(",") if t]
+    invalid_types = [t for t in export_types if t not in engine.EXPORT_TYPES]
+    if invalid_types:
+        parser.error(f"未知的导出类型: {', '.join(invalid_types)}")
+    if not args.files and not args.all_accounts:
+        parser.error("请指定款式文件或 --all-accounts")
+
+    sources, skipped = load_sources(args)
+    output = pathlib.Path(args.output)
+    started = time.perf_counter()
+    failed = 0
+    # 先写入已记录的耗时，工作进程（fork）不会继承并重复写入这些记录
+    engine.flush_perf_log()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {}
+        for name, styles in sources:
+            if args.sequencing:
+                try:
+                    styles = engine.sequence_styles(styles, args.sequencing, line_capacity=args.line_capacity)
+                except ValueError as e:
+                    # 例如手动调整后缝纫结束早于缝纫开始，无法按产线产能排产
+                    print(f"[跳过] {name}: {e}", file=sys.stderr)
+                    skipped = True
+                    continue
+            for export_type in export_types:
+                target = output / name / engine.EXPORT_TYPES[export_type]["file_name"]
+                futures[executor.submit(run_export, name, export_type, styles, target)] = (name, export_type)
+        for future in as_completed(futures):
+            name, export_type = futures[future]
+            try:
+                _, target, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[失败] {name} {engine.EXPORT_TYPES[export_type]['label']}: {e}", file=sys.stderr)
+                continue
+            print(f"{name:<20} {engine.EXPORT_TYPES[export_type]['label']:<12} {elapsed:>8.2f}s  -> {target}")
+    print(f"\n{len(sources)} 个款式来源，{len(futures) - failed}/{len(futures)} 个导出完成，"
+          f"耗时 {time.perf_counter() - started:.2f}s")
+    engine.flush_perf_log()
+    return 1 if failed or skipped else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
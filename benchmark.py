@@ -0,0 +1,209 @@
+"""
+排产与导出热点的基准测试
+
+生成可复现的合成款式列表（覆盖三种排产模式、全部工序和确认用时、
+多个生产班组/生产顺序组合），分别统计排产计算、生产班组连续排产、产线产能排产、
+Excel报表、部门Excel报表、部门时间线图和生产流程图ZIP的耗时，
+结果保存为JSON，便于在不同提交之间对比。
+
+用法:
+    python benchmark.py
+    python benchmark.py --sizes 100,1000 --repeat 3
+    python benchmark.py --compare benchmark_results/<旧结果>.json
+"""
+import os
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import argparse
+import copy
+import json
+import pathlib
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import production_test as engine
+
+RESULTS_DIR = pathlib.Path("benchmark_results")
+
+PRODUCTION_MODES = ["龙兵", "贝贝", "补数"]
+
+ENGINES = {
+    "calculate_schedule": "龙兵",
+    "calculate_schedule_beibei": "贝贝",
+    "calculate_schedule_bushu": "补数",
+}
+
+# 图表导出单张图的高度随款式数增长（dpi=300 时内存占用很大），
+# 超出该数量的规模只取前N个款式计时
+DEFAULT_MAX_PLOT_STYLES = 10
+
+
+def generate_styles(count, seed=0, groups=None):
+    """生成覆盖所有排产模式、工序和确认用时的合成款式列表"""
+    rng = random.Random(seed)
+    combos = [
+        (mode, process_type, cycle)
+        for mode in PRODUCTION_MODES
+        for process_type in engine.get_process_type_options(mode)
+        for cycle in engine.get_cycle_options(mode)
+    ]
+    if groups is None:
+        groups = max(1, count // 20)
+    base_date = date(2025, 3, 3)
+    styles = []
+    for i in range(count):
+        mode, process_type, cycle = combos[i % len(combos)]
+        order_quantity = rng.choice([300, 500, 800, 1000, 1200, 2000, 3500, 5000])
+        style = {
+            "style_number": f"BM{i:05d}",
+            "sewing_start_date": base_date + timedelta(days=rng.randrange(0, 120)),
+            "start_time_period": rng.choice(["上午", "下午"]),
+            "process_type": process_type,
+            "cycle": cycle,
+            "order_quantity": order_quantity,
+            "daily_production": rng.choice([100, 150, 200, 250, 300, 400, 600]),
+            "production_group": f"A{rng.randrange(1, groups + 1)}" if rng.random() < 0.9 else "",
+            "production_order": rng.randrange(1, 6),
+            "company": rng.choice(["客户A", "客户B", "客户C"]),
+            "production_mode": mode,
+        }
+        if rng.random() < 0.5:
+            style["delivery_date"] = style["sewing_start_date"] + timedelta(days=rng.randrange(10, 60))
+        styles.append(style)
+    return styles
+
+
+def run_engine(name, styles):
+    """直接调用指定的排产引擎计算对应模式的所有款式"""
+    func = getattr(engine, name)
+    for style in styles:
+        start = datetime.combine(style["sewing_start_date"], datetime.min.time())
+        func(start, style["process_type"], style["cycle"], style["order_quantity"],
+             style["daily_production"], style["start_time_period"])
+
+
+def run_export(func, styles):
+    """运行导出函数，返回导出内容的字节数；每次使用空的导出缓存，图表全部重新绘制"""
+    cache_dir = engine.EXPORT_CACHE_DIR
+    with tempfile.TemporaryDirectory() as temp_cache_dir:
+        engine.EXPORT_CACHE_DIR = pathlib.Path(temp_cache_dir)
+        try:
+            with func(styles) as buffer:
+                return buffer.seek(0, os.SEEK_END)
+        finally:
+            engine.EXPORT_CACHE_DIR = cache_dir
+
+
+def time_case(func, styles, repeat):
+    """重复运行并返回每次耗时（每次使用款式列表的副本，复制不计入耗时）"""
+    timings = []
+    for _ in range(repeat):
+        data = copy.deepcopy(styles)
+        started = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def build_cases(max_plot_styles):
+    cases = []
+    for name, mode in ENGINES.items():
+        cases.append((name, lambda styles, name=name, mode=mode:
+                      run_engine(name, [s for s in styles if s["production_mode"] == mode]), None))
+    cases.append(("calculate_style_schedule", lambda styles: [engine.calculate_style_schedule(s) for s in styles], None))
+    cases.append(("rearrange_styles_by_production_group", engine.rearrange_styles_by_production_group, None))
+    cases.append(("schedule_production_lines", lambda styles: engine.schedule_production_lines(styles, 3), None))
+    cases.append(("generate_excel_report", lambda styles: run_export(engine.generate_excel_report, styles), None))
+    cases.append(("generate_department_wise_excel", lambda styles: run_export(engine.generate_department_wise_excel, styles), None))
+    cases.append(("generate_department_wise_plots", lambda styles: run_export(engine.generate_department_wise_plots, styles), max_plot_styles))
+    cases.append(("generate_timeline_zip", lambda styles: run_export(engine.generate_timeline_zip, styles), max_plot_styles))
+    return cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    """打印与历史结果的耗时对比"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r["name"], r["size"]): r for r in baseline["results"]}
+    print(f"\n对比 {baseline_path} (commit {baseline.get('commit')})")
+    for r in results:
+        old = previous.get((r["name"], r["size"]))
+        if old is None:
+            continue
+        ratio = r["best_s"] / old["best_s"] if old["best_s"] else float("inf")
+        print(f"{r['name']:<40} {r['size']:>6}  {old['best_s']:>9.4f}s -> {r['best_s']:>9.4f}s  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排产与导出热点基准测试")
+    parser.add_argument("--sizes", default="100,1000,10000", help="款式数量，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数，取最快值")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default="", help="只运行名称包含这些关键字的用例，逗号分隔")
+    parser.add_argument("--max-plot-styles", type=int, default=DEFAULT_MAX_PLOT_STYLES,
+                        help="图表导出用例最多使用的款式数量")
+    parser.add_argument("--output", default=None, help="结果JSON路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果JSON对比")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    only = [s for s in args.only.split(",") if s]
+    results = []
+    for size in sizes:
+        styles = generate_styles(size, seed=args.seed)
+        for name, func, max_styles in build_cases(args.max_plot_styles):
+            if only and not any(keyword in name for keyword in only):
+                continue
+            case_styles = styles if max_styles is None else styles[:max_styles]
+            repeat = 1 if max_styles is not None else args.repeat
+            timings = time_case(func, case_styles, repeat)
+            best = min(timings)
+            results.append({
+                "name": name,
+                "size": size,
+                "styles_used": len(case_styles),
+                "repeat": repeat,
+                "best_s": round(best, 6),
+                "mean_s": round(sum(timings) / len(timings), 6),
+                "per_style_us": round(best / len(case_styles) * 1e6, 3),
+            })
+            note = f"  (前{len(case_styles)}个款式)" if len(case_styles) < size else ""
+            print(f"{name:<40} {size:>6}  {best:>9.4f}s{note}")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        output = pathlib.Path(args.output)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
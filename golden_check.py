@@ -0,0 +1,267 @@
+"""
+排产引擎的金标准输出对比
+
+穷举 (排产模式, 确认用时, 工序, 缝纫开始时间) 的全部组合，在一组缝纫开始日期
+和订单数量/日产量组合上运行 calculate_schedule、calculate_schedule_longbing、
+calculate_schedule_beibei 和 calculate_schedule_bushu，把结果（每个时间点相对
+缝纫开始日期的偏移、备注以及各部门/工序的顺序）记录到压缩的金标准文件中。
+之后任何优化过的引擎都必须与金标准逐项一致；check 同时校验只计算缝纫结束的
+calculate_sewing_windows 和按依赖图批量计算的 calculate_style_schedules。
+
+金标准文件只保存网格定义和每个用例对应的输出编号，相同的输出只保存一次。
+
+用法:
+    python golden_check.py record
+    python golden_check.py check
+    python golden_check.py check --impl calculate_schedule=my_module:fast_schedule
+"""
+import argparse
+import gzip
+import importlib
+import json
+import pathlib
+import sys
+import time
+from datetime import date, datetime
+
+import production_test as engine
+
+GOLDEN_PATH = pathlib.Path(__file__).resolve().parent / "golden" / "schedule_golden.json.gz"
+
+ENGINE_MODES = {
+    "calculate_schedule": "龙兵",
+    "calculate_schedule_longbing": "龙兵",
+    "calculate_schedule_beibei": "贝贝",
+    "calculate_schedule_bushu": "补数",
+}
+
+START_TIME_PERIODS = ["上午", "下午"]
+
+# 覆盖闰年、月末、年末等日期边界
+START_DATES = [
+    date(2024, 1, 1), date(2024, 2, 28), date(2024, 2, 29), date(2024, 3, 1),
+    date(2024, 12, 31), date(2025, 1, 1), date(2025, 2, 28), date(2025, 3, 3),
+    date(2025, 6, 15), date(2025, 12, 29),
+]
+
+# 缝纫天数 = 订单数量 * 1.05 / 日产量，覆盖整数、半天附近和极端比例
+ORDER_QUANTITIES = [1, 95, 100, 190, 200, 286, 300, 476, 500, 1000, 1428, 2000, 4761, 10000]
+DAILY_PRODUCTIONS = [1, 50, 100, 300, 1000]
+
+
+def build_grid():
+    """生成金标准使用的用例网格"""
+    combos = {}
+    for name, mode in ENGINE_MODES.items():
+        # calculate_schedule_longbing 没有确认用时参数
+        cycles = [None] if name == "calculate_schedule_longbing" else engine.get_cycle_options(mode)
+        combos[name] = [[process_type, cycle]
+                        for process_type in engine.get_process_type_options(mode)
+                        for cycle in cycles]
+    return {
+        "engines": combos,
+        "start_time_periods": START_TIME_PERIODS,
+        "start_dates": [d.isoformat() for d in START_DATES],
+        "quantities": [[q, d] for q in ORDER_QUANTITIES for d in DAILY_PRODUCTIONS],
+    }
+
+
+def iter_cases(grid):
+    """按固定顺序遍历网格中的所有用例"""
+    for name, combos in grid["engines"].items():
+        for process_type, cycle in combos:
+            for start_time_period in grid["start_time_periods"]:
+                for start_date in grid["start_dates"]:
+                    start = datetime.combine(date.fromisoformat(start_date), datetime.min.time())
+                    for order_quantity, daily_production in grid["quantities"]:
+                        yield name, (start, process_type, cycle, order_quantity, daily_production, start_time_period)
+
+
+def run_case(func, name, args):
+    start, process_type, cycle, order_quantity, daily_production, start_time_period = args
+    if name == "calculate_schedule_longbing":
+        return func(start, process_type, order_quantity, daily_production, start_time_period)
+    return func(start, process_type, cycle, order_quantity, daily_production, start_time_period)
+
+
+def encode_schedule(schedule, origin):
+    """把排产结果编码为与缝纫开始日期无关的紧凑形式（保留部门和工序顺序）"""
+    encoded = []
+    for dept, steps in schedule.items():
+        for step, info in steps.items():
+            fields = []
+            for key, value in info.items():
+                if isinstance(value, datetime):
+                    value = ["dt", int((value - origin).total_seconds())]
+                elif isinstance(value, date):
+                    value = ["d", (value - origin.date()).days]
+                fields.append([key, value])
+            encoded.append([dept, step, fields])
+    return json.dumps(encoded, ensure_ascii=False, separators=(",", ":"))
+
+
+def evaluate(grid, impls):
+    """运行所有用例，返回每个用例的编码输出"""
+    outputs = []
+    for name, args in iter_cases(grid):
+        try:
+            schedule = run_case(impls[name], name, args)
+        except Exception as e:
+            outputs.append(json.dumps(["error", type(e).__name__], ensure_ascii=False))
+            continue
+        outputs.append(encode_schedule(schedule, args[0]))
+    return outputs
+
+
+def load_impls(overrides):
+    """默认使用 production_test 中的引擎，可以用 NAME=module:function 替换"""
+    impls = {name: getattr(engine, name) for name in ENGINE_MODES}
+    for override in overrides:
+        name, _, target = override.partition("=")
+        module_name, _, func_name = target.partition(":")
+        if name not in impls or not module_name or not func_name:
+            raise ValueError(f"Invalid --impl value: {override}")
+        impls[name] = getattr(importlib.import_module(module_name), func_name)
+    return impls
+
+
+def record(path):
+    grid = build_grid()
+    started = time.perf_counter()
+    outputs = evaluate(grid, load_impls([]))
+    variants = {}
+    cases = [variants.setdefault(output, len(variants)) for output in outputs]
+    golden = {
+        "grid": grid,
+        "variants": [json.loads(v) for v in variants],
+        "cases": cases,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # mtime=0 使相同的输出生成相同的文件
+    with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        f.write(json.dumps(golden, ensure_ascii=False, separators=(",", ":")).encode('utf-8'))
+    print(f"已记录 {len(cases)} 个用例（{len(variants)} 种输出），耗时 {time.perf_counter() - started:.2f}s -> {path}")
+
+
+def describe_difference(expected, actual):
+    """找出两个编码结果中第一个不同的工序"""
+    if expected[0] == "error" or actual[0] == "error":
+        return f"期望 {expected}，实际 {actual}"
+    for i, (exp, act) in enumerate(zip(expected, actual)):
+        if exp != act:
+            return f"第{i + 1}项 期望 {exp}，实际 {act}"
+    return f"工序数量不同：期望 {len(expected)}，实际 {len(actual)}"
+
+
+def golden_styles(grid, golden_outputs):
+    """把经由 calculate_style_schedule 可达的用例转换为款式，返回款式列表和对应的金标准输出"""
+    styles = []
+    expected = []
+    for (name, args), output in zip(iter_cases(grid), golden_outputs):
+        # calculate_schedule_longbing 只会经由 calculate_schedule 调用
+        if name == "calculate_schedule_longbing" or output[0] == "error":
+            continue
+        start, process_type, cycle, order_quantity, daily_production, start_time_period = args
+        styles.append({
+            "style_number": f"G{len(styles)}",
+            "sewing_start_date": start,
+            "start_time_period": start_time_period,
+            "process_type": process_type,
+            "cycle": cycle,
+            "order_quantity": order_quantity,
+            "daily_production": daily_production,
+            "production_mode": ENGINE_MODES[name],
+        })
+        expected.append(output)
+    return styles, expected
+
+
+def describe_style(style):
+    return (f"{style['production_mode']} 工序={style['process_type']} 确认用时={style['cycle']} "
+            f"开始={style['sewing_start_date']:%Y-%m-%d}{style['start_time_period']} "
+            f"数量={style['order_quantity']} 日产量={style['daily_production']}")
+
+
+def check_sewing_windows(styles, expected, max_reports):
+    """用金标准中的缝纫结束时间校验 calculate_sewing_windows"""
+    started = time.perf_counter()
+    windows = engine.calculate_sewing_windows(styles)
+    elapsed = time.perf_counter() - started
+
+    mismatches = 0
+    for style, output, (end, remark) in zip(styles, expected, windows):
+        exp = dict(next(fields for dept, step, fields in output if dept == "缝纫" and step == "缝纫结束"))
+        actual = {"时间点": ["dt", int((end - style["sewing_start_date"]).total_seconds())], "备注": remark}
+        if actual == exp:
+            continue
+        mismatches += 1
+        if mismatches <= max_reports:
+            print(f"[缝纫结束不一致] {describe_style(style)} 期望 {exp}，实际 {actual}")
+    print(f"calculate_sewing_windows: {len(styles)} 个用例，{mismatches} 个不一致，耗时 {elapsed:.2f}s")
+    return mismatches == 0
+
+
+def check_compiled_schedules(styles, expected, max_reports):
+    """用金标准校验按依赖图批量计算的 calculate_style_schedules"""
+    started = time.perf_counter()
+    schedules = engine.calculate_style_schedules(styles)
+    elapsed = time.perf_counter() - started
+
+    mismatches = 0
+    for style, output, schedule in zip(styles, expected, schedules):
+        actual = json.loads(encode_schedule(schedule, style["sewing_start_date"]))
+        if actual == output:
+            continue
+        mismatches += 1
+        if mismatches <= max_reports:
+            print(f"[依赖图不一致] {describe_style(style)}")
+            print("    " + describe_difference(output, actual))
+    print(f"calculate_style_schedules: {len(styles)} 个用例，{mismatches} 个不一致，耗时 {elapsed:.2f}s")
+    return mismatches == 0
+
+
+def check(path, overrides, max_reports):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        golden = json.load(f)
+    grid = golden["grid"]
+    variants = [json.dumps(v, ensure_ascii=False, separators=(",", ":")) for v in golden["variants"]]
+    started = time.perf_counter()
+    outputs = evaluate(grid, load_impls(overrides))
+    elapsed = time.perf_counter() - started
+
+    mismatches = 0
+    for (name, args), output, variant in zip(iter_cases(grid), outputs, golden["cases"]):
+        if output == variants[variant]:
+            continue
+        mismatches += 1
+        if mismatches <= max_reports:
+            start, process_type, cycle, order_quantity, daily_production, start_time_period = args
+            print(f"[不一致] {name} 工序={process_type} 确认用时={cycle} 开始={start:%Y-%m-%d}{start_time_period} "
+                  f"数量={order_quantity} 日产量={daily_production}")
+            print("    " + describe_difference(json.loads(variants[variant]), json.loads(output)))
+    total = len(golden["cases"])
+    print(f"{total} 个用例，{mismatches} 个不一致，耗时 {elapsed:.2f}s")
+    styles, expected = golden_styles(grid, [golden["variants"][variant] for variant in golden["cases"]])
+    windows_ok = check_sewing_windows(styles, expected, max_reports)
+    compiled_ok = check_compiled_schedules(styles, expected, max_reports)
+    return windows_ok and compiled_ok and mismatches == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排产引擎金标准输出对比")
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument("--golden", default=str(GOLDEN_PATH), help="金标准文件路径")
+    parser.add_argument("--impl", action="append", default=[],
+                        help="用其他实现替换引擎，格式 NAME=module:function，可重复")
+    parser.add_argument("--max-reports", type=int, default=20, help="最多打印的不一致用例数")
+    args = parser.parse_args(argv)
+
+    path = pathlib.Path(args.golden)
+    if args.command == "record":
+        record(path)
+        return 0
+    return 0 if check(path, args.impl, args.max_reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import time
+_IMPORT_STARTED_AT = time.perf_counter()
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -15,18 +17,133 @@ import pathlib
 import openpyxl
 from openpyxl.styles import Font, Border, Alignment, PatternFill
 import shutil
+import atexit
+import bisect
+import contextlib
+import copy
+import functools
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Create data directory if it doesn't exist
 DATA_DIR = pathlib.Path("user_data")
 DATA_DIR.mkdir(exist_ok=True)
 
+# 性能埋点：各阶段耗时写入本地日志，管理员可在侧边栏查看
+PERF_LOG_PATH = DATA_DIR / "perf_log.jsonl"
+PERF_ADMIN_USERS = {"admin"}
+# Streamlit 每个会话在独立线程中运行脚本，当前账号按线程记录
+PERF_CONTEXT = threading.local()
+_PERF_PENDING = []
+# 合并记录的阶段耗时：{(账号, 阶段): [次数, 秒]}
+_PERF_TOTALS = {}
+_PERF_LOCK = threading.Lock()
+# 只有显式写过日志（页面、命令行、接口）的进程在退出时才写入剩余记录，只导入模块不会创建日志文件
+_PERF_LOG_STATE = {"used": False}
+
+def record_perf_timing(stage, seconds, user=None, **fields):
+    """Buffer one timing entry for the perf log (user defaults to the current thread's account)"""
+    entry = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "user": user if user is not None else getattr(PERF_CONTEXT, "user", None),
+        "stage": stage,
+        "ms": round(seconds * 1000, 3)
+    }
+    entry.update(fields)
+    with _PERF_LOCK:
+        _PERF_PENDING.append(entry)
+
+@contextlib.contextmanager
+def perf_span(stage, aggregate=False, **fields):
+    """
+    记录一个阶段的耗时，可作为 with 语句或装饰器使用
+    aggregate=True 时同名阶段的多次调用合并为一条记录（用于逐款式调用的热点）
+    """
+    # 账号在开始时确定，记录属于发起该阶段的会话
+    user = getattr(PERF_CONTEXT, "user", None)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if aggregate:
+            with _PERF_LOCK:
+                total = _PERF_TOTALS.setdefault((user, stage), [0, 0.0])
+                total[0] += 1
+                total[1] += elapsed
+        else:
+            record_perf_timing(stage, elapsed, user=user, **fields)
+
+def flush_perf_log():
+    """Append buffered timings to the perf log"""
+    with _PERF_LOCK:
+        _PERF_LOG_STATE["used"] = True
+        entries = list(_PERF_PENDING)
+        _PERF_PENDING.clear()
+        for (user, stage), (calls, seconds) in _PERF_TOTALS.items():
+            entries.append({
+                "ts": datetime.now().isoformat(timespec="seconds"),
+                "user": user,
+                "stage": stage,
+                "ms": round(seconds * 1000, 3),
+                "calls": calls
+            })
+        _PERF_TOTALS.clear()
+    if not entries:
+        return
+    try:
+        PERF_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(PERF_LOG_PATH, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+    except OSError:
+        # 日志写入失败不能影响正常使用
+        pass
+
+def _flush_perf_log_at_exit():
+    if _PERF_LOG_STATE["used"]:
+        flush_perf_log()
+
+atexit.register(_flush_perf_log_at_exit)
+
+def load_perf_stats(user=None, max_entries=20000):
+    """Summarize the most recent perf log entries into per-stage latency percentiles"""
+    if not PERF_LOG_PATH.exists():
+        return pd.DataFrame()
+    with open(PERF_LOG_PATH, 'r', encoding='utf-8') as f:
+        lines = deque(f, maxlen=max_entries)
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame(records)
+    if user:
+        df = df[df["user"] == user]
+    if df.empty:
+        return pd.DataFrame()
+    stats = df.groupby("stage")["ms"].agg(
+        次数="count",
+        P50=lambda s: s.quantile(0.5),
+        P90=lambda s: s.quantile(0.9),
+        P99=lambda s: s.quantile(0.99),
+        最大="max"
+    )
+    return stats.round(1).sort_values("P90", ascending=False)
+
 def save_user_data(user_id, data):
     """Save user data to a JSON file"""
     user_file = DATA_DIR / f"{user_id}.json"
     with open(user_file, 'w', encoding='utf-8') as f:
         json.dump(data, f, default=str)
 
+@perf_span("load_user_data")
 def load_user_data(user_id):
     """Load user data from JSON file"""
     user_file = DATA_DIR / f"{user_id}.json"
@@ -38,6 +155,9 @@ def load_user_data(user_id):
                 style["sewing_start_date"] = datetime.strptime(style["sewing_start_date"], "%Y-%m-%d").date()
             return data
     return {"all_styles": []}
+
+record_perf_timing("import", time.perf_counter() - _IMPORT_STARTED_AT)
+_FONT_LOADING_STARTED_AT = time.perf_counter()
 fm._load_fontmanager()
 # Path relative to your script
 font_path = os.path.join(os.path.dirname(__file__), "static", "simhei.ttf")
@@ -66,6 +186,91 @@ chinese_fonts = [f for f in font_names if any(name in f for name in ['PingFang',
 if chinese_fonts:
     plt.rcParams['font.sans-serif'] = chinese_fonts[0]
     print(chinese_fonts[0])
+record_perf_timing("font_loading", time.perf_counter() - _FONT_LOADING_STARTED_AT)
+
+# 工厂日历：全局工作日（周一到周日，1为工作日）、各部门的工作日和节假日，
+# 文件不存在时不启用日历，所有偏移按自然日计算
+FACTORY_CALENDAR_PATH = DATA_DIR / "factory_calendar.json"
+_FACTORY_CALENDAR_CACHE = {"mtime": None, "calendar": None}
+_WORKDAY_EPOCH = np.datetime64("2000-01-01")
+
+def load_factory_calendar(path=FACTORY_CALENDAR_PATH):
+    """
+    读取工厂日历文件，例如:
+    {"weekmask": "1111110", "departments": {"产前确认": "1111100"}, "holidays": ["2025-10-01", ...]}
+    """
+    path = pathlib.Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    calendar = {
+        "weekmask": data.get("weekmask", "1111111"),
+        "departments": dict(data.get("departments", {})),
+        "holidays": tuple(sorted(str(np.datetime64(day, "D")) for day in data.get("holidays", []))),
+    }
+    for weekmask in [calendar["weekmask"], *calendar["departments"].values()]:
+        if len(weekmask) != 7 or set(weekmask) - {"0", "1"} or "1" not in weekmask:
+            raise ValueError(f"Invalid weekmask: {weekmask}")
+    return calendar
+
+def get_factory_calendar():
+    """ 返回当前的工厂日历，文件修改后自动重新读取 """
+    try:
+        mtime = FACTORY_CALENDAR_PATH.stat().st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _FACTORY_CALENDAR_CACHE["mtime"]:
+        _FACTORY_CALENDAR_CACHE["calendar"] = load_factory_calendar(FACTORY_CALENDAR_PATH) if mtime is not None else None
+        _FACTORY_CALENDAR_CACHE["mtime"] = mtime
+    return _FACTORY_CALENDAR_CACHE["calendar"]
+
+@functools.lru_cache(maxsize=128)
+def _busday_calendar(weekmask, holidays, year=None):
+    """ 按年份缓存工作日历（包含前后各一年的节假日），year 为 None 时包含全部节假日 """
+    if year is not None:
+        holidays = [day for day in holidays if year - 1 <= int(day[:4]) <= year + 1]
+    return np.busdaycalendar(weekmask=weekmask, holidays=list(holidays))
+
+def _workday_offset(days, offsets, calendar, department):
+    """ 把起始日期顺延到该部门的工作日后，再偏移指定的工作日数（向量化） """
+    weekmask = calendar["departments"].get(department, calendar["weekmask"])
+    years = days.astype("datetime64[Y]").astype(int) + 1970
+    result = np.empty_like(days)
+    for year in np.unique(years):
+        selected = years == year
+        busdaycal = _busday_calendar(weekmask, calendar["holidays"], int(year))
+        result[selected] = np.busday_offset(days[selected], offsets[selected], roll="forward", busdaycal=busdaycal)
+    return result
+
+def apply_work_calendar(schedule, sewing_start_date, calendar):
+    """
+    把排产结果中相对缝纫开始日期的自然日偏移换算为工作日偏移：
+    缝纫开始顺延到缝纫部门的工作日，各部门的时间点再按本部门的工作日计算
+    """
+    if calendar is None:
+        return schedule
+    start_day = np.array([sewing_start_date.date() if isinstance(sewing_start_date, datetime) else sewing_start_date],
+                         dtype="datetime64[D]")
+    anchor = _workday_offset(start_day, np.zeros(1, dtype=int), calendar, "缝纫")[0]
+    origin = datetime.combine(start_day[0].astype(datetime), datetime.min.time())
+    year = int(anchor.astype("datetime64[Y]").astype(int)) + 1970
+
+    # 使用相同工作日的部门一起计算
+    points_by_weekmask = {}
+    for dept, steps in schedule.items():
+        weekmask = calendar["departments"].get(dept, calendar["weekmask"])
+        for step, info in steps.items():
+            if isinstance(info.get("时间点"), datetime):
+                points_by_weekmask.setdefault(weekmask, []).append((steps, step, info))
+    for weekmask, points in points_by_weekmask.items():
+        deltas = [info["时间点"] - origin for _, _, info in points]
+        days = np.busday_offset(anchor, [delta.days for delta in deltas], roll="forward",
+                                busdaycal=_busday_calendar(weekmask, calendar["holidays"], year))
+        for (steps, step, info), delta, day in zip(points, deltas, days.astype(object)):
+            time_of_day = delta - timedelta(days=delta.days)
+            steps[step] = {**info, "时间点": datetime.combine(day, datetime.min.time()) + time_of_day}
+    return schedule
 
 # 部门工序定义
 def get_department_steps(process_type=None):
@@ -245,7 +450,7 @@ def get_department_steps_bushu(process_type=None, confirmation_period = None):
     return all_departments
 
 
-def calculate_schedule_bushu(sewing_start_date, process_type, confirmation_period, order_quantity, daily_production, start_time_period="上午"):
+def calculate_schedule_bushu(sewing_start_date, process_type, confirmation_period, order_quantity, daily_production, start_time_period="上午", calendar=None):
     """ 计算整个生产流程的时间安排 """
     schedule = {}
     
@@ -460,9 +665,9 @@ def calculate_schedule_bushu(sewing_start_date, process_type, confirmation_perio
     schedule["后整"]["检针装箱"] = {"时间点": schedule["缝纫"]["缝纫结束"]["时间点"]+ timedelta(days=1)}
     
 
-    return schedule
+    return apply_work_calendar(schedule, sewing_start_date, calendar)
 
-def calculate_schedule_beibei(sewing_start_date, process_type, confirmation_period, order_quantity, daily_production, start_time_period="上午"):
+def calculate_schedule_beibei(sewing_start_date, process_type, confirmation_period, order_quantity, daily_production, start_time_period="上午", calendar=None):
     """ 计算整个生产流程的时间安排 """
     schedule = {}
     
@@ -814,10 +1019,10 @@ def calculate_schedule_beibei(sewing_start_date, process_type, confirmation_peri
     schedule["工艺"]["检验"] = {"时间点": schedule["工艺"]["船样检测摄影"]["时间点"]+ timedelta(days=3)}
     
 
-    return schedule
+    return apply_work_calendar(schedule, sewing_start_date, calendar)
 
 
-def calculate_schedule_longbing(sewing_start_date, process_type, order_quantity, daily_production, start_time_period="上午"):
+def calculate_schedule_longbing(sewing_start_date, process_type, order_quantity, daily_production, start_time_period="上午", calendar=None):
     """ 计算整个生产流程的时间安排 """
     schedule = {}
     
@@ -1027,12 +1232,12 @@ def calculate_schedule_longbing(sewing_start_date, process_type, order_quantity,
     schedule["工艺"]["外观"] = {"时间点": schedule["工艺"]["船样检测摄影"]["时间点"]+ timedelta(days=3)}
     
 
-    return schedule
+    return apply_work_calendar(schedule, sewing_start_date, calendar)
 
-def calculate_schedule(sewing_start_date, process_type, confirmation_period, order_quantity, daily_production, start_time_period="上午"):
+def calculate_schedule(sewing_start_date, process_type, confirmation_period, order_quantity, daily_production, start_time_period="上午", calendar=None):
     """ 计算整个生产流程的时间安排 """
     if confirmation_period == '1个月交期+确认5天':
-        return calculate_schedule_longbing(sewing_start_date, process_type, order_quantity, daily_production, start_time_period="上午")
+        return calculate_schedule_longbing(sewing_start_date, process_type, order_quantity, daily_production, start_time_period="上午", calendar=calendar)
         
     schedule = {}
     
@@ -1388,15 +1593,423 @@ def calculate_schedule(sewing_start_date, process_type, confirmation_period, ord
     schedule["工艺"]["外观"] = {"时间点": schedule["工艺"]["船样检测摄影"]["时间点"]+ timedelta(days=3)}
     
 
-    return schedule
+    return apply_work_calendar(schedule, sewing_start_date, calendar)
+
+SCHEDULE_ENGINES = {
+    "龙兵": calculate_schedule,
+    "贝贝": calculate_schedule_beibei,
+    "补数": calculate_schedule_bushu,
+}
+
+def calculate_style_schedule(style):
+    """ 根据款式的排产模式计算生产流程时间安排 """
+    sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time()) if not isinstance(style["sewing_start_date"], datetime) else style["sewing_start_date"]
+    start_time_period = style.get("start_time_period", "上午")
+    production_mode = style["production_mode"]
+    if production_mode not in SCHEDULE_ENGINES:
+        raise ValueError(f"Invalid production_mode: {production_mode}")
+    with perf_span("scheduling", aggregate=True):
+        schedule = SCHEDULE_ENGINES[production_mode](
+            sewing_start_time,
+            style["process_type"],
+            style["cycle"],
+            style["order_quantity"],
+            style["daily_production"],
+            start_time_period,
+            calendar=get_factory_calendar()
+        )
+    return apply_schedule_overrides(style, schedule)
+
+class _TracedTime:
+    """ 编译依赖图时代替日期传入排产引擎，记录每个时间点由哪个时间点加减多少天得到 """
+    __slots__ = ("parent", "days")
+
+    def __init__(self, parent=None, days=0):
+        self.parent = parent
+        self.days = days
+
+    def __add__(self, other):
+        if not isinstance(other, timedelta):
+            return NotImplemented
+        if other.seconds or other.microseconds:
+            raise ValueError(f"Schedule offsets must be whole days: {other}")
+        return _TracedTime(self, other.days)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not isinstance(other, timedelta):
+            return NotImplemented
+        return self + (-other)
+
+@functools.lru_cache(maxsize=None)
+def compile_schedule_graph(production_mode, cycle, process_type):
+    """
+    把排产引擎编译为工序依赖图（每种 排产模式/确认用时/工序 只编译一次）。
+    用 _TracedTime 代替缝纫开始日期运行一次引擎，得到每个工序由哪个工序加减多少天算出，
+    缝纫结束到缝纫开始的天数随订单数量和日产量变化，单独标记。
+    返回的 graph 为紧前关系图：以计划开始(X)为基准的工序没有紧前工序，
+    缝纫开始之前没有后续工序的工序需在缝纫开始前完成。
+    """
+    if production_mode not in SCHEDULE_ENGINES:
+        raise ValueError(f"Invalid production_mode: {production_mode}")
+    root = _TracedTime()
+    schedule = SCHEDULE_ENGINES[production_mode](root, process_type, cycle, 1, 1, "上午")
+
+    nodes = []
+    values = []
+    owners = {}
+    for dept, steps in schedule.items():
+        for step, info in steps.items():
+            nodes.append((dept, step))
+            values.append(info["时间点"])
+            owners.setdefault(id(info["时间点"]), len(nodes) - 1)
+    sewing_start = nodes.index(("缝纫", "缝纫开始"))
+    sewing_end = nodes.index(("缝纫", "缝纫结束"))
+
+    # 计算来源图：每个工序只有一个来源，未命名的中间值（如计划开始X）向上合并到有名字的工序
+    source_graph = nx.DiGraph()
+    source_graph.add_nodes_from(range(len(nodes)))
+    for index, value in enumerate(values):
+        if owners[id(value)] != index:
+            source_graph.add_edge(owners[id(value)], index, days=0)
+            continue
+        parent, days = value.parent, value.days
+        while parent is not None and id(parent) not in owners:
+            days += parent.days
+            parent = parent.parent
+        if parent is not None:
+            source_graph.add_edge(owners[id(parent)], index, days=days)
+    source_graph.edges[sewing_start, sewing_end]["days"] = 0
+    source_graph.edges[sewing_start, sewing_end]["sewing"] = True
+
+    base_offsets = np.zeros(len(nodes), dtype=int)
+    for node in nx.topological_sort(source_graph):
+        for successor in source_graph.successors(node):
+            base_offsets[successor] = base_offsets[node] + source_graph.edges[node, successor]["days"]
+    after_sewing = np.zeros(len(nodes), dtype=bool)
+    after_sewing[[sewing_end, *nx.descendants(source_graph, sewing_end)]] = True
+
+    # 紧前关系图：去掉从缝纫开始倒推的基准边，缝纫开始前的末端工序连到缝纫开始
+    graph = source_graph.copy()
+    graph.remove_edges_from([(u, v) for u, v, days in source_graph.edges(data="days")
+                             if u == sewing_start and days < 0])
+    for node in list(graph.nodes):
+        if node != sewing_start and graph.out_degree(node) == 0 and base_offsets[node] <= 0 and not after_sewing[node]:
+            graph.add_edge(node, sewing_start, days=0, deadline=True)
+    if not nx.is_directed_acyclic_graph(graph):
+        raise ValueError(f"Schedule dependencies are cyclic: {production_mode} {cycle} {process_type}")
+
+    return {
+        "departments": list(schedule.keys()),
+        "nodes": nodes,
+        "sewing_start": sewing_start,
+        "sewing_end": sewing_end,
+        "base_offsets": base_offsets,
+        "after_sewing": after_sewing,
+        "graph": graph,
+        "topological_order": list(nx.topological_sort(graph)),
+    }
+
+def _compiled_offsets(styles):
+    """ 按依赖图计算每个款式各工序相对缝纫开始的天数，返回 {(模式, 确认用时, 工序): (款式序号, 天数矩阵)} 和缝纫结束时段 """
+    windows = calculate_sewing_windows(styles)
+    starts = np.array([
+        style["sewing_start_date"] if isinstance(style["sewing_start_date"], datetime)
+        else datetime.combine(style["sewing_start_date"], datetime.min.time())
+        for style in styles
+    ], dtype="datetime64[us]")
+    ends = np.array([end for end, _ in windows], dtype="datetime64[us]")
+    sewing_days = (ends.astype("datetime64[D]") - starts.astype("datetime64[D]")).astype(int)
+
+    grouped = {}
+    for index, style in enumerate(styles):
+        grouped.setdefault((style["production_mode"], style["cycle"], style["process_type"]), []).append(index)
+    offsets = {}
+    for key, indices in grouped.items():
+        graph = compile_schedule_graph(*key)
+        indices = np.array(indices)
+        offsets[key] = (indices, graph["base_offsets"][None, :] + sewing_days[indices, None] * graph["after_sewing"][None, :])
+    return starts, sewing_days, windows, offsets
+
+@perf_span("batch_scheduling")
+def calculate_style_schedules(styles, calendar=None):
+    """
+    用编译好的依赖图批量计算款式的生产流程时间安排，同一种 排产模式/确认用时/工序
+    的款式一起向量化计算，结果与逐个调用 calculate_style_schedule 相同
+    """
+    if not styles:
+        return []
+    starts, _, windows, offsets = _compiled_offsets(styles)
+    start_days = starts.astype("datetime64[D]")
+    results = [None] * len(styles)
+    for key, (indices, days) in offsets.items():
+        graph = compile_schedule_graph(*key)
+        if calendar is None:
+            times = starts[indices, None] + days.astype("timedelta64[D]")
+        else:
+            # 与 apply_work_calendar 相同：缝纫开始顺延到工作日，各部门按本部门的工作日偏移
+            anchors = _workday_offset(start_days[indices], np.zeros(len(indices), dtype=int), calendar, "缝纫")
+            times = np.empty(days.shape, dtype="datetime64[us]")
+            columns_by_dept = {}
+            for column, (dept, _) in enumerate(graph["nodes"]):
+                columns_by_dept.setdefault(dept, []).append(column)
+            for dept, columns in columns_by_dept.items():
+                shifted = _workday_offset(np.repeat(anchors, len(columns)), days[:, columns].ravel(), calendar, dept)
+                times[:, columns] = shifted.reshape(len(indices), len(columns))
+            times += (starts[indices] - start_days[indices])[:, None]
+        times = times.astype(object)
+
+        for row, index in enumerate(indices):
+            style = styles[index]
+            schedule = {dept: {} for dept in graph["departments"]}
+            for column, (dept, step) in enumerate(graph["nodes"]):
+                schedule[dept][step] = {"时间点": times[row, column]}
+            # 龙兵的"1个月交期+确认5天"固定按上午开始计算
+            if style["production_mode"] == "龙兵" and style["cycle"] == "1个月交期+确认5天":
+                schedule["缝纫"]["缝纫开始"]["备注"] = "上午"
+            else:
+                schedule["缝纫"]["缝纫开始"]["备注"] = style.get("start_time_period", "上午")
+            schedule["缝纫"]["缝纫结束"]["备注"] = windows[index][1]
+            results[index] = schedule
+    # 只有带手动调整的款式需要再沿依赖图传播一次
+    return [apply_schedule_overrides(style, schedule) for style, schedule in zip(styles, results)]
+
+def calculate_schedule_slack(styles):
+    """
+    按依赖图计算每个工序的浮动时间（天，不考虑工厂日历）和关键路径：
+    缝纫开始前的工序以按时开始缝纫为准，其余工序以最后一个工序的时间为准，
+    关键路径为从计划开始到最后一个工序、决定各工序时间的那条工序链。
+    返回与 styles 对应的 [{"slack": {(部门, 工序): 天数}, "critical_path": [(部门, 工序), ...]}]
+    """
+    if not styles:
+        return []
+    _, sewing_days, _, offsets = _compiled_offsets(styles)
+    results = [None] * len(styles)
+    for key, (indices, earliest) in offsets.items():
+        graph = compile_schedule_graph(*key)
+        dependencies = graph["graph"]
+
+        def edge_days(u, v):
+            if dependencies.edges[u, v].get("sewing"):
+                return sewing_days[indices]
+            return np.full(len(indices), dependencies.edges[u, v]["days"])
+
+        # 逆拓扑顺序计算最晚时间
+        finish = earliest.max(axis=1)
+        latest = np.empty_like(earliest)
+        for node in reversed(graph["topological_order"]):
+            successors = list(dependencies.successors(node))
+            if not successors:
+                latest[:, node] = finish
+                continue
+            latest[:, node] = np.min([latest[:, successor] - edge_days(node, successor) for successor in successors], axis=0)
+        slack = latest - earliest
+
+        for row, index in enumerate(indices):
+            # 关键路径：从最后一个工序出发，逐个找出决定其时间的紧前工序（紧前时间+天数恰好等于本工序时间），
+            # 没有这样的紧前工序时本工序的时间不由前面的工序决定，关键路径到此为止
+            node = int(np.argmax(earliest[row]))
+            path = [node]
+            while True:
+                tight = [predecessor for predecessor in dependencies.predecessors(node)
+                         if earliest[row, predecessor] + edge_days(predecessor, node)[row] == earliest[row, node]]
+                if not tight:
+                    break
+                node = max(tight, key=lambda predecessor: earliest[row, predecessor])
+                path.append(node)
+            path.reverse()
+            results[index] = {
+                "slack": {graph["nodes"][node]: int(slack[row, node]) for node in range(len(graph["nodes"]))},
+                "critical_path": [graph["nodes"][node] for node in path],
+            }
+    return results
+
+def _compiled_finish_offsets(production_mode, process_type, cycle):
+    """
+    返回 (检针装箱相对缝纫结束的天数, 最早工序相对缝纫开始的天数)，
+    两者只与排产模式、工序和确认用时有关，取自编译好的依赖图
+    """
+    graph = compile_schedule_graph(production_mode, cycle, process_type)
+    offsets = graph["base_offsets"]
+    finish_days = offsets[graph["nodes"].index(("后整", "检针装箱"))] - offsets[graph["sewing_end"]]
+    return int(finish_days), int(offsets.min())
+
+@perf_span("latest_start")
+def solve_latest_start(styles, today=None):
+    """
+    根据交期倒推每个款式最晚的缝纫开始日期和时段，使后整-检针装箱不晚于交期。
+    返回与 styles 一一对应的列表，没有交期的款式为 None，否则为
+    {"sewing_start_date", "start_time_period", "first_step_date", "feasible"}，
+    最早的工序已经早于今天时 feasible 为 False
+    """
+    today = today or datetime.today().date()
+    calendar = get_factory_calendar()
+    results = [None] * len(styles)
+    candidates = [(index, style) for index, style in enumerate(styles) if style.get("delivery_date")]
+    # 缝纫所需半天数与开始日期无关，按自然日一次性向量化计算
+    windows = calculate_sewing_windows([style for _, style in candidates])
+    for (index, style), (end_time, end_remark) in zip(candidates, windows):
+        if style["production_mode"] not in SCHEDULE_ENGINES:
+            raise ValueError(f"Invalid production_mode: {style['production_mode']}")
+        start_day = style["sewing_start_date"]
+        if isinstance(start_day, datetime):
+            start_day = start_day.date()
+        delivery_date = style["delivery_date"]
+        if isinstance(delivery_date, datetime):
+            delivery_date = delivery_date.date()
+        morning_only = style["production_mode"] == "龙兵" and style["cycle"] == "1个月交期+确认5天"
+        duration = _to_half_day(end_time.date(), end_remark) - _to_half_day(
+            start_day, "上午" if morning_only else style.get("start_time_period", "上午"))
+        finish_days, lead_days = _compiled_finish_offsets(style["production_mode"], style["process_type"], style["cycle"])
+
+        # 缝纫结束的半天序号 = 开始 + duration，结束日期 = 序号 // 2，需满足 结束日期 + finish_days <= 交期
+        latest = 2 * (delivery_date.toordinal() - finish_days) + 1 - duration
+        step = 2 if morning_only else 1
+        if morning_only and latest % 2:
+            latest -= 1
+
+        if calendar is None:
+            sewing_start_date, start_time_period = _from_half_day(latest)
+            first_step_date = sewing_start_date + timedelta(days=lead_days)
+        else:
+            # 启用工厂日历时以自然日的结果为起点，用完整排产逐个半天校正
+            def schedule_at(half_day):
+                day, period = _from_half_day(half_day)
+                return calculate_style_schedule({**style, "sewing_start_date": day, "start_time_period": period})
+
+            def finish_date(schedule):
+                return schedule["后整"]["检针装箱"]["时间点"].date()
+
+            schedule = schedule_at(latest)
+            while finish_date(schedule) > delivery_date:
+                latest -= step
+                schedule = schedule_at(latest)
+            while finish_date(schedule_at(latest + step)) <= delivery_date:
+                latest += step
+                schedule = schedule_at(latest)
+            sewing_start = schedule["缝纫"]["缝纫开始"]
+            sewing_start_date, start_time_period = sewing_start["时间点"].date(), sewing_start["备注"]
+            first_step_date = min(info["时间点"] for steps in schedule.values() for info in steps.values()
+                                  if isinstance(info.get("时间点"), datetime)).date()
+
+        results[index] = {
+            "sewing_start_date": sewing_start_date,
+            "start_time_period": start_time_period,
+            "first_step_date": first_step_date,
+            "feasible": first_step_date >= today,
+        }
+    return results
+
+def new_rearrange_cache():
+    """ 创建生产班组连续排产的缓存（按生产班组保存每个生产顺序组的结束时间） """
+    return {"groups": {}, "dirty": set(), "calendar": None}
+
+def mark_production_groups_dirty(cache, groups):
+    """ 款式新增、删除或修改后，标记受影响的生产班组，下次排产时整组重新计算 """
+    if cache is not None:
+        cache["dirty"].update(group for group in groups if group)
+
+def _sequence_key(style):
+    """ 影响款式缝纫结束时间的字段（包括手动调整），用于判断生产顺序组的缓存是否仍然有效 """
+    return (style.get("production_mode"), style.get("process_type"), style.get("cycle"),
+            style.get("order_quantity"), style.get("daily_production"),
+            json.dumps(style.get("schedule_overrides") or {}, sort_keys=True, ensure_ascii=False))
+
+def calculate_sewing_windows(styles, calendar=None):
+    """
+    只计算款式的缝纫结束时间和备注（上午/下午），与完整排产中的缝纫结束规则一致，
+    对一组款式向量化计算，返回 [(缝纫结束时间点, 备注), ...]
+    calendar 为工厂日历时按缝纫部门的工作日计算
+    """
+    if not styles:
+        return []
+    for style in styles:
+        if style["production_mode"] not in ("龙兵", "贝贝", "补数"):
+            raise ValueError(f"Invalid production_mode: {style['production_mode']}")
+        if style["daily_production"] == 0:
+            raise ZeroDivisionError("daily_production must not be zero")
+
+    starts = np.array([
+        style["sewing_start_date"] if isinstance(style["sewing_start_date"], datetime)
+        else datetime.combine(style["sewing_start_date"], datetime.min.time())
+        for style in styles
+    ], dtype="datetime64[us]")
+    # 龙兵的"1个月交期+确认5天"固定按上午开始计算
+    morning = np.array([
+        (style["production_mode"] == "龙兵" and style["cycle"] == "1个月交期+确认5天")
+        or style.get("start_time_period", "上午") == "上午"
+        for style in styles
+    ])
+    order_quantity = np.array([style["order_quantity"] for style in styles], dtype=np.float64)
+    daily_production = np.array([style["daily_production"] for style in styles], dtype=np.float64)
+
+    sewing_days_float = order_quantity * 1.05 / daily_production
+    sewing_days_int = np.trunc(sewing_days_float)
+    sewing_days_decimal = sewing_days_float - sewing_days_int
+
+    # 上午开始：小数部分大于0.5时第二天上午结束，否则当天结束（有小数为下午，整数天为上午）
+    # 下午开始：整数天当天下午结束，小数部分不超过0.5第二天上午结束，否则第二天下午结束
+    extra_day = np.where(morning, sewing_days_decimal > 0.5, sewing_days_decimal > 0)
+    ends_in_afternoon = np.where(morning,
+                                 (sewing_days_decimal > 0) & (sewing_days_decimal <= 0.5),
+                                 (sewing_days_decimal <= 0) | (sewing_days_decimal > 0.5))
+    offsets = (sewing_days_int + extra_day).astype(int)
+    if calendar is None:
+        ends = starts + offsets.astype("timedelta64[D]")
+    else:
+        start_days = starts.astype("datetime64[D]")
+        anchors = _workday_offset(start_days, np.zeros(len(styles), dtype=int), calendar, "缝纫")
+        ends = _workday_offset(anchors, offsets, calendar, "缝纫").astype("datetime64[us]") + (starts - start_days)
+    ends = ends.astype(object)
+    return [(end, "下午" if afternoon else "上午") for end, afternoon in zip(ends, ends_in_afternoon)]
+
+def calculate_adjusted_sewing_windows(styles, calendar=None):
+    """
+    与 calculate_sewing_windows 相同，但带手动调整（schedule_overrides）的款式以叠加调整后的
+    缝纫结束为准，连续排产和预览都用它决定生产顺序组的结束时间
+    """
+    windows = calculate_sewing_windows(styles, calendar)
+    overridden = [index for index, style in enumerate(styles) if style.get("schedule_overrides")]
+    if overridden:
+        schedules = calculate_style_schedules([styles[index] for index in overridden], calendar)
+        for index, schedule in zip(overridden, schedules):
+            sewing_end = schedule["缝纫"]["缝纫结束"]
+            windows[index] = (sewing_end["时间点"], sewing_end.get("备注", ""))
+    return windows
+
+def _latest_window_index(windows):
+    """ 缝纫结束最晚的下标（相同时取第一个），即决定下一个生产顺序组开始时间的款式 """
+    return int(np.argmax(np.array([end for end, _ in windows], dtype="datetime64[us]")))
+
+def _latest_sewing_end(order_styles):
+    """ 计算生产顺序组中最晚的缝纫结束时间及其时段，返回 (款式下标, (结束时间点, 时段)) """
+    windows = calculate_adjusted_sewing_windows(order_styles, get_factory_calendar())
+    latest = _latest_window_index(windows)
+    return latest, windows[latest]
 
 # 重新安排生产班组中款式的缝纫开始时间
-def rearrange_styles_by_production_group(styles):
+@perf_span("rearrange")
+def rearrange_styles_by_production_group(styles, cache=None):
     """
     重新安排同一生产班组内款式的缝纫开始时间
     确保同一生产顺序的款式共享相同的开始时间
     确保下一个生产顺序的款式开始时间等于前一个生产顺序中最后一个款式的结束时间
+
+    传入 cache（见 new_rearrange_cache）时增量计算：每个生产班组只从第一个发生变化的
+    生产顺序组开始重新计算，之前的生产顺序组直接使用缓存的结束时间
     """
+    if cache is None:
+        cache = new_rearrange_cache()
+    # 工厂日历变化后缓存的结束时间全部失效
+    calendar = get_factory_calendar()
+    if cache.get("calendar") is not calendar:
+        cache["groups"] = {}
+        cache["calendar"] = calendar
+    for group in cache["dirty"]:
+        cache["groups"].pop(group, None)
+    cache["dirty"].clear()
+
     # 将款式按生产班组分组
     grouped_styles = {}
     for style in styles:
@@ -1410,6 +2023,7 @@ def rearrange_styles_by_production_group(styles):
     
     # 对每个生产班组内的款式进行处理
     rearranged_styles = []
+    group_cache = {}
     for group, group_styles in grouped_styles.items():
         # 按照生产顺序进一步分组
         order_grouped_styles = {}
@@ -1421,128 +2035,38 @@ def rearrange_styles_by_production_group(styles):
         
         # 按生产顺序排序
         sorted_orders = sorted(order_grouped_styles.keys())
-        
-        # 处理第一个生产顺序组 - 保持原始开始日期
-        first_order = sorted_orders[0]
-        first_order_styles = order_grouped_styles[first_order]
-        
-        # 获取第一个款式的缝纫开始日期和时段作为这个组的共同开始时间
-        if first_order_styles:
-            # 可以按照日期排序，以确保使用最早的日期
-            first_order_styles.sort(key=lambda x: x["sewing_start_date"])
-            first_style = first_order_styles[0]
-            start_date = first_style["sewing_start_date"]
-            start_time_period = first_style.get("start_time_period", "上午")
-            
+
+        cached_tiers = cache["groups"].get(group, [])
+        tiers = []
+        latest_end = None
+        for i, order in enumerate(sorted_orders):
+            order_styles = order_grouped_styles[order]
+
+            if i == 0:
+                # 第一个生产顺序组保持原始开始日期，使用最早的日期和对应时段
+                order_styles.sort(key=lambda x: x["sewing_start_date"])
+                start_date = order_styles[0]["sewing_start_date"]
+                start_time_period = order_styles[0].get("start_time_period", "上午")
+            else:
+                # 前一个组的结束时间作为当前组的开始时间，并根据结束时段确定开始时段
+                start_date = latest_end[0].date()
+                start_time_period = "上午" if "上午" in latest_end[1] else "下午"
+
             # 将相同开始时间应用于该组中的所有款式
-            for style in first_order_styles:
+            for style in order_styles:
                 style["sewing_start_date"] = start_date
                 style["start_time_period"] = start_time_period
                 rearranged_styles.append(style)
-            
-            # 计算该组最后结束的时间 - 需要检查每个款式的结束时间
-            latest_end_time = None
-            latest_end_remark = "下午结束"
-            
-            for style in first_order_styles:
-                sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time())
-                production_mode = style["production_mode"]
-                if production_mode == '龙兵':
-                    schedule = calculate_schedule(
-                        sewing_start_time, 
-                        style["process_type"], 
-                        style["cycle"], 
-                        style["order_quantity"], 
-                        style["daily_production"],
-                        style["start_time_period"]
-                    )
-                elif production_mode == '贝贝':
-                    schedule = calculate_schedule_beibei(
-                        sewing_start_time, 
-                        style["process_type"], 
-                        style["cycle"], 
-                        style["order_quantity"], 
-                        style["daily_production"],
-                        style["start_time_period"])
-                elif production_mode == '补数':
-                    schedule = calculate_schedule_bushu(
-                        sewing_start_time, 
-                        style["process_type"], 
-                        style["cycle"], 
-                        style["order_quantity"], 
-                        style["daily_production"],
-                        style["start_time_period"])
-                else:
-                    raise ValueError(f"Invalid production_mode: {production_mode}")
-                
-                end_time = schedule["缝纫"]["缝纫结束"]["时间点"]
-                end_remark = schedule["缝纫"]["缝纫结束"].get("备注", "下午结束")
-                
-                if latest_end_time is None or end_time > latest_end_time:
-                    latest_end_time = end_time
-                    latest_end_remark = end_remark
-            
-            # 依次处理后续生产顺序组
-            for i in range(1, len(sorted_orders)):
-                current_order = sorted_orders[i]
-                current_order_styles = order_grouped_styles[current_order]
-                
-                # 前一个组的结束时间作为当前组的开始时间
-                start_date = latest_end_time.date()
-                
-                # 根据前一个结束时段确定当前组的开始时段
-                if "上午" in latest_end_remark:
-                    start_time_period = "上午"
-                else:
-                    start_time_period = "下午"
-                
-                # 将相同开始时间应用于该组中的所有款式
-                for style in current_order_styles:
-                    style["sewing_start_date"] = start_date
-                    style["start_time_period"] = start_time_period
-                    rearranged_styles.append(style)
-                
-                # 更新最晚结束时间以供下一个组使用
-                latest_end_time = None
-                latest_end_remark = "下午结束"
-                
-                for style in current_order_styles:
-                    sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time())
-                    production_mode = style["production_mode"]
-                    if production_mode == '龙兵':
-                        schedule = calculate_schedule(
-                            sewing_start_time, 
-                            style["process_type"], 
-                            style["cycle"], 
-                            style["order_quantity"], 
-                            style["daily_production"],
-                            style["start_time_period"]
-                        )
-                    elif production_mode == '贝贝':
-                        schedule = calculate_schedule_beibei(
-                            sewing_start_time, 
-                            style["process_type"], 
-                            style["cycle"], 
-                            style["order_quantity"], 
-                            style["daily_production"],
-                            style["start_time_period"])
-                    elif production_mode == '补数':
-                        schedule = calculate_schedule_bushu(
-                            sewing_start_time, 
-                            style["process_type"], 
-                            style["cycle"], 
-                            style["order_quantity"], 
-                            style["daily_production"],
-                            style["start_time_period"])
-                    else:
-                        raise ValueError(f"Invalid production_mode: {production_mode}")
-                    
-                    end_time = schedule["缝纫"]["缝纫结束"]["时间点"]
-                    end_remark = schedule["缝纫"]["缝纫结束"].get("备注", "下午结束")
-                    
-                    if latest_end_time is None or end_time > latest_end_time:
-                        latest_end_time = end_time
-                        latest_end_remark = end_remark
+
+            # 生产顺序、款式和开始时间都没有变化时沿用缓存的结束时间
+            key = (order, start_date, start_time_period, tuple(_sequence_key(style) for style in order_styles))
+            if i < len(cached_tiers) and cached_tiers[i]["key"] == key:
+                latest_index, latest_end = cached_tiers[i]["latest"], cached_tiers[i]["end"]
+            else:
+                latest_index, latest_end = _latest_sewing_end(order_styles)
+            tiers.append({"key": key, "latest": latest_index, "end": latest_end})
+        group_cache[group] = tiers
+    cache["groups"] = group_cache
     
     # 添加没有生产班组的款式
     for style in styles:
@@ -1551,17 +2075,305 @@ def rearrange_styles_by_production_group(styles):
     
     return rearranged_styles
 
-def generate_excel_report(styles):
-    """生成包含所有款式信息的Excel报表，以日期为列，款号为行"""
-    # 创建一个临时目录
-    temp_dir = tempfile.mkdtemp()
-    
+def _to_half_day(day, period, busdaycal=None):
+    """
+    把日期和上午/下午转换为半天序号（上午为偶数，下午为奇数），
+    传入工作日历时只计算工作日，非工作日视为下一个工作日
+    """
+    if busdaycal is None:
+        day_index = day.toordinal()
+    else:
+        day_index = int(np.busday_count(_WORKDAY_EPOCH, np.datetime64(day, "D"), busdaycal=busdaycal))
+    return day_index * 2 + (0 if period == "上午" else 1)
+
+def _from_half_day(half_day, busdaycal=None):
+    if busdaycal is None:
+        day = datetime.fromordinal(half_day // 2).date()
+    else:
+        day = np.busday_offset(_WORKDAY_EPOCH, half_day // 2, roll="forward", busdaycal=busdaycal).astype(datetime)
+    return day, "上午" if half_day % 2 == 0 else "下午"
+
+def _find_line_slot(line, release, duration, morning_only):
+    """
+    在产线已占用的区间（按开始排序、互不重叠）中查找不早于 release、
+    能连续容纳 duration 个半天的最早开始位置，返回 (开始半天序号, 插入位置)
+    """
+    starts, ends = line
+    i = bisect.bisect_right(ends, release)
+    candidate = release
+    while True:
+        if morning_only and candidate % 2:
+            candidate += 1
+        if i == len(starts) or candidate + duration <= starts[i]:
+            return candidate, i
+        candidate = max(candidate, ends[i])
+        i += 1
+
+@perf_span("line_scheduling")
+def schedule_production_lines(styles, line_capacity=1, capacity_calendar=None):
+    """
+    按产线产能为每个生产班组排产：每个生产班组有若干条产线，每条产线同一时间只生产一个款式，
+    以上午/下午半天为最小单位。款式按生产顺序（相同时按添加顺序）依次安排到能最早开始的产线上，
+    不早于款式自身的缝纫开始时间，缝纫天数与排产引擎的缝纫结束规则一致，生产过程中不拆分。
+
+    line_capacity: 每个生产班组的产线数，可以是整数或 {生产班组: 产线数}
+    capacity_calendar: {生产班组: {日期: 当天可用产线数}}，用于停线、减产等日期
+    手动调整后缝纫结束不晚于缝纫开始的款式无法安排，抛出 ValueError
+    返回排序后的款式列表，有生产班组的款式为副本，其中的缝纫开始日期/时段为安排的开始时间，并带有产线号(production_line)；
+    传入的款式不修改，每次都从款式自身的缝纫开始时间重新排产（删除或缩短前面的款式后，后面的款式会相应提前）
+    """
+    capacity_calendar = capacity_calendar or {}
+    calendar = get_factory_calendar()
+    busdaycal = None
+    if calendar is not None:
+        busdaycal = _busday_calendar(calendar["departments"].get("缝纫", calendar["weekmask"]), calendar["holidays"])
+    grouped_styles = {}
+    for index, style in enumerate(styles):
+        group = style.get("production_group", "")
+        if group:
+            grouped_styles.setdefault(group, []).append((style.get("production_order", 9999), index, dict(style)))
+
+    rearranged_styles = []
+    for group, entries in grouped_styles.items():
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        group_styles = [style for _, _, style in entries]
+        lines_count = line_capacity.get(group, 1) if isinstance(line_capacity, dict) else line_capacity
+        if lines_count < 1:
+            raise ValueError(f"Invalid line capacity for production group {group}: {lines_count}")
+
+        # 每条产线保存已占用区间的开始和结束半天序号；可用产线减少的日期预先占用
+        lines = [([], []) for _ in range(lines_count)]
+        for day, available in sorted(capacity_calendar.get(group, {}).items()):
+            if busdaycal is not None and not np.is_busday(np.datetime64(day, "D"), busdaycal=busdaycal):
+                continue
+            for starts, ends in lines[max(available, 0):]:
+                position = bisect.bisect_left(starts, _to_half_day(day, "上午", busdaycal))
+                starts.insert(position, _to_half_day(day, "上午", busdaycal))
+                ends.insert(position, _to_half_day(day, "上午", busdaycal) + 2)
+
+        # 缝纫所需（工作）半天数与开始日期无关，按款式原有开始时间一次性向量化计算；
+        # 带手动调整的款式按调整后的缝纫结束占用产线
+        windows = calculate_adjusted_sewing_windows(group_styles, calendar)
+        placements = []
+        for style, (end_time, end_remark) in zip(group_styles, windows):
+            start_day = style["sewing_start_date"]
+            if isinstance(start_day, datetime):
+                start_day = start_day.date()
+            morning_only = style["production_mode"] == "龙兵" and style["cycle"] == "1个月交期+确认5天"
+            release = _to_half_day(start_day, "上午" if morning_only else style.get("start_time_period", "上午"), busdaycal)
+            duration = _to_half_day(end_time.date(), end_remark, busdaycal) - release
+            if duration <= 0:
+                # 只有手动调整会使缝纫结束不晚于缝纫开始，这样的款式无法占用产线，不能按零长度处理
+                raise ValueError(f"Invalid schedule override for style {style['style_number']}: "
+                                 f"缝纫结束 {end_time.date()} {end_remark} is not after the sewing start {start_day}")
+
+            best = None
+            for line_index, line in enumerate(lines):
+                candidate, position = _find_line_slot(line, release, duration, morning_only)
+                if best is None or candidate < best[0]:
+                    best = (candidate, line_index, position)
+            candidate, line_index, position = best
+            starts, ends = lines[line_index]
+            starts.insert(position, candidate)
+            ends.insert(position, candidate + duration)
+
+            style["sewing_start_date"], style["start_time_period"] = _from_half_day(candidate, busdaycal)
+            style["production_line"] = line_index + 1
+            placements.append((candidate, line_index, style))
+
+        placements.sort(key=lambda placement: (placement[0], placement[1]))
+        rearranged_styles.extend(style for _, _, style in placements)
+
+    # 添加没有生产班组的款式
+    for style in styles:
+        if not style.get("production_group", ""):
+            rearranged_styles.append(style)
+
+    return rearranged_styles
+
+SEQUENCING_METHODS = ["按生产顺序衔接", "按产线产能排产"]
+
+def sequence_styles(styles, method="按生产顺序衔接", cache=None, line_capacity=1, capacity_calendar=None):
+    """ 按选择的连续排产方式安排生产班组内款式的缝纫开始时间 """
+    if method == "按生产顺序衔接":
+        return rearrange_styles_by_production_group(styles, cache)
+    elif method == "按产线产能排产":
+        return schedule_production_lines(styles, line_capacity, capacity_calendar)
+    else:
+        raise ValueError(f"Invalid sequencing method: {method}")
+
+def styles_fingerprint(styles, ordered=True):
+    """
+    款式列表内容的摘要，用于判断缓存的排产结果是否仍然有效；
+    ordered=False 时与款式顺序无关（导出结果本身会排序）
+    """
+    encoded = [json.dumps(style, sort_keys=True, ensure_ascii=False, default=str) for style in styles]
+    if not ordered:
+        encoded.sort()
+    return hashlib.sha1("\n".join(encoded).encode('utf-8')).hexdigest()
+
+@perf_span("sequencing_preview")
+def build_sequencing_preview(styles, method="按生产顺序衔接", cache=None, line_capacity=1):
+    """
+    连续排产后生成一张预览表：每行一个款式，包含生产班组、生产顺序（产能排产时还有产线）、
+    缝纫开始/结束时间，并标出每个生产顺序组中缝纫结束最晚、决定下一组开始时间的款式
+    """
+    sequenced_styles = sequence_styles(styles, method, cache, line_capacity)
+    # 与连续排产使用相同的缝纫结束（叠加手动调整）和相同的选择规则，预览标出的款式就是实际衔接的款式
+    sewing_ends = calculate_adjusted_sewing_windows(sequenced_styles, get_factory_calendar())
+
+    tiers = {}
+    for index, style in enumerate(sequenced_styles):
+        if style.get("production_group"):
+            tiers.setdefault((style["production_group"], style.get("production_order", 9999)), []).append(index)
+    latest_indices = {
+        indices[_latest_window_index([sewing_ends[index] for index in indices])]
+        for indices in tiers.values()
+    }
+
+    rows = []
+    for index, (style, (end_time, end_remark)) in enumerate(zip(sequenced_styles, sewing_ends)):
+        row = {
+            "生产班组": style.get("production_group") or "无生产班组",
+            "生产顺序": style.get("production_order", "-"),
+        }
+        if method == "按产线产能排产":
+            row["产线"] = style.get("production_line", "")
+        row.update({
+            "款号": style["style_number"],
+            "工序": style["process_type"],
+            "缝纫开始日期": style["sewing_start_date"],
+            "缝纫开始时间": style.get("start_time_period", "上午"),
+            "缝纫结束日期": end_time.date(),
+            "缝纫结束时间": end_remark,
+            "订单数量": style["order_quantity"],
+            "日产量": style["daily_production"],
+            "生产天数": round(style["order_quantity"] * 1.05 / style["daily_production"], 1),
+            "客户": style.get("company", ""),
+            "本顺序最晚结束": index in latest_indices,
+        })
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+# 导出文件缓存：按导出类型、渲染参数、工厂日历和款式内容寻址，超出容量时删除最久未使用的文件
+EXPORT_CACHE_DIR = DATA_DIR / "export_cache"
+EXPORT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# 数据目录所在磁盘至少保留的剩余空间，不足时先清理缓存，仍不足时导出结果不再写入磁盘
+EXPORT_MIN_FREE_BYTES = 1024 ** 3
+# 图表分辨率或绘图代码变化时修改，使旧的缓存失效
+EXPORT_RENDER_PROFILE = {"dpi": 300, "version": 1}
+_EXPORT_CACHE_LOCK = threading.Lock()
+
+def export_cache_key(kind, styles):
+    """ 导出内容的地址：款式按内容排序后摘要，与款式在列表中的顺序无关 """
+    content = (f"{kind}|{json.dumps(EXPORT_RENDER_PROFILE, sort_keys=True)}|{get_factory_calendar()!r}|"
+               f"{styles_fingerprint(styles, ordered=False)}")
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def _export_cache_path(key, suffix):
+    return EXPORT_CACHE_DIR / key[:2] / f"{key}{suffix}"
+
+def export_cache_get(key, suffix):
+    """ 返回缓存的文件路径并更新其使用时间，没有缓存时返回 None """
+    path = _export_cache_path(key, suffix)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def export_disk_low():
+    """ 数据目录所在磁盘的剩余空间是否低于保留值 """
+    return shutil.disk_usage(DATA_DIR).free < EXPORT_MIN_FREE_BYTES
+
+def export_cache_put(key, suffix, source, evict=True):
+    """
+    把导出内容（二进制文件对象）写入缓存（先写临时文件再替换，读取时不会读到不完整的文件），返回缓存路径；
+    磁盘空间不足无法写入时返回 None，由调用方直接使用内存中的内容。
+    连续写入很多文件时传 evict=False，写完后由调用方调用一次 evict_export_cache
+    """
+    path = _export_cache_path(key, suffix)
+    # 命令行批量导出时多个进程共用缓存，临时文件名同时包含进程号和线程号
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    if export_disk_low():
+        evict_export_cache()
+        if export_disk_low():
+            return None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        source.seek(0)
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        return None
+    if evict:
+        evict_export_cache()
+    return path
+
+def evict_export_cache(max_bytes=None):
+    """
+    缓存总大小超过上限、或磁盘剩余空间低于保留值时，按最近使用时间删除最旧的文件，返回删除后的总大小
+    """
+    max_bytes = EXPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _EXPORT_CACHE_LOCK:
+        entries = []
+        for path in EXPORT_CACHE_DIR.glob("*/*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        # 只查询一次磁盘剩余空间，算出需要释放的字节数，再按最近使用时间删除
+        need = max(total - max_bytes, EXPORT_MIN_FREE_BYTES - shutil.disk_usage(DATA_DIR).free)
+        for _, size, path in sorted(entries):
+            if need <= 0:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            need -= size
+    return total
+
+# 导出内容先写入内存，超过该大小后转存到匿名临时文件，关闭后即释放，不会在磁盘上留下文件
+EXPORT_SPOOL_MAX_BYTES = 64 * 1024 ** 2
+
+def export_buffer():
+    """ 导出函数返回的缓冲区，调用方读取后用 with 语句或 close() 释放 """
+    return tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+
+def write_figure_to_zip(zipf, fig, name):
+    """ 把图表保存为PNG直接写入ZIP并关闭图表（PNG本身已经压缩，直接存储） """
+    image = io.BytesIO()
+    try:
+        with perf_span("savefig", aggregate=True):
+            fig.savefig(image, format='png', dpi=EXPORT_RENDER_PROFILE["dpi"], bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    with perf_span("zipping", aggregate=True):
+        zipf.writestr(name, image.getvalue(), compress_type=zipfile.ZIP_STORED)
+
+@perf_span("export_excel")
+def generate_excel_report(styles, progress=None):
+    """
+    生成包含所有款式信息的Excel报表，以日期为列，款号为行，返回包含报表内容的缓冲区；
+    progress(已完成, 总数) 用于报告进度
+    """
     # 收集所有日期和步骤信息
     all_dates = set()
     style_steps = {}
     
-    # 处理每个款式
-    for style in styles:
+    # 批量计算没有schedule的款式
+    pending_styles = [style for style in styles if "schedule" not in style]
+    computed_schedules = iter(calculate_style_schedules(pending_styles, get_factory_calendar()))
+
+    # 处理每个款式（写入表格算作最后一步）
+    for index, style in enumerate(styles):
+        if progress:
+            progress(index, len(styles) + 1)
         style_number = style["style_number"]
         style_steps[style_number] = {}
         
@@ -1569,37 +2381,9 @@ def generate_excel_report(styles):
         if "schedule" in style:
             schedule = style["schedule"]
         else:
-            # 否则重新计算schedule
-            sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time()) if not isinstance(style["sewing_start_date"], datetime) else style["sewing_start_date"]
-            production_mode = style["production_mode"]
-            if production_mode == '龙兵':
-                schedule = calculate_schedule(
-                    sewing_start_time, 
-                    style["process_type"], 
-                    style["cycle"], 
-                    style["order_quantity"], 
-                    style["daily_production"],
-                    style.get("start_time_period", "上午")
-                )
-            elif production_mode == '贝贝':
-                schedule = calculate_schedule_beibei(
-                    sewing_start_time, 
-                    style["process_type"], 
-                    style["cycle"], 
-                    style["order_quantity"], 
-                    style["daily_production"],
-                    style.get("start_time_period", "上午"))
-            elif production_mode == '补数':
-                schedule = calculate_schedule_bushu(
-                    sewing_start_time, 
-                    style["process_type"], 
-                    style["cycle"], 
-                    style["order_quantity"], 
-                    style["daily_production"],
-                    style.get("start_time_period", "上午"))
-            else:
-                raise ValueError(f"Invalid production_mode: {production_mode}")
-        
+            # 否则使用批量计算的schedule
+            schedule = next(computed_schedules)
+
         # 收集每个步骤的日期和备注
         for dept, steps in schedule.items():
             for step, info in steps.items():
@@ -1660,199 +2444,176 @@ def generate_excel_report(styles):
         columns.append("交期")
     columns += [col for col in df.columns if col not in ["客户", "款号", "交期"]]
     df = df[columns]
-    # 保存为Excel文件
-    excel_path = os.path.join(temp_dir, "生产计划报表.xlsx")
-    
-    # 创建Excel写入器
-    writer = pd.ExcelWriter(excel_path, engine='openpyxl')
-    df.to_excel(writer, index=False, sheet_name='生产计划', startrow=1)
-    
-    # 获取工作簿和工作表
-    workbook = writer.book
-    worksheet = writer.sheets['生产计划']
-    
-    # 定义边框样式
-    thin_border = openpyxl.styles.Border(
-        left=openpyxl.styles.Side(style='thin'),
-        right=openpyxl.styles.Side(style='thin'),
-        top=openpyxl.styles.Side(style='thin'),
-        bottom=openpyxl.styles.Side(style='thin')
-    )
+    # 创建Excel写入器，直接写入缓冲区
+    buffer = export_buffer()
+    try:
+        writer = pd.ExcelWriter(buffer, engine='openpyxl')
+        df.to_excel(writer, index=False, sheet_name='生产计划', startrow=1)
+    
+        # 获取工作簿和工作表
+        workbook = writer.book
+        worksheet = writer.sheets['生产计划']
+    
+        # 定义边框样式
+        thin_border = openpyxl.styles.Border(
+            left=openpyxl.styles.Side(style='thin'),
+            right=openpyxl.styles.Side(style='thin'),
+            top=openpyxl.styles.Side(style='thin'),
+            bottom=openpyxl.styles.Side(style='thin')
+        )
 
-    # 定义每个步骤的颜色 (添加alpha通道为FF表示完全不透明)
-    step_colors = {
-        # 产前确认部门
-        "产前确认-代用面料裁剪": "FFFFE0A0",  # 浅黄色
-        "产前确认-满花样品": "FFFFD580",      # 橙色
-        "产前确认-局花样品": "FFFFC060",      # 深橙色
-        "产前确认-绣花样品": "FFFFB040",      # 红橙色
-        "产前确认-版型": "FFFFA020",          # 红色
-        "产前确认-代用样品发送": "FFFF9020",  # 深红色
-        "产前确认-版型确认": "FFFF8020",      # 暗红色
-        "产前确认-印绣样品确认": "FFFF7020",  # 更暗红色
-        "产前确认-辅料样发送": "FFFF6020",    # 最暗红色
-        "产前确认-辅料确认": "FFFF5020",      # 深暗红色
-        "产前确认-色样发送": "FFFF4020",      # 更暗红色
-        "产前确认-色样确认": "FFFF3020",      # 最暗红色
+        # 定义每个步骤的颜色 (添加alpha通道为FF表示完全不透明)
+        step_colors = {
+            # 产前确认部门
+            "产前确认-代用面料裁剪": "FFFFE0A0",  # 浅黄色
+            "产前确认-满花样品": "FFFFD580",      # 橙色
+            "产前确认-局花样品": "FFFFC060",      # 深橙色
+            "产前确认-绣花样品": "FFFFB040",      # 红橙色
+            "产前确认-版型": "FFFFA020",          # 红色
+            "产前确认-代用样品发送": "FFFF9020",  # 深红色
+            "产前确认-版型确认": "FFFF8020",      # 暗红色
+            "产前确认-印绣样品确认": "FFFF7020",  # 更暗红色
+            "产前确认-辅料样发送": "FFFF6020",    # 最暗红色
+            "产前确认-辅料确认": "FFFF5020",      # 深暗红色
+            "产前确认-色样发送": "FFFF4020",      # 更暗红色
+            "产前确认-色样确认": "FFFF3020",      # 最暗红色
         
-        # 面料部门
-        "面料-仕样书": "FFFFE0C0",            # 浅橙色
-        "面料-工艺分析": "FFFFD0B0",          # 橙色
-        "面料-排版": "FFFFC0A0",              # 深橙色
-        "面料-用料": "FFFFB090",              # 红橙色
-        "面料-棉纱": "FFFFA080",              # 红色
-        "面料-毛坯": "FFFF9070",              # 深红色
-        "面料-光坯": "FFFF8060",              # 暗红色
-        "面料-物理检测验布": "FFFF7050",      # 更暗红色
+            # 面料部门
+            "面料-仕样书": "FFFFE0C0",            # 浅橙色
+            "面料-工艺分析": "FFFFD0B0",          # 橙色
+            "面料-排版": "FFFFC0A0",              # 深橙色
+            "面料-用料": "FFFFB090",              # 红橙色
+            "面料-棉纱": "FFFFA080",              # 红色
+            "面料-毛坯": "FFFF9070",              # 深红色
+            "面料-光坯": "FFFF8060",              # 暗红色
+            "面料-物理检测验布": "FFFF7050",      # 更暗红色
         
-        # 满花部门
-        "满花-满花工艺": "FFC0E0FF",          # 浅蓝色
-        "满花-满花": "FFA0D0FF",              # 蓝色
-        "满花-满花后整": "FF80C0FF",          # 深蓝色
-        "满花-物理检测": "FF60B0FF",          # 更深的蓝色
+            # 满花部门
+            "满花-满花工艺": "FFC0E0FF",          # 浅蓝色
+            "满花-满花": "FFA0D0FF",              # 蓝色
+            "满花-满花后整": "FF80C0FF",          # 深蓝色
+            "满花-物理检测": "FF60B0FF",          # 更深的蓝色
         
-        # 裁剪部门
-        "裁剪-工艺样版": "FFC0FFC0",          # 浅绿色
-        "裁剪-裁剪": "FFA0FFA0",              # 绿色
+            # 裁剪部门
+            "裁剪-工艺样版": "FFC0FFC0",          # 浅绿色
+            "裁剪-裁剪": "FFA0FFA0",              # 绿色
         
-        # 局花部门
-        "局花-局花工艺": "FFFFC0E0",          # 浅粉色
-        "局花-局花": "FFFFA0D0",              # 粉色
-        "局花-物理检测": "FFFF80C0",          # 深粉色
+            # 局花部门
+            "局花-局花工艺": "FFFFC0E0",          # 浅粉色
+            "局花-局花": "FFFFA0D0",              # 粉色
+            "局花-物理检测": "FFFF80C0",          # 深粉色
         
-        # 配片部门
-        "配片-配片": "FFFFD0C0",              # 浅珊瑚色
+            # 配片部门
+            "配片-配片": "FFFFD0C0",              # 浅珊瑚色
         
-        # 滚领部门
-        "滚领-滚领": "FFC0FFD0",              # 浅薄荷色
+            # 滚领部门
+            "滚领-滚领": "FFC0FFD0",              # 浅薄荷色
         
-        # 辅料部门
-        "辅料-辅料限额": "FFE0FFC0",          # 浅黄绿色
-        "辅料-辅料": "FFD0FFB0",              # 黄绿色
-        "辅料-物理检测": "FFC0FFA0",          # 深黄绿色
+            # 辅料部门
+            "辅料-辅料限额": "FFE0FFC0",          # 浅黄绿色
+            "辅料-辅料": "FFD0FFB0",              # 黄绿色
+            "辅料-物理检测": "FFC0FFA0",          # 深黄绿色
         
-        # 缝纫部门
-        "缝纫-缝纫工艺": "FFFFC0C0",          # 浅红色
-        "缝纫-缝纫开始": "FFFFA0A0",          # 红色
-        "缝纫-缝纫结束": "FFFF8080",          # 深红色
+            # 缝纫部门
+            "缝纫-缝纫工艺": "FFFFC0C0",          # 浅红色
+            "缝纫-缝纫开始": "FFFFA0A0",          # 红色
+            "缝纫-缝纫结束": "FFFF8080",          # 深红色
         
-        # 后整部门
-        "后整-后整": "FFFFE0C0",              # 浅杏色
+            # 后整部门
+            "后整-后整": "FFFFE0C0",              # 浅杏色
         
-        # 工艺部门
-        "工艺-工艺": "FFC1FFE1"               # 浅青色
-    }
+            # 工艺部门
+            "工艺-工艺": "FFC1FFE1"               # 浅青色
+        }
     
-    # 添加标题行
-    title_cell = worksheet['A1']
-    title_cell.value = "生产计划跟踪记录"
-    worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(df.columns))
-    title_cell.font = openpyxl.styles.Font(bold=True, size=24)
-    title_cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='center')
-    
-    # 设置列宽和自动换行
-    for i, col in enumerate(df.columns):
-        # 获取Excel列引用
-        col_letter = openpyxl.utils.get_column_letter(i + 1)
+        # 添加标题行
+        title_cell = worksheet['A1']
+        title_cell.value = "生产计划跟踪记录"
+        worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(df.columns))
+        title_cell.font = openpyxl.styles.Font(bold=True, size=24)
+        title_cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='center')
+    
+        # 设置列宽和自动换行
+        for i, col in enumerate(df.columns):
+            # 获取Excel列引用
+            col_letter = openpyxl.utils.get_column_letter(i + 1)
         
-        # 设置列宽
-        if col == "款号":
-            column_width = max(len(str(col)), df[col].astype(str).map(len).max())
-        else:
-            column_width = 15  # 固定日期列的宽度
-        worksheet.column_dimensions[col_letter].width = min(column_width + 2, 30)
+            # 设置列宽
+            if col == "款号":
+                column_width = max(len(str(col)), df[col].astype(str).map(len).max())
+            else:
+                column_width = 15  # 固定日期列的宽度
+            worksheet.column_dimensions[col_letter].width = min(column_width + 2, 30)
         
-        # 设置自动换行和边框
-        for row in range(1, len(df) + 3):  # +3 because Excel is 1-based and we added a title row
-            cell = worksheet[f"{col_letter}{row}"]
-            cell.border = thin_border
+            # 设置自动换行和边框
+            for row in range(1, len(df) + 3):  # +3 because Excel is 1-based and we added a title row
+                cell = worksheet[f"{col_letter}{row}"]
+                cell.border = thin_border
             
-            # 设置对齐方式
-            if row == 2:  # 表头行 (now row 2 because of title)
-                cell.alignment = openpyxl.styles.Alignment(horizontal='center', vertical='center')
-            elif row == 1:  # 标题行
-                continue  # Skip title row as it's already formatted
-            elif col == "款号":  # 款号列
-                cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
-            else:  # 日期列
-                cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
+                # 设置对齐方式
+                if row == 2:  # 表头行 (now row 2 because of title)
+                    cell.alignment = openpyxl.styles.Alignment(horizontal='center', vertical='center')
+                elif row == 1:  # 标题行
+                    continue  # Skip title row as it's already formatted
+                elif col == "款号":  # 款号列
+                    cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
+                else:  # 日期列
+                    cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
                 
-                # # 为单元格内容添加颜色
-                # if row > 2 and cell.value:  # 跳过标题和表头行
-                #     # 分割多行内容
-                #     step_lines = cell.value.split('\n')
+                    # # 为单元格内容添加颜色
+                    # if row > 2 and cell.value:  # 跳过标题和表头行
+                    #     # 分割多行内容
+                    #     step_lines = cell.value.split('\n')
                     
-                #     # 创建一个新的单元格，用于存储带颜色的文本
-                #     new_cell = worksheet[f"{col_letter}{row}"]
+                    #     # 创建一个新的单元格，用于存储带颜色的文本
+                    #     new_cell = worksheet[f"{col_letter}{row}"]
                     
-                #     # 处理每一行
-                #     for i, line in enumerate(step_lines):
-                #         # 提取步骤名称（去除生产班组信息和备注）
-                #         step_name = line.split(' (')[0].split(' [')[0]
+                    #     # 处理每一行
+                    #     for i, line in enumerate(step_lines):
+                    #         # 提取步骤名称（去除生产班组信息和备注）
+                    #         step_name = line.split(' (')[0].split(' [')[0]
                         
-                #         # 查找匹配的步骤颜色
-                #         color_found = False
-                #         for step_key, color in step_colors.items():
-                #             if line.startswith(step_key):
-                #                 # 设置文本颜色
-                #                 new_cell.font = openpyxl.styles.Font(color=color)
-                #                 color_found = True
-                #                 break
+                    #         # 查找匹配的步骤颜色
+                    #         color_found = False
+                    #         for step_key, color in step_colors.items():
+                    #             if line.startswith(step_key):
+                    #                 # 设置文本颜色
+                    #                 new_cell.font = openpyxl.styles.Font(color=color)
+                    #                 color_found = True
+                    #                 break
                         
-                #         # 如果没有找到匹配的步骤，使用默认颜色（黑色）
-                #         if not color_found:
-                #             new_cell.font = openpyxl.styles.Font(color="FF000000")
+                    #         # 如果没有找到匹配的步骤，使用默认颜色（黑色）
+                    #         if not color_found:
+                    #             new_cell.font = openpyxl.styles.Font(color="FF000000")
     
-    # 冻结首行和款号列（如果有交期则冻结到交期列）
-    if "交期" in df.columns:
-        worksheet.freeze_panes = 'D3'
-    else:
-        worksheet.freeze_panes = 'C3'
+        # 冻结首行和款号列（如果有交期则冻结到交期列）
+        if "交期" in df.columns:
+            worksheet.freeze_panes = 'D3'
+        else:
+            worksheet.freeze_panes = 'C3'
     
-    # 保存并关闭Excel文件
-    writer.close()
+        # 保存并关闭Excel文件
+        writer.close()
+        if progress:
+            progress(len(styles) + 1, len(styles) + 1)
     
-    return excel_path
+    except BaseException:
+        # 出错时关闭缓冲区（可能已转存到临时文件）
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
 
 
-def generate_department_wise_excel(styles):
-    """为每个部门生成单独的Excel报表，并打包为ZIP文件"""
-    import shutil
-    # 创建一个临时目录
-    temp_dir = tempfile.mkdtemp()
-    excel_paths = []
+@perf_span("export_department_excel")
+def generate_department_wise_excel(styles, progress=None):
+    """
+    为每个部门生成单独的Excel报表，逐个写入ZIP，返回包含ZIP内容的缓冲区；
+    progress(已完成, 总数) 用于报告进度
+    """
     all_schedules = []
     # 计算所有款式的计划
-    for style in styles:
-        sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time()) if not isinstance(style["sewing_start_date"], datetime) else style["sewing_start_date"]
-        production_mode = style["production_mode"]
-        if production_mode == '龙兵':
-            schedule = calculate_schedule(
-                sewing_start_time, 
-                style["process_type"], 
-                style["cycle"], 
-                style["order_quantity"], 
-                style["daily_production"],
-                style.get("start_time_period", "上午")
-            )
-        elif production_mode == '贝贝':
-            schedule = calculate_schedule_beibei(
-                sewing_start_time, 
-                style["process_type"], 
-                style["cycle"], 
-                style["order_quantity"], 
-                style["daily_production"],
-                style.get("start_time_period", "上午"))
-        elif production_mode == '补数':
-            schedule = calculate_schedule_bushu(
-                sewing_start_time, 
-                style["process_type"], 
-                style["cycle"], 
-                style["order_quantity"], 
-                style["daily_production"],
-                style.get("start_time_period", "上午"))
-        else:
-            raise ValueError(f"Invalid production_mode: {production_mode}")
+    for style, schedule in zip(styles, calculate_style_schedules(styles, get_factory_calendar())):
         for dept, steps in schedule.items():
             for step, info in steps.items():
                 time_point = info["时间点"]
@@ -1873,100 +2634,114 @@ def generate_department_wise_excel(styles):
                 all_schedules.append(step_data)
     df = pd.DataFrame(all_schedules)
     departments = df["部门"].unique()
-    for dept in departments:
-        dept_data = df[df["部门"] == dept].copy()
-        dept_data = dept_data.sort_values(["日期", "款号"])
-        pivot_data = []
-        unique_styles = dept_data["款号"].unique()
-        unique_dates = sorted(dept_data["日期"].unique())
-        # Check if any style has delivery_date to determine if we need 交期 column
-        has_delivery_date = any("delivery_date" in style for style in styles)
-        for style in unique_styles:
-            style_data = dept_data[dept_data["款号"] == style]
-            row = {
-                "客户": style_data.iloc[0]["客户"],
-                "款号": style,
-                "生产班组": style_data.iloc[0]["生产班组"],
-                "工序": style_data.iloc[0]["工序"]
-            }
-            # 新增交期
-            # Add 交期 right after 工序 if any style has delivery_date
-            if has_delivery_date:
-                style_obj = next((s for s in styles if s["style_number"] == style), None)
-                if style_obj and "delivery_date" in style_obj:
-                    row["交期"] = style_obj["delivery_date"]
-                else:
-                    row["交期"] = ""
-            # style_obj = next((s for s in styles if s["style_number"] == style), None)
-            # if style_obj and "delivery_date" in style_obj:
-            #     row["交期"] = style_obj["delivery_date"]
-            for date in unique_dates:
-                date_steps = style_data[style_data["日期"] == date]
-                if len(date_steps) > 0:
-                    step_info = []
-                    for _, step_row in date_steps.iterrows():
-                        step_text = step_row["步骤"]
-                        if step_row["备注"]:
-                            step_text += f" [{step_row['备注']}]"
-                        step_info.append(step_text)
-                    row[date] = "\n".join(step_info)
+    buffer = export_buffer()
+    zipf = None
+    try:
+        zipf = zipfile.ZipFile(buffer, 'w')
+        for dept_index, dept in enumerate(departments):
+            if progress:
+                progress(dept_index, len(departments))
+            dept_data = df[df["部门"] == dept].copy()
+            dept_data = dept_data.sort_values(["日期", "款号"])
+            pivot_data = []
+            unique_styles = dept_data["款号"].unique()
+            unique_dates = sorted(dept_data["日期"].unique())
+            # Check if any style has delivery_date to determine if we need 交期 column
+            has_delivery_date = any("delivery_date" in style for style in styles)
+            for style in unique_styles:
+                style_data = dept_data[dept_data["款号"] == style]
+                row = {
+                    "客户": style_data.iloc[0]["客户"],
+                    "款号": style,
+                    "生产班组": style_data.iloc[0]["生产班组"],
+                    "工序": style_data.iloc[0]["工序"]
+                }
+                # 新增交期
+                # Add 交期 right after 工序 if any style has delivery_date
+                if has_delivery_date:
+                    style_obj = next((s for s in styles if s["style_number"] == style), None)
+                    if style_obj and "delivery_date" in style_obj:
+                        row["交期"] = style_obj["delivery_date"]
+                    else:
+                        row["交期"] = ""
+                # style_obj = next((s for s in styles if s["style_number"] == style), None)
+                # if style_obj and "delivery_date" in style_obj:
+                #     row["交期"] = style_obj["delivery_date"]
+                for date in unique_dates:
+                    date_steps = style_data[style_data["日期"] == date]
+                    if len(date_steps) > 0:
+                        step_info = []
+                        for _, step_row in date_steps.iterrows():
+                            step_text = step_row["步骤"]
+                            if step_row["备注"]:
+                                step_text += f" [{step_row['备注']}]"
+                            step_info.append(step_text)
+                        row[date] = "\n".join(step_info)
+                    else:
+                        row[date] = ""
+                pivot_data.append(row)
+            dept_df = pd.DataFrame(pivot_data)
+            workbook_buffer = io.BytesIO()
+            writer = pd.ExcelWriter(workbook_buffer, engine='openpyxl')
+            dept_df.to_excel(writer, index=False, sheet_name=dept, startrow=1)
+            workbook = writer.book
+            worksheet = writer.sheets[dept]
+            thin_border = openpyxl.styles.Border(
+                left=openpyxl.styles.Side(style='thin'),
+                right=openpyxl.styles.Side(style='thin'),
+                top=openpyxl.styles.Side(style='thin'),
+                bottom=openpyxl.styles.Side(style='thin')
+            )
+            title_cell = worksheet['A1']
+            title_cell.value = f"{dept}部门生产计划"
+            worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(dept_df.columns))
+            title_cell.font = openpyxl.styles.Font(bold=True, size=16)
+            title_cell.alignment = openpyxl.styles.Alignment(horizontal='center', vertical='center')
+            for i, col in enumerate(dept_df.columns):
+                col_letter = openpyxl.utils.get_column_letter(i + 1)
+                if col in ["款号", "生产班组"]:
+                    column_width = max(len(str(col)), dept_df[col].astype(str).map(len).max())
                 else:
-                    row[date] = ""
-            pivot_data.append(row)
-        dept_df = pd.DataFrame(pivot_data)
-        excel_path = os.path.join(temp_dir, f"{dept}部门生产计划报表.xlsx")
-        writer = pd.ExcelWriter(excel_path, engine='openpyxl')
-        dept_df.to_excel(writer, index=False, sheet_name=dept, startrow=1)
-        workbook = writer.book
-        worksheet = writer.sheets[dept]
-        thin_border = openpyxl.styles.Border(
-            left=openpyxl.styles.Side(style='thin'),
-            right=openpyxl.styles.Side(style='thin'),
-            top=openpyxl.styles.Side(style='thin'),
-            bottom=openpyxl.styles.Side(style='thin')
-        )
-        title_cell = worksheet['A1']
-        title_cell.value = f"{dept}部门生产计划"
-        worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(dept_df.columns))
-        title_cell.font = openpyxl.styles.Font(bold=True, size=16)
-        title_cell.alignment = openpyxl.styles.Alignment(horizontal='center', vertical='center')
-        for i, col in enumerate(dept_df.columns):
-            col_letter = openpyxl.utils.get_column_letter(i + 1)
-            if col in ["款号", "生产班组"]:
-                column_width = max(len(str(col)), dept_df[col].astype(str).map(len).max())
+                    column_width = 15
+                worksheet.column_dimensions[col_letter].width = min(column_width + 2, 30)
+                for row in range(1, len(dept_df) + 3):
+                    cell = worksheet[f"{col_letter}{row}"]
+                    cell.border = thin_border
+                    if row == 2:
+                        cell.alignment = openpyxl.styles.Alignment(horizontal='center', vertical='center')
+                    elif row == 1:
+                        continue
+                    elif col in ["款号", "生产班组"]:
+                        cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
+                    else:
+                        cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
+            # Set freeze panes correctly
+            if has_delivery_date:
+                worksheet.freeze_panes = 'F3'  # Freeze up to 交期 column (A,B,C,D,E = 客户,款号,生产班组,工序,交期)
             else:
-                column_width = 15
-            worksheet.column_dimensions[col_letter].width = min(column_width + 2, 30)
-            for row in range(1, len(dept_df) + 3):
-                cell = worksheet[f"{col_letter}{row}"]
-                cell.border = thin_border
-                if row == 2:
-                    cell.alignment = openpyxl.styles.Alignment(horizontal='center', vertical='center')
-                elif row == 1:
-                    continue
-                elif col in ["款号", "生产班组"]:
-                    cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
-                else:
-                    cell.alignment = openpyxl.styles.Alignment(horizontal='left', vertical='top', wrap_text=True)
-        # Set freeze panes correctly
-        if has_delivery_date:
-            worksheet.freeze_panes = 'F3'  # Freeze up to 交期 column (A,B,C,D,E = 客户,款号,生产班组,工序,交期)
-        else:
-            worksheet.freeze_panes = 'E3'   # Freeze up to 工序 column (A,B,C,D = 客户,款号,生产班组,工序)
+                worksheet.freeze_panes = 'E3'   # Freeze up to 工序 column (A,B,C,D = 客户,款号,生产班组,工序)
         
-        # worksheet.freeze_panes = 'E3'
-        writer.close()
-        excel_paths.append(excel_path)
-    # 打包为ZIP
-    zip_path = os.path.join(temp_dir, "部门生产计划报表.zip")
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for excel_file in excel_paths:
-            zipf.write(excel_file, os.path.basename(excel_file))
-    return zip_path
+            # worksheet.freeze_panes = 'E3'
+            writer.close()
+            # xlsx 本身已经压缩，直接存储
+            with perf_span("zipping", aggregate=True):
+                zipf.writestr(f"{dept}部门生产计划报表.xlsx", workbook_buffer.getvalue())
+        zipf.close()
+        if progress:
+            progress(len(departments), len(departments))
+    except BaseException:
+        # 出错时先关闭 ZIP 再关闭缓冲区（可能已转存到临时文件）
+        if zipf is not None:
+            zipf.close()
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
 
         
 # 画时间线
-def plot_timeline(schedule, process_type, confirmation_period):
+@perf_span("plotting", aggregate=True)
+def plot_timeline(schedule, process_type, confirmation_period, style_number=None, production_group=None):
     # 根据工序类型定义部门顺序和颜色
     if process_type == "满花局花":
         department_order = ["工艺", "后整", "缝纫", "辅料", "滚领", "配片", "局花", "裁剪", "满花", "面料", "产前确认"]
@@ -2274,13 +3049,17 @@ def plot_timeline(schedule, process_type, confirmation_period):
     
     # 设置标题
     title_text = f"生产流程时间表 - {process_type}"
-    if "style_number" in st.session_state and st.session_state["style_number"]:
-        style_number_text = "款号: " + str(st.session_state["style_number"])
+    # 未显式传入款号时沿用页面中当前的款号和生产班组
+    if style_number is None:
+        style_number = st.session_state.get("style_number")
+        production_group = st.session_state.get("production_group")
+    if style_number:
+        style_number_text = "款号: " + str(style_number)
         # 将款号分成每行最多30个字符
         style_number_wrapped = [style_number_text[i:i+30] for i in range(0, len(style_number_text), 30)]
         # Add production group if available
-        if "production_group" in st.session_state and st.session_state["production_group"]:
-            group_text = f"生产班组: {st.session_state['production_group']}"
+        if production_group:
+            group_text = f"生产班组: {production_group}"
             style_number_wrapped.append(group_text)
         title_text += "\n" + "\n".join(style_number_wrapped)
     ax.set_title(title_text, fontsize=30, fontweight='bold', y=1.02 + 0.02 * (len(style_number_wrapped) if 'style_number_wrapped' in locals() else 0), fontproperties=prop)
@@ -2292,7 +3071,12 @@ def plot_timeline(schedule, process_type, confirmation_period):
     return fig  # Return the figure instead of displaying it
 
 # Function to generate department-specific plots
-def generate_department_wise_plots(styles):
+@perf_span("export_department_plots")
+def generate_department_wise_plots(styles, progress=None):
+    """
+    为每个部门（以及缝纫部门的每个生产班组）生成时间线图，逐张写入ZIP，返回包含ZIP内容的缓冲区；
+    progress(已完成, 总数) 用于报告进度
+    """
     all_schedules = []
     department_colors = {
             "产前确认": "#FFF0C1",
@@ -2310,37 +3094,7 @@ def generate_department_wise_plots(styles):
         }
     
     # Calculate schedules for all styles
-    for style in styles:
-        sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time())
-        start_time_period = style.get("start_time_period", "上午")  # 获取上午/下午信息
-        production_mode = style["production_mode"]
-        if production_mode == '龙兵':
-            schedule = calculate_schedule(
-                sewing_start_time, 
-                style["process_type"], 
-                style["cycle"], 
-                style["order_quantity"], 
-                style["daily_production"],
-                start_time_period
-            )
-        elif production_mode == '贝贝':
-            schedule = calculate_schedule_beibei(
-                sewing_start_time, 
-                style["process_type"], 
-                style["cycle"], 
-                style["order_quantity"], 
-                style["daily_production"],
-                start_time_period)
-        elif production_mode == '补数':
-            schedule = calculate_schedule_bushu(
-                sewing_start_time, 
-                style["process_type"], 
-                style["cycle"], 
-                style["order_quantity"], 
-                style["daily_production"],
-                start_time_period)
-        else:
-            raise ValueError(f"Invalid production_mode: {production_mode}")
+    for style, schedule in zip(styles, calculate_style_schedules(styles, get_factory_calendar())):
         for dept, steps in schedule.items():
             for step, data in steps.items():
                 # 创建一个新字典来存储步骤数据
@@ -2362,413 +3116,775 @@ def generate_department_wise_plots(styles):
     # Convert to DataFrame for sorting
     df = pd.DataFrame(all_schedules)
     
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
+    buffer = export_buffer()
+    fig = None
+    zipf = None
+    try:
+        zipf = zipfile.ZipFile(buffer, 'w')
+
+        # 每个部门一张图，缝纫部门每个生产班组再各一张
+        total_plots = len(df["department"].unique()) + sum(
+            1 for group in df.loc[df["department"] == "缝纫", "production_group"].unique() if group)
+        finished_plots = 0
     
-    # Generate department-wise plots
-    for department in df["department"].unique():
-        dept_data = df[df["department"] == department].copy()
+        # Generate department-wise plots
+        for department in df["department"].unique():
+            dept_data = df[df["department"] == department].copy()
         
-        # Sort by date (latest first) and then by style number
-       # 1. 计算每个款式的最早步骤时间
-        earliest_dates = dept_data.groupby("style_number")["date"].min().reset_index()
-        earliest_dates.rename(columns={"date": "earliest_date"}, inplace=True)
+            # Sort by date (latest first) and then by style number
+           # 1. 计算每个款式的最早步骤时间
+            earliest_dates = dept_data.groupby("style_number")["date"].min().reset_index()
+            earliest_dates.rename(columns={"date": "earliest_date"}, inplace=True)
         
-        # 2. 将最早日期合并回原始数据
-        dept_data = pd.merge(dept_data, earliest_dates, on="style_number", how="left")
+            # 2. 将最早日期合并回原始数据
+            dept_data = pd.merge(dept_data, earliest_dates, on="style_number", how="left")
         
-        # 3. 按最早日期排序（升序，最早的在前），然后按款式号排序
-        dept_data.sort_values(by=["earliest_date", "style_number"], ascending=[False, False], inplace=True)
+            # 3. 按最早日期排序（升序，最早的在前），然后按款式号排序
+            dept_data.sort_values(by=["earliest_date", "style_number"], ascending=[False, False], inplace=True)
         
-        # 4. 获取排序后的唯一款式号列表（保持顺序）
-        unique_sorted_styles = dept_data["style_number"].unique()
+            # 4. 获取排序后的唯一款式号列表（保持顺序）
+            unique_sorted_styles = dept_data["style_number"].unique()
         
-        # Calculate time range for dynamic sizing
-        date_range = (dept_data["date"].max() - dept_data["date"].min()).days
-        base_width = int(date_range/41*40)
-        if base_width > 24:
-            dpi_scale = base_width / 24
-            plt.rcParams['figure.dpi'] = int(300 * dpi_scale)
-            plt.rcParams['savefig.dpi'] = int(300 * dpi_scale)
+            # Calculate time range for dynamic sizing
+            date_range = (dept_data["date"].max() - dept_data["date"].min()).days
+            base_width = int(date_range/41*40)
+            if base_width > 24:
+                dpi_scale = base_width / 24
+                plt.rcParams['figure.dpi'] = int(300 * dpi_scale)
+                plt.rcParams['savefig.dpi'] = int(300 * dpi_scale)
         
-        # Create figure with dynamic sizing
-        fig, ax = plt.subplots(figsize=(max(base_width, 25), len(unique_sorted_styles) * 3))
-        fig.patch.set_facecolor('white')
-        ax.set_facecolor('white')
+            # Create figure with dynamic sizing
+            fig, ax = plt.subplots(figsize=(max(base_width, 25), len(unique_sorted_styles) * 3))
+            fig.patch.set_facecolor('white')
+            ax.set_facecolor('white')
         
-        # Calculate y positions for each style number - use the sorted styles
-        y_positions = {style: idx * 1.5 for idx, style in enumerate(unique_sorted_styles)}
+            # Calculate y positions for each style number - use the sorted styles
+            y_positions = {style: idx * 1.5 for idx, style in enumerate(unique_sorted_styles)}
         
-        # Create colored background for the department
-        ax.fill_betweenx(
-            [min(y_positions.values()) - 0.4, max(y_positions.values()) + 0.4],
-            0, 1,
-            color=department_colors.get(department, "#DDDDDD"),
-            alpha=0.5
-        )
+            # Create colored background for the department
+            ax.fill_betweenx(
+                [min(y_positions.values()) - 0.4, max(y_positions.values()) + 0.4],
+                0, 1,
+                color=department_colors.get(department, "#DDDDDD"),
+                alpha=0.5
+            )
         
-        # Plot timeline for each style number
-        for style in unique_sorted_styles:
-            style_data = dept_data[dept_data["style_number"] == style]
-            y = y_positions[style]
+            # Plot timeline for each style number
+            for style in unique_sorted_styles:
+                style_data = dept_data[dept_data["style_number"] == style]
+                y = y_positions[style]
             
-            # Convert dates to relative positions (0 to 1)
-            date_min = dept_data["date"].min()
-            date_max = dept_data["date"].max()
-            total_days = (date_max - date_min).days
+                # Convert dates to relative positions (0 to 1)
+                date_min = dept_data["date"].min()
+                date_max = dept_data["date"].max()
+                total_days = (date_max - date_min).days
             
-            # Sort steps by date
-            style_data = style_data.sort_values(by="date")
+                # Sort steps by date
+                style_data = style_data.sort_values(by="date")
             
-            # Group steps by date
-            date_groups = {}
-            for _, row in style_data.iterrows():
-                date_key = row["date"]
-                if date_key not in date_groups:
-                    date_groups[date_key] = []
-                date_groups[date_key].append(row)
+                # Group steps by date
+                date_groups = {}
+                for _, row in style_data.iterrows():
+                    date_key = row["date"]
+                    if date_key not in date_groups:
+                        date_groups[date_key] = []
+                    date_groups[date_key].append(row)
             
-            # Plot points and labels for each date group
-            x_positions = []
-            dates = list(date_groups.keys())
+                # Plot points and labels for each date group
+                x_positions = []
+                dates = list(date_groups.keys())
             
-            for date_idx, (date, rows) in enumerate(date_groups.items()):
-                # Calculate x position
-                if total_days == 0:
-                    x_pos = 0.5  # Center of the timeline
-                else:
-                    days_from_start = (date - date_min).days
-                    x_pos = 0.1 + (days_from_start / total_days) * 0.8  # Leave margins
-                x_positions.append(x_pos)
+                for date_idx, (date, rows) in enumerate(date_groups.items()):
+                    # Calculate x position
+                    if total_days == 0:
+                        x_pos = 0.5  # Center of the timeline
+                    else:
+                        days_from_start = (date - date_min).days
+                        x_pos = 0.1 + (days_from_start / total_days) * 0.8  # Leave margins
+                    x_positions.append(x_pos)
                 
-                # Plot point
-                ax.scatter(x_pos, y, color='black', zorder=3)
+                    # Plot point
+                    ax.scatter(x_pos, y, color='black', zorder=3)
                 
-                # Calculate text position based on adjacent dates
-                text_x = x_pos
+                    # Calculate text position based on adjacent dates
+                    text_x = x_pos
                 
-                # Check if there's a previous or next date within 1 day
-                prev_date = dates[date_idx-1] if date_idx > 0 else None
-                next_date = dates[date_idx+1] if date_idx < len(dates)-1 else None
+                    # Check if there's a previous or next date within 1 day
+                    prev_date = dates[date_idx-1] if date_idx > 0 else None
+                    next_date = dates[date_idx+1] if date_idx < len(dates)-1 else None
                 
-                scaling_factor = 0.015 + (0.04 * (1 - min(1, total_days / 20)))  # ✅ Adjust dynamically
-                # Adjust text position if dates are 1 day apart
-                if prev_date and abs((date - prev_date).days) == 1:
-                    text_x = x_pos + scaling_factor#0.015  # Move right
-                elif next_date and abs((date - next_date).days) == 1:
-                    text_x = x_pos - scaling_factor#0.015  # Move left
+                    scaling_factor = 0.015 + (0.04 * (1 - min(1, total_days / 20)))  # ✅ Adjust dynamically
+                    # Adjust text position if dates are 1 day apart
+                    if prev_date and abs((date - prev_date).days) == 1:
+                        text_x = x_pos + scaling_factor#0.015  # Move right
+                    elif next_date and abs((date - next_date).days) == 1:
+                        text_x = x_pos - scaling_factor#0.015  # Move left
                 
-                # Stack text boxes for steps on the same day
-                for i, row in enumerate(rows):
-                    text_box = dict(
-                        boxstyle='round,pad=0.4',
-                        facecolor='white',
-                        alpha=1.0,
-                        edgecolor='black',
-                        linewidth=1
-                    )
+                    # Stack text boxes for steps on the same day
+                    for i, row in enumerate(rows):
+                        text_box = dict(
+                            boxstyle='round,pad=0.4',
+                            facecolor='white',
+                            alpha=1.0,
+                            edgecolor='black',
+                            linewidth=1
+                        )
                     
-                    # Calculate vertical offset for stacking
-                    y_offset = -0.3 - i * 0.3  # Stack boxes vertically
+                        # Calculate vertical offset for stacking
+                        y_offset = -0.3 - i * 0.3  # Stack boxes vertically
                     
-                    # Special handling for 产前确认, 面料, place it above the timeline
-                    if ((department == "产前确认" and (row["step"] == "色样确认" or row["step"] == "绣花样品"))
-                        or (department == "面料" and row["step"] == "工艺分析")
-                        or (department == "满花" and row["step"] == "满花后整")
-                        or (department == "后整" and row["step"] == "包装")):
-                        y_offset = 0.3  # Place above the timeline
-
-                    # 1. 对于包含"满花"的流程（除了"满花绣花"）：将"满花样品"放到时间线上方
-                    if department == "产前确认" and row["step"] == "满花样品":
-                        # 查找样式信息以获取流程类型
-                        for style_info in styles:
-                            if style_info["style_number"] == row["style_number"]:
-                                process_type = style_info.get("process_type", "")
-                                if "满花" in process_type and process_type != "满花绣花":
-                                    y_offset = 0.3  # 放在时间线上方
-                                #break
+                        # Special handling for 产前确认, 面料, place it above the timeline
+                        if ((department == "产前确认" and (row["step"] == "色样确认" or row["step"] == "绣花样品"))
+                            or (department == "面料" and row["step"] == "工艺分析")
+                            or (department == "满花" and row["step"] == "满花后整")
+                            or (department == "后整" and row["step"] == "包装")):
+                            y_offset = 0.3  # Place above the timeline
+
+                        # 1. 对于包含"满花"的流程（除了"满花绣花"）：将"满花样品"放到时间线上方
+                        if department == "产前确认" and row["step"] == "满花样品":
+                            # 查找样式信息以获取流程类型
+                            for style_info in styles:
+                                if style_info["style_number"] == row["style_number"]:
+                                    process_type = style_info.get("process_type", "")
+                                    if "满花" in process_type and process_type != "满花绣花":
+                                        y_offset = 0.3  # 放在时间线上方
+                                    #break
                     
-                    # 2. 在"满花局花绣花"的情况下：将"局花样品"放到时间线上方，并与时间线保持一个文本框的距离
-                    if department == "产前确认" and row["step"] == "局花样品":
-                        # 查找样式信息以获取流程类型
-                        for style_info in styles:
-                            if style_info["style_number"] == row["style_number"]:
-                                process_type = style_info.get("process_type", "")
-                                if process_type == "满花局花绣花":
-                                    y_offset = 0.6  # 放在时间线上方，有更大的距离
-                                #break
+                        # 2. 在"满花局花绣花"的情况下：将"局花样品"放到时间线上方，并与时间线保持一个文本框的距离
+                        if department == "产前确认" and row["step"] == "局花样品":
+                            # 查找样式信息以获取流程类型
+                            for style_info in styles:
+                                if style_info["style_number"] == row["style_number"]:
+                                    process_type = style_info.get("process_type", "")
+                                    if process_type == "满花局花绣花":
+                                        y_offset = 0.6  # 放在时间线上方，有更大的距离
+                                    #break
                     
-                    # 3. 除了"满花局花绣花"或"满花"的情况下：将"版型"步骤放到时间线下方，与时间线有一个文本框的距离
-                    if department == "产前确认" and row["step"] == "版型":
-                        # 查找样式信息以获取流程类型
-                        for style_info in styles:
-                            if style_info["style_number"] == row["style_number"]:
-                                process_type = style_info.get("process_type", "")
-                                if process_type != "满花局花绣花" and process_type != "满花" and process_type != "局花绣花" and process_type != "绣花":
-                                    y_offset = -0.6  # 放在时间线下方，有更大的距离
-                                #break
+                        # 3. 除了"满花局花绣花"或"满花"的情况下：将"版型"步骤放到时间线下方，与时间线有一个文本框的距离
+                        if department == "产前确认" and row["step"] == "版型":
+                            # 查找样式信息以获取流程类型
+                            for style_info in styles:
+                                if style_info["style_number"] == row["style_number"]:
+                                    process_type = style_info.get("process_type", "")
+                                    if process_type != "满花局花绣花" and process_type != "满花" and process_type != "局花绣花" and process_type != "绣花":
+                                        y_offset = -0.6  # 放在时间线下方，有更大的距离
+                                    #break
                     
-                    # 4. 在"满花"的情况下：将"代用样品发送"放到时间线下方
-                    if department == "产前确认" and row["step"] == "代用样品发送":
-                        # 查找样式信息以获取流程类型
-                        for style_info in styles:
-                            if style_info["style_number"] == row["style_number"]:
-                                process_type = style_info.get("process_type", "")
-                                if process_type == "满花":
-                                    y_offset = -0.6  # 放在时间线下方
-                                elif process_type == "局花" or process_type == "绣花":
-                                    y_offset = 0.3  # 放在时间线上方
-                                #break
+                        # 4. 在"满花"的情况下：将"代用样品发送"放到时间线下方
+                        if department == "产前确认" and row["step"] == "代用样品发送":
+                            # 查找样式信息以获取流程类型
+                            for style_info in styles:
+                                if style_info["style_number"] == row["style_number"]:
+                                    process_type = style_info.get("process_type", "")
+                                    if process_type == "满花":
+                                        y_offset = -0.6  # 放在时间线下方
+                                    elif process_type == "局花" or process_type == "绣花":
+                                        y_offset = 0.3  # 放在时间线上方
+                                    #break
 
                                 
-                    step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}"
+                        step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}"
                     
-                    # 为部门时间线图的单独绘制中添加备注显示
-                    # 查找原始数据中的备注信息 - 使用缓存的schedule数据
-                    if department == "缝纫" and (row["step"] == "缝纫结束" or row["step"] == "缝纫开始"):
-                         # DataFrame行访问需要用不同的方式
-                        if "remarks" in row and pd.notna(row["remarks"]) and row["remarks"]:
-                            # 如果DataFrame行中有remarks数据
-                            step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{row['remarks']}"
-                        else:
-                            # 作为备份，从原始style数据中查找
-                            for style_info in styles:
-                                if style_info["style_number"] == row["style_number"]:
-                                    if row["step"] == "缝纫开始":
-                                        start_time_period = style_info.get("start_time_period", "上午")
-                                        step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{start_time_period}"
-                                    elif row["step"] == "缝纫结束" and "schedule" in style_info:
-                                        if "缝纫" in style_info["schedule"] and "缝纫结束" in style_info["schedule"]["缝纫"] and "备注" in style_info["schedule"]["缝纫"]["缝纫结束"]:
-                                            end_remark = style_info["schedule"]["缝纫"]["缝纫结束"]["备注"]
-                                            step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{end_remark}"
-                                    break
+                        # 为部门时间线图的单独绘制中添加备注显示
+                        # 查找原始数据中的备注信息 - 使用缓存的schedule数据
+                        if department == "缝纫" and (row["step"] == "缝纫结束" or row["step"] == "缝纫开始"):
+                             # DataFrame行访问需要用不同的方式
+                            if "remarks" in row and pd.notna(row["remarks"]) and row["remarks"]:
+                                # 如果DataFrame行中有remarks数据
+                                step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{row['remarks']}"
+                            else:
+                                # 作为备份，从原始style数据中查找
+                                for style_info in styles:
+                                    if style_info["style_number"] == row["style_number"]:
+                                        if row["step"] == "缝纫开始":
+                                            start_time_period = style_info.get("start_time_period", "上午")
+                                            step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{start_time_period}"
+                                        elif row["step"] == "缝纫结束" and "schedule" in style_info:
+                                            if "缝纫" in style_info["schedule"] and "缝纫结束" in style_info["schedule"]["缝纫"] and "备注" in style_info["schedule"]["缝纫"]["缝纫结束"]:
+                                                end_remark = style_info["schedule"]["缝纫"]["缝纫结束"]["备注"]
+                                                step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{end_remark}"
+                                        break
                     
-                    ax.text(
-                        text_x, y + y_offset,
-                        step_text,
-                        ha='center',
-                        va='bottom' if y_offset > 0 else 'top',  # Adjust vertical alignment based on position
-                        fontsize=12,
-                        fontweight='bold',
-                        bbox=text_box,
-                        zorder=5, fontproperties=prop
-                    )
+                        ax.text(
+                            text_x, y + y_offset,
+                            step_text,
+                            ha='center',
+                            va='bottom' if y_offset > 0 else 'top',  # Adjust vertical alignment based on position
+                            fontsize=12,
+                            fontweight='bold',
+                            bbox=text_box,
+                            zorder=5, fontproperties=prop
+                        )
             
-            # Connect points with lines
-            if len(x_positions) > 1:
-                ax.plot(x_positions, [y] * len(x_positions), '-',
-                       color='black',
-                       alpha=0.7,
-                       zorder=2,
-                       linewidth=1.5)
+                # Connect points with lines
+                if len(x_positions) > 1:
+                    ax.plot(x_positions, [y] * len(x_positions), '-',
+                           color='black',
+                           alpha=0.7,
+                           zorder=2,
+                           linewidth=1.5)
         
-        # Set up the axes
-        ax.set_yticks(list(y_positions.values()))
-        # Include production group in y-axis labels if available
-        y_labels = []
-        for style in y_positions.keys():
-            style_rows = dept_data[dept_data["style_number"] == style]
-            production_group = style_rows.iloc[0]["production_group"] if len(style_rows) > 0 and style_rows.iloc[0]["production_group"] else ""
-            # 查找生产顺序
-            original_style = next((s for s in styles if s["style_number"] == style), None)
-            if original_style and "production_order" in original_style:
-                production_order = original_style["production_order"]
-                if production_group:
-                    y_labels.append(f"款号: {style} (生产班组: {production_group}, 序号: {production_order})")
-                else:
-                    y_labels.append(f"款号: {style} (序号: {production_order})")
-            else:
-                if production_group:
-                    y_labels.append(f"款号: {style} (生产班组: {production_group})")
+            # Set up the axes
+            ax.set_yticks(list(y_positions.values()))
+            # Include production group in y-axis labels if available
+            y_labels = []
+            for style in y_positions.keys():
+                style_rows = dept_data[dept_data["style_number"] == style]
+                production_group = style_rows.iloc[0]["production_group"] if len(style_rows) > 0 and style_rows.iloc[0]["production_group"] else ""
+                # 查找生产顺序
+                original_style = next((s for s in styles if s["style_number"] == style), None)
+                if original_style and "production_order" in original_style:
+                    production_order = original_style["production_order"]
+                    if production_group:
+                        y_labels.append(f"款号: {style} (生产班组: {production_group}, 序号: {production_order})")
+                    else:
+                        y_labels.append(f"款号: {style} (序号: {production_order})")
                 else:
-                    y_labels.append(f"款号: {style}")
+                    if production_group:
+                        y_labels.append(f"款号: {style} (生产班组: {production_group})")
+                    else:
+                        y_labels.append(f"款号: {style}")
         
-        ax.set_yticklabels(y_labels, fontsize=14, fontweight='bold', fontproperties=prop)
-        ax.set_xticks([])
-        ax.set_xlim(-0.02, 1.02)
-        ax.set_ylim(min(y_positions.values()) - 0.7, max(y_positions.values()) + 0.7)
+            ax.set_yticklabels(y_labels, fontsize=14, fontweight='bold', fontproperties=prop)
+            ax.set_xticks([])
+            ax.set_xlim(-0.02, 1.02)
+            ax.set_ylim(min(y_positions.values()) - 0.7, max(y_positions.values()) + 0.7)
         
-        # Set title
-        ax.set_title(department,
-                    fontsize=24,
-                    fontweight='bold',
-                    y=1.02, fontproperties=prop)
-        ax.set_frame_on(False)
+            # Set title
+            ax.set_title(department,
+                        fontsize=24,
+                        fontweight='bold',
+                        y=1.02, fontproperties=prop)
+            ax.set_frame_on(False)
         
-        # Save figure
-        fig_path = os.path.join(temp_dir, f"{department}.png")
-        fig.savefig(fig_path, dpi=300, bbox_inches="tight")
-        plt.close(fig)
+            # Save figure
+            write_figure_to_zip(zipf, fig, f"{department}.png")
+            finished_plots += 1
+            if progress:
+                progress(finished_plots, total_plots)
     
-    # Now create production group specific plots - only for 缝纫 department
-    for department in df["department"].unique():
-        # Skip all departments except 缝纫
-        if department != "缝纫":
-            continue
+        # Now create production group specific plots - only for 缝纫 department
+        for department in df["department"].unique():
+            # Skip all departments except 缝纫
+            if department != "缝纫":
+                continue
             
-        # Get unique production groups for this department
-        dept_data = df[df["department"] == department].copy()
-        production_groups = dept_data["production_group"].unique()
+            # Get unique production groups for this department
+            dept_data = df[df["department"] == department].copy()
+            production_groups = dept_data["production_group"].unique()
         
-        for group in production_groups:
-            if not group:  # Skip empty production groups
-                continue
+            for group in production_groups:
+                if not group:  # Skip empty production groups
+                    continue
                 
-            # Filter data for this production group
-            group_data = dept_data[dept_data["production_group"] == group].copy()
+                # Filter data for this production group
+                group_data = dept_data[dept_data["production_group"] == group].copy()
             
-            # If we don't have enough data, skip
-            if len(group_data) == 0 or len(group_data["style_number"].unique()) == 0:
-                continue
+                # If we don't have enough data, skip
+                if len(group_data) == 0 or len(group_data["style_number"].unique()) == 0:
+                    continue
 
-            # 为生产班组图表也应用相似的排序逻辑
-            # 1. 计算每个款式的最早步骤时间
-            earliest_dates = group_data.groupby("style_number")["date"].min().reset_index()
-            earliest_dates.rename(columns={"date": "earliest_date"}, inplace=True)
+                # 为生产班组图表也应用相似的排序逻辑
+                # 1. 计算每个款式的最早步骤时间
+                earliest_dates = group_data.groupby("style_number")["date"].min().reset_index()
+                earliest_dates.rename(columns={"date": "earliest_date"}, inplace=True)
             
-            # 2. 将最早日期合并回原始数据
-            group_data = pd.merge(group_data, earliest_dates, on="style_number", how="left")
+                # 2. 将最早日期合并回原始数据
+                group_data = pd.merge(group_data, earliest_dates, on="style_number", how="left")
             
-            # 3. 按最早日期排序（升序，最早的在前），然后按款式号排序
-            group_data.sort_values(by=["earliest_date", "style_number"], ascending=[False, False], inplace=True)
+                # 3. 按最早日期排序（升序，最早的在前），然后按款式号排序
+                group_data.sort_values(by=["earliest_date", "style_number"], ascending=[False, False], inplace=True)
             
-            # 4. 获取排序后的唯一款式号列表（保持顺序）
-            unique_sorted_styles = group_data["style_number"].unique()
+                # 4. 获取排序后的唯一款式号列表（保持顺序）
+                unique_sorted_styles = group_data["style_number"].unique()
             
-            # Create figure
-            base_width = max(20, int((group_data["date"].max() - group_data["date"].min()).days / 41 * 40))
-            fig, ax = plt.subplots(figsize=(base_width, len(unique_sorted_styles) * 3))
-            fig.patch.set_facecolor('white')
-            ax.set_facecolor('white')
+                # Create figure
+                base_width = max(20, int((group_data["date"].max() - group_data["date"].min()).days / 41 * 40))
+                fig, ax = plt.subplots(figsize=(base_width, len(unique_sorted_styles) * 3))
+                fig.patch.set_facecolor('white')
+                ax.set_facecolor('white')
             
-            y_positions = {style: i for i, style in enumerate(unique_sorted_styles)}
+                y_positions = {style: i for i, style in enumerate(unique_sorted_styles)}
             
-            # Plot timeline for each style
-            for style, y in y_positions.items():
-                style_data = group_data[group_data["style_number"] == style].sort_values("date")
+                # Plot timeline for each style
+                for style, y in y_positions.items():
+                    style_data = group_data[group_data["style_number"] == style].sort_values("date")
                 
-                # Normalize dates to 0-1 range for x-axis
-                date_range = (group_data["date"].max() - group_data["date"].min()).days
-                if date_range == 0:
-                    date_range = 1  # Avoid division by zero
+                    # Normalize dates to 0-1 range for x-axis
+                    date_range = (group_data["date"].max() - group_data["date"].min()).days
+                    if date_range == 0:
+                        date_range = 1  # Avoid division by zero
                 
-                min_date = group_data["date"].min()
+                    min_date = group_data["date"].min()
                 
-                # Draw points and text for each step
-                x_positions = []
+                    # Draw points and text for each step
+                    x_positions = []
                 
-                for _, row in style_data.iterrows():
-                    # Calculate normalized position on x-axis
-                    x = (row["date"] - min_date).days / date_range
-                    x_positions.append(x)
+                    for _, row in style_data.iterrows():
+                        # Calculate normalized position on x-axis
+                        x = (row["date"] - min_date).days / date_range
+                        x_positions.append(x)
                     
-                    # Draw point - using standard style
-                    ax.scatter(x, y, s=100, color='blue', edgecolor='black', zorder=3)
+                        # Draw point - using standard style
+                        ax.scatter(x, y, s=100, color='blue', edgecolor='black', zorder=3)
                     
-                    # Add text with step name and date
-                    # Adjust position based on step type
-                    text_x = x
-                    y_offset = -0.3  # Default to below the timeline
+                        # Add text with step name and date
+                        # Adjust position based on step type
+                        text_x = x
+                        y_offset = -0.3  # Default to below the timeline
                     
-                    # Special text box for certain steps
-                    text_box = dict(boxstyle="round,pad=0.3", facecolor='lightyellow', alpha=0.7, edgecolor='black')
+                        # Special text box for certain steps
+                        text_box = dict(boxstyle="round,pad=0.3", facecolor='lightyellow', alpha=0.7, edgecolor='black')
                     
-                    # Change position for certain steps
-                    if ((department == "裁床" and row["step"] == "裁剪完成") or 
-                        (department == "缝纫" and (row["step"] == "缝纫结束" or row["step"] == "缝纫开始")) or 
-                        (department == "后整" and row["step"] == "包装")):
-                        y_offset = 0.3  # Place above the timeline
+                        # Change position for certain steps
+                        if ((department == "裁床" and row["step"] == "裁剪完成") or 
+                            (department == "缝纫" and (row["step"] == "缝纫结束" or row["step"] == "缝纫开始")) or 
+                            (department == "后整" and row["step"] == "包装")):
+                            y_offset = 0.3  # Place above the timeline
                     
-                    step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}"
+                        step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}"
                     
-                    # 为部门时间线图的单独绘制中添加备注显示
-                    # 查找原始数据中的备注信息 - 使用缓存的schedule数据
-                    if department == "缝纫" and (row["step"] == "缝纫结束" or row["step"] == "缝纫开始"):
-                        # DataFrame行访问需要用不同的方式
-                        if "remarks" in row and pd.notna(row["remarks"]) and row["remarks"]:
-                            # 如果DataFrame行中有remarks数据
-                            step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{row['remarks']}"
-                        else:
-                            # 作为备份，从原始style数据中查找
-                            for style_info in styles:
-                                if style_info["style_number"] == row["style_number"]:
-                                    if row["step"] == "缝纫开始":
-                                        start_time_period = style_info.get("start_time_period", "上午")
-                                        step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{start_time_period}"
-                                    elif row["step"] == "缝纫结束" and "schedule" in style_info:
-                                        if "缝纫" in style_info["schedule"] and "缝纫结束" in style_info["schedule"]["缝纫"] and "备注" in style_info["schedule"]["缝纫"]["缝纫结束"]:
-                                            end_remark = style_info["schedule"]["缝纫"]["缝纫结束"]["备注"]
-                                            step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{end_remark}"
-                                    break
-                    ax.text(
-                        text_x, y + y_offset,
-                        step_text,
-                        ha='center',
-                        va='bottom' if y_offset > 0 else 'top',  # Adjust vertical alignment based on position
-                        fontsize=12,
-                        fontweight='bold',
-                        bbox=text_box,
-                        zorder=5, fontproperties=prop
-                    )
+                        # 为部门时间线图的单独绘制中添加备注显示
+                        # 查找原始数据中的备注信息 - 使用缓存的schedule数据
+                        if department == "缝纫" and (row["step"] == "缝纫结束" or row["step"] == "缝纫开始"):
+                            # DataFrame行访问需要用不同的方式
+                            if "remarks" in row and pd.notna(row["remarks"]) and row["remarks"]:
+                                # 如果DataFrame行中有remarks数据
+                                step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{row['remarks']}"
+                            else:
+                                # 作为备份，从原始style数据中查找
+                                for style_info in styles:
+                                    if style_info["style_number"] == row["style_number"]:
+                                        if row["step"] == "缝纫开始":
+                                            start_time_period = style_info.get("start_time_period", "上午")
+                                            step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{start_time_period}"
+                                        elif row["step"] == "缝纫结束" and "schedule" in style_info:
+                                            if "缝纫" in style_info["schedule"] and "缝纫结束" in style_info["schedule"]["缝纫"] and "备注" in style_info["schedule"]["缝纫"]["缝纫结束"]:
+                                                end_remark = style_info["schedule"]["缝纫"]["缝纫结束"]["备注"]
+                                                step_text = f"{row['step']}\n{row['date'].strftime('%Y/%m/%d')}\n{end_remark}"
+                                        break
+                        ax.text(
+                            text_x, y + y_offset,
+                            step_text,
+                            ha='center',
+                            va='bottom' if y_offset > 0 else 'top',  # Adjust vertical alignment based on position
+                            fontsize=12,
+                            fontweight='bold',
+                            bbox=text_box,
+                            zorder=5, fontproperties=prop
+                        )
                 
-                # Connect points with lines
-                if len(x_positions) > 1:
-                    ax.plot(x_positions, [y] * len(x_positions), '-',
-                           color='black',
-                           alpha=0.7,
-                           zorder=2,
-                           linewidth=1.5)
+                    # Connect points with lines
+                    if len(x_positions) > 1:
+                        ax.plot(x_positions, [y] * len(x_positions), '-',
+                               color='black',
+                               alpha=0.7,
+                               zorder=2,
+                               linewidth=1.5)
             
-            # Set up the axes
-            ax.set_yticks(list(y_positions.values()))
-            # Include production group in y-axis labels if available
-            y_labels = []
-            for style in y_positions.keys():
-                style_rows = group_data[group_data["style_number"] == style]
-                production_group = style_rows.iloc[0]["production_group"] if len(style_rows) > 0 and style_rows.iloc[0]["production_group"] else ""
+                # Set up the axes
+                ax.set_yticks(list(y_positions.values()))
+                # Include production group in y-axis labels if available
+                y_labels = []
+                for style in y_positions.keys():
+                    style_rows = group_data[group_data["style_number"] == style]
+                    production_group = style_rows.iloc[0]["production_group"] if len(style_rows) > 0 and style_rows.iloc[0]["production_group"] else ""
                 
-                # 查找生产顺序
-                original_style = next((s for s in styles if s["style_number"] == style), None)
-                if original_style and "production_order" in original_style:
-                    production_order = original_style["production_order"]
-                    if production_group:
-                        y_labels.append(f"款号: {style} (生产班组: {production_group}, 序号: {production_order})")
-                    else:
-                        y_labels.append(f"款号: {style} (序号: {production_order})")
-                else:
-                    if production_group:
-                        y_labels.append(f"款号: {style} (生产班组: {production_group})")
+                    # 查找生产顺序
+                    original_style = next((s for s in styles if s["style_number"] == style), None)
+                    if original_style and "production_order" in original_style:
+                        production_order = original_style["production_order"]
+                        if production_group:
+                            y_labels.append(f"款号: {style} (生产班组: {production_group}, 序号: {production_order})")
+                        else:
+                            y_labels.append(f"款号: {style} (序号: {production_order})")
                     else:
-                        y_labels.append(f"款号: {style}")
+                        if production_group:
+                            y_labels.append(f"款号: {style} (生产班组: {production_group})")
+                        else:
+                            y_labels.append(f"款号: {style}")
             
-            ax.set_yticklabels(y_labels, fontsize=14, fontweight='bold', fontproperties=prop)
-            ax.set_xticks([])
-            ax.set_xlim(-0.02, 1.02)
-            ax.set_ylim(min(y_positions.values()) - 0.7, max(y_positions.values()) + 0.7)
+                ax.set_yticklabels(y_labels, fontsize=14, fontweight='bold', fontproperties=prop)
+                ax.set_xticks([])
+                ax.set_xlim(-0.02, 1.02)
+                ax.set_ylim(min(y_positions.values()) - 0.7, max(y_positions.values()) + 0.7)
             
-            # Set title to include production group - using standard style
-            ax.set_title(f"{department} - 生产班组: {group}",
-                        fontsize=24,
-                        fontweight='bold',
-                        y=1.02, fontproperties=prop)
-            ax.set_frame_on(False)
-
-            # Save with production group in filename
-            group_fig_path = os.path.join(temp_dir, f"{department}_生产班组_{group}.png")
-            fig.savefig(group_fig_path, dpi=300, bbox_inches="tight")
-            plt.close(fig)
+                # Set title to include production group - using standard style
+                ax.set_title(f"{department} - 生产班组: {group}",
+                            fontsize=24,
+                            fontweight='bold',
+                            y=1.02, fontproperties=prop)
+                ax.set_frame_on(False)
+
+                # Save with production group in filename
+                write_figure_to_zip(zipf, fig, f"{department}_生产班组_{group}.png")
+                finished_plots += 1
+                if progress:
+                    progress(finished_plots, total_plots)
     
-    # Create ZIP archive
-    zip_path = os.path.join(temp_dir, "Department_Timelines.zip")
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for file in os.listdir(temp_dir):
-            if file.endswith(".png"):
-                zipf.write(
-                    os.path.join(temp_dir, file),
-                    file  # Just use the filename directly
-                )
-    
-    return zip_path
+        zipf.close()
+    except BaseException:
+        # 出错时关闭图表、ZIP 和缓冲区（缓冲区可能已转存到临时文件），不留下未释放的资源
+        if fig is not None:
+            plt.close(fig)
+        if zipf is not None:
+            zipf.close()
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
+
+def timeline_image_key(style, schedule):
+    """ 单个款式流程图的缓存地址：由排产结果和图表标题中用到的款式信息决定 """
+    content = json.dumps({
+        "kind": "timeline_png",
+        "profile": EXPORT_RENDER_PROFILE,
+        "schedule": schedule,
+        "process_type": style["process_type"],
+        "cycle": style["cycle"],
+        "style_number": style["style_number"],
+        "production_group": style.get("production_group", ""),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+@perf_span("export_timeline")
+def generate_timeline_zip(styles, progress=None):
+    """
+    为每个款式生成生产流程图并打包为ZIP，返回包含ZIP内容的缓冲区；progress(已完成, 总数) 用于报告进度。
+    每张图按款式内容缓存在导出缓存中，只重新绘制新增或有变化的款式
+    """
+    # 批量计算没有schedule的款式
+    pending_styles = [style for style in styles if "schedule" not in style]
+    computed_schedules = iter(calculate_style_schedules(pending_styles, get_factory_calendar()))
+    # 保存图片 - 简化文件名
+    # Include production group in filename if available
+    filenames = [
+        f"{style['style_number']}_{style['production_group']}_{style['process_type']}.png"
+        if style.get("production_group", "") else f"{style['style_number']}_{style['process_type']}.png"
+        for style in styles
+    ]
+    # 同名文件以后面的款式为准
+    last_index = {filename: index for index, filename in enumerate(filenames)}
+    buffer = export_buffer()
+    try:
+        # PNG本身已经压缩，直接存储不再压缩
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zipf:
+            for index, (style, filename) in enumerate(zip(styles, filenames)):
+                schedule = style["schedule"] if "schedule" in style else next(computed_schedules)
+                if last_index[filename] == index:
+                    key = timeline_image_key(style, schedule)
+                    image_path = export_cache_get(key, ".png")
+                    written = False
+                    if image_path is not None:
+                        try:
+                            with perf_span("zipping", aggregate=True):
+                                zipf.write(image_path, filename)
+                            written = True
+                        except FileNotFoundError:
+                            # 命令行批量导出时其他进程可能在读取前清理了这张图片，重新绘制
+                            pass
+                    if not written:
+                        fig = plot_timeline(schedule, style["process_type"], style["cycle"],
+                                            style_number=style["style_number"],
+                                            production_group=style.get("production_group", ""))
+                        image = io.BytesIO()
+                        try:
+                            with perf_span("savefig", aggregate=True):
+                                fig.savefig(image, format='png', dpi=EXPORT_RENDER_PROFILE["dpi"], bbox_inches='tight')
+                        finally:
+                            plt.close(fig)
+                        export_cache_put(key, ".png", image, evict=False)
+                        # 直接写入内存中的图片，不再读取缓存文件（磁盘空间不足时不进入缓存，也可能已被其他进程清理）
+                        with perf_span("zipping", aggregate=True):
+                            zipf.writestr(filename, image.getvalue())
+                if progress:
+                    progress(index + 1, len(styles))
+        # 所有图片写入缓存后统一清理一次，不在每张图片后扫描整个缓存目录
+        evict_export_cache()
+    except BaseException:
+        # 出错时关闭缓冲区（可能已转存到临时文件）
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
+
+# 后台导出任务：在本地工作线程中生成，进度保存在各账号的导出目录中，生成的文件保存在导出缓存中
+EXPORT_DIR = DATA_DIR / "exports"
+EXPORT_TYPES = {
+    "timeline": {"label": "生产流程图", "func": generate_timeline_zip,
+                 "file_name": "生产流程时间表.zip", "mime": "application/zip"},
+    "department_plots": {"label": "部门时间线图", "func": generate_department_wise_plots,
+                         "file_name": "部门时间线图.zip", "mime": "application/zip"},
+    "excel": {"label": "Excel报表", "func": generate_excel_report, "file_name": "生产计划报表.xlsx",
+              "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "department_excel": {"label": "部门Excel报表", "func": generate_department_wise_excel,
+                         "file_name": "部门生产计划报表.zip", "mime": "application/zip"},
+}
+# 后台导出任务：同一账号的任务逐个执行，不同账号共用少量工作线程，
+# 一个账号的大导出不会挡住其他账号，也不会有太多大导出同时占用内存和CPU
+# （页面会话线程仍可能同时绘图，例如单个款式的流程图和受影响款号的报表）
+EXPORT_WORKERS = 2
+_EXPORT_EXECUTOR = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+# 各账号等待执行的任务：{账号: deque([(任务目录, 任务, 款式), ...])}，队首为正在执行的任务
+_EXPORT_ACCOUNT_QUEUES = {}
+_ACTIVE_EXPORT_JOBS = set()
+_EXPORT_JOBS_LOCK = threading.Lock()
+# 进度写入任务文件的最小间隔（秒）
+EXPORT_PROGRESS_INTERVAL = 0.5
+# 磁盘空间不足、无法写入缓存的导出结果暂存在内存中（服务重启后失效），按暂存先后排列
+_EXPORT_MEMORY_RESULTS = {}
+# 内存中暂存的导出结果总大小上限、每个账号最多暂存的结果数（超出时删除该账号最早的结果）
+EXPORT_MEMORY_MAX_BYTES = 512 * 1024 ** 2
+EXPORT_MEMORY_MAX_PER_ACCOUNT = 2
+# 导出任务记录保留时间、缓存文件未被使用的最长保留时间、写入中断留下的临时文件保留时间（秒）
+EXPORT_JOB_TTL = 7 * 24 * 3600
+EXPORT_CACHE_TTL = 30 * 24 * 3600
+EXPORT_TMP_TTL = 3600
+# 自动清理的最小间隔（秒）
+EXPORT_SWEEP_INTERVAL = 600
+_EXPORT_SWEEP_STATE = {"last": 0.0}
+
+def cached_export(export_type, styles, progress=None):
+    """
+    生成导出文件，内容相同的导出直接返回缓存中的文件路径；
+    磁盘空间不足无法写入缓存时返回导出内容（bytes）
+    """
+    key = export_cache_key(export_type, styles)
+    suffix = pathlib.Path(EXPORT_TYPES[export_type]["file_name"]).suffix
+    path = export_cache_get(key, suffix)
+    if path is not None:
+        return path
+    with EXPORT_TYPES[export_type]["func"](styles, progress=progress) as buffer:
+        path = export_cache_put(key, suffix, buffer)
+        if path is None:
+            buffer.seek(0)
+            return buffer.read()
+        return path
+
+def _read_export_job(job_dir):
+    job_file = job_dir / "job.json"
+    if not job_file.exists():
+        return None
+    with open(job_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_export_job(job_dir, job):
+    """ 先写临时文件再替换，页面读取时不会读到写了一半的任务文件 """
+    tmp_file = job_dir / "job.json.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_file, job_dir / "job.json")
+
+def submit_export_job(user_id, export_type, styles):
+    """
+    提交后台导出任务并立即返回任务信息。输入相同的任务正在进行时直接返回该任务，
+    导出缓存中已有相同内容的文件时任务直接完成；失败或因服务重启中断的任务会重新提交
+    """
+    if export_type not in EXPORT_TYPES:
+        raise ValueError(f"Invalid export type: {export_type}")
+    maybe_sweep_export_storage()
+    key = export_cache_key(export_type, styles)
+    suffix = pathlib.Path(EXPORT_TYPES[export_type]["file_name"]).suffix
+    job_id = key[:16]
+    job_dir = EXPORT_DIR / str(user_id) / job_id
+    with _EXPORT_JOBS_LOCK:
+        job = _read_export_job(job_dir)
+        if job is not None and str(job_dir) in _ACTIVE_EXPORT_JOBS:
+            return job
+        job = {
+            "id": job_id,
+            "user_id": str(user_id),
+            "type": export_type,
+            "label": EXPORT_TYPES[export_type]["label"],
+            "file_name": EXPORT_TYPES[export_type]["file_name"],
+            "style_count": len(styles),
+            "status": "queued",
+            "progress": 0.0,
+            "error": "",
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "path": "",
+        }
+        job_dir.mkdir(parents=True, exist_ok=True)
+        cached_path = export_cache_get(key, suffix)
+        if cached_path is not None:
+            job.update(status="done", progress=1.0, path=str(cached_path))
+            _write_export_job(job_dir, job)
+            return job
+        _write_export_job(job_dir, job)
+        _ACTIVE_EXPORT_JOBS.add(str(job_dir))
+        # 复制款式，页面后续的修改不会影响正在导出的任务
+        queue = _EXPORT_ACCOUNT_QUEUES.setdefault(str(user_id), deque())
+        queue.append((job_dir, job, copy.deepcopy(styles)))
+        if len(queue) == 1:
+            _EXPORT_EXECUTOR.submit(_run_next_account_export, str(user_id))
+    return job
+
+def _run_next_account_export(user_id):
+    """ 执行账号队首的任务，完成后把该账号的下一个任务重新排到线程池末尾，与其他账号的任务轮流执行 """
+    with _EXPORT_JOBS_LOCK:
+        job_dir, job, styles = _EXPORT_ACCOUNT_QUEUES[user_id][0]
+    try:
+        _run_export_job(job_dir, job, styles)
+    finally:
+        with _EXPORT_JOBS_LOCK:
+            queue = _EXPORT_ACCOUNT_QUEUES[user_id]
+            queue.popleft()
+            if queue:
+                _EXPORT_EXECUTOR.submit(_run_next_account_export, user_id)
+            else:
+                del _EXPORT_ACCOUNT_QUEUES[user_id]
+
+def _store_export_memory_result(job_dir, data):
+    """
+    暂存无法写入磁盘的导出结果：账号暂存的结果过多时删除其最早的结果，
+    所有暂存结果超过内存上限时导出失败
+    """
+    with _EXPORT_JOBS_LOCK:
+        _EXPORT_MEMORY_RESULTS.pop(str(job_dir), None)
+        account_keys = [key for key in _EXPORT_MEMORY_RESULTS if pathlib.Path(key).parent == job_dir.parent]
+        for key in account_keys[:max(0, len(account_keys) - EXPORT_MEMORY_MAX_PER_ACCOUNT + 1)]:
+            del _EXPORT_MEMORY_RESULTS[key]
+        if sum(len(result) for result in _EXPORT_MEMORY_RESULTS.values()) + len(data) > EXPORT_MEMORY_MAX_BYTES:
+            raise OSError("磁盘空间不足，导出结果无法保存，请清理磁盘后重试")
+        _EXPORT_MEMORY_RESULTS[str(job_dir)] = data
+
+def _run_export_job(job_dir, job, styles):
+    # 工作线程中的耗时记录归属提交任务的账号
+    PERF_CONTEXT.user = job["user_id"]
+    job["status"] = "running"
+    _write_export_job(job_dir, job)
+    last_write = time.monotonic()
+
+    def progress(done, total):
+        nonlocal last_write
+        if time.monotonic() - last_write < EXPORT_PROGRESS_INTERVAL:
+            return
+        last_write = time.monotonic()
+        job["progress"] = round(done / total, 3) if total else 1.0
+        # 磁盘写满时只是暂时看不到进度，不影响导出
+        with contextlib.suppress(OSError):
+            _write_export_job(job_dir, job)
+
+    try:
+        result = cached_export(job["type"], styles, progress=progress)
+        if isinstance(result, bytes):
+            _store_export_memory_result(job_dir, result)
+            job.update(path="", in_memory=True)
+        else:
+            job.update(path=str(result), in_memory=False)
+        job.update(status="done", progress=1.0, finished=datetime.now().isoformat(timespec="seconds"))
+    except Exception as e:
+        job.update(status="failed", error=str(e))
+    finally:
+        try:
+            _write_export_job(job_dir, job)
+        except OSError:
+            pass
+        finally:
+            with _EXPORT_JOBS_LOCK:
+                _ACTIVE_EXPORT_JOBS.discard(str(job_dir))
+            flush_perf_log()
+
+def list_export_jobs(user_id):
+    """
+    列出账号的所有导出任务（最新的在前）。服务重启前未完成的任务标记为已中断，
+    文件已被导出缓存清理的任务标记为已过期；排队中的任务带有 queue_position（该账号前面还有几个任务）
+    """
+    user_dir = EXPORT_DIR / str(user_id)
+    if not user_dir.exists():
+        return []
+    jobs = []
+    with _EXPORT_JOBS_LOCK:
+        positions = {str(job_dir): position
+                     for position, (job_dir, _, _) in enumerate(_EXPORT_ACCOUNT_QUEUES.get(str(user_id), ()))}
+        for job_dir in user_dir.iterdir():
+            job = _read_export_job(job_dir) if job_dir.is_dir() else None
+            if job is None:
+                continue
+            if job["status"] in ("queued", "running") and str(job_dir) not in _ACTIVE_EXPORT_JOBS:
+                job["status"] = "interrupted"
+            elif job["status"] == "queued":
+                job["queue_position"] = positions.get(str(job_dir), 0)
+            elif job["status"] == "done" and not (
+                    str(job_dir) in _EXPORT_MEMORY_RESULTS if job.get("in_memory") else os.path.exists(job["path"])):
+                job["status"] = "expired"
+            jobs.append(job)
+    return sorted(jobs, key=lambda job: job["created"], reverse=True)
+
+def delete_export_job(user_id, job_id):
+    """ 删除已结束的导出任务记录（缓存的文件由导出缓存统一清理），正在进行的任务不删除 """
+    job_dir = EXPORT_DIR / str(user_id) / job_id
+    with _EXPORT_JOBS_LOCK:
+        if str(job_dir) in _ACTIVE_EXPORT_JOBS:
+            return False
+        shutil.rmtree(job_dir, ignore_errors=True)
+        _EXPORT_MEMORY_RESULTS.pop(str(job_dir), None)
+    return True
+
+def read_export_job_result(user_id, job_id):
+    """ 读取已完成导出任务的文件内容 """
+    job_dir = EXPORT_DIR / str(user_id) / job_id
+    job = _read_export_job(job_dir)
+    if job is None or job["status"] != "done":
+        raise ValueError(f"Export job is not finished: {job_id}")
+    if job.get("in_memory"):
+        return _EXPORT_MEMORY_RESULTS[str(job_dir)]
+    return pathlib.Path(job["path"]).read_bytes()
+
+def export_storage_usage():
+    """ 导出相关的存储占用：缓存文件大小和数量、任务记录数、内存中暂存的结果大小、磁盘剩余空间 """
+    cache_bytes = cache_files = 0
+    for path in EXPORT_CACHE_DIR.glob("*/*"):
+        try:
+            cache_bytes += path.stat().st_size
+        except FileNotFoundError:
+            continue
+        cache_files += 1
+    return {
+        "cache_bytes": cache_bytes,
+        "cache_files": cache_files,
+        "export_jobs": sum(1 for _ in EXPORT_DIR.glob("*/*/job.json")),
+        "memory_bytes": sum(len(data) for data in list(_EXPORT_MEMORY_RESULTS.values())),
+        "disk_free_bytes": shutil.disk_usage(DATA_DIR).free,
+    }
+
+def sweep_export_storage():
+    """
+    清理超过保留时间的导出任务记录、长期未使用的缓存文件和写入中断留下的临时文件，
+    再按容量上限和磁盘剩余空间清理缓存；占用情况写入性能日志并返回
+    """
+    started = time.perf_counter()
+    now = time.time()
+    with _EXPORT_JOBS_LOCK:
+        for job_dir in EXPORT_DIR.glob("*/*"):
+            if str(job_dir) in _ACTIVE_EXPORT_JOBS:
+                continue
+            try:
+                expired = now - job_dir.stat().st_mtime > EXPORT_JOB_TTL
+            except FileNotFoundError:
+                continue
+            if expired:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                _EXPORT_MEMORY_RESULTS.pop(str(job_dir), None)
+    with _EXPORT_CACHE_LOCK:
+        for path in EXPORT_CACHE_DIR.glob("*/*"):
+            ttl = EXPORT_TMP_TTL if path.suffix == ".tmp" else EXPORT_CACHE_TTL
+            try:
+                expired = now - path.stat().st_mtime > ttl
+            except FileNotFoundError:
+                continue
+            if expired:
+                path.unlink(missing_ok=True)
+    evict_export_cache()
+    _EXPORT_SWEEP_STATE["last"] = now
+    usage = export_storage_usage()
+    record_perf_timing("export_storage_sweep", time.perf_counter() - started, **usage)
+    return usage
+
+def maybe_sweep_export_storage():
+    """ 距上次清理超过 EXPORT_SWEEP_INTERVAL 时执行一次清理 """
+    if time.time() - _EXPORT_SWEEP_STATE["last"] >= EXPORT_SWEEP_INTERVAL:
+        sweep_export_storage()
 
 def get_cycle_options(production_mode):
     """Get valid cycle options based on production_mode"""
@@ -2781,6 +3897,15 @@ def get_cycle_options(production_mode):
     else:
         raise ValueError(f"Invalid production_mode: {production_mode}")
 
+def get_process_type_options(production_mode):
+    """Get valid process types based on production_mode"""
+    if production_mode in ("龙兵", "补数"):
+        return ["满花局花绣花", "满花局花", "满花绣花", "局花绣花", "满花", "局花", "绣花"]
+    elif production_mode == "贝贝":
+        return ["满花局花绣花", "满花局花", "满花绣花", "局花绣花", "满花", "局花", "绣花", "无印绣"]
+    else:
+        raise ValueError(f"Invalid production_mode: {production_mode}")
+
 def validate_cycle(production_mode, cycle):
     """Validate cycle value based on production_mode"""
     valid_options = get_cycle_options(production_mode)
@@ -2801,21 +3926,431 @@ def convert_cycle_to_int(production_mode, cycle):
     else:
         raise ValueError(f"Invalid production_mode: {production_mode}")
     
-def adjust_schedule(schedule, department, delayed_step, new_end_time):
+STYLE_COLUMNS = {
+    '款号': "style_number",
+    '缝纫开始日期': "sewing_start_date",
+    '缝纫开始时间': "start_time_period",
+    '工序': "process_type",
+    '确认用时': "cycle",
+    '订单数量': "order_quantity",
+    '日产量': "daily_production",
+    '生产班组': "production_group",
+    '生产顺序': "production_order",
+    '客户': "company",
+    '排产模式': "production_mode",
+}
+
+STYLE_SHEET_COLUMNS = list(STYLE_COLUMNS) + ['交期']
+
+def read_style_sheet(file):
+    """
+    只读取款式表第一个工作表中用到的列（STYLE_SHEET_COLUMNS）。安装了 python-calamine 时用它解析，
+    否则 .xlsx 用 openpyxl 只读模式逐行读取（不加载单元格样式，内存占用与列数无关），.xls 交给 pandas
+    """
+    wanted = set(STYLE_SHEET_COLUMNS)
+    try:
+        return pd.read_excel(file, engine="calamine", usecols=lambda col: col in wanted)
+    except ImportError:
+        pass
+    except ValueError as e:
+        # pandas 2.2 之前没有 calamine 引擎
+        if "Unknown engine" not in str(e):
+            raise
+    if hasattr(file, "seek"):
+        file.seek(0)
+    if str(getattr(file, "name", file)).lower().endswith(".xls"):
+        return pd.read_excel(file, usecols=lambda col: col in wanted)
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        positions = {}
+        for position, col in enumerate(next(rows, ())):
+            if col in wanted:
+                positions.setdefault(col, position)
+        columns = {col: [] for col in positions}
+        for row in rows:
+            values = [row[position] if position < len(row) else None for position in positions.values()]
+            # 跳过空行（只读模式下工作表末尾常有带格式的空行）
+            if all(value is None for value in values):
+                continue
+            for col_values, value in zip(columns.values(), values):
+                col_values.append(value)
+    finally:
+        workbook.close()
+    return pd.DataFrame(columns)
+
+# 文本列按字符串读取，避免 CSV 中 "001" 之类的款号丢失前导零
+STYLE_TEXT_COLUMNS = {'款号': str, '生产班组': str, '客户': str}
+
+def read_style_csv(file):
+    """ 读取款式 CSV 中用到的列，先按 UTF-8（含BOM）解析，失败时按 GBK（gb18030）重新解析 """
+    wanted = set(STYLE_SHEET_COLUMNS)
+    for encoding in ("utf-8-sig", "gb18030"):
+        if hasattr(file, "seek"):
+            file.seek(0)
+        try:
+            return pd.read_csv(file, encoding=encoding, usecols=lambda col: col in wanted, dtype=STYLE_TEXT_COLUMNS)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Unsupported CSV encoding, expected UTF-8 or GBK")
+
+def read_style_parquet(file):
+    """ 读取款式 Parquet 文件中用到的列 """
+    import pyarrow.parquet as pq
+    wanted = set(STYLE_SHEET_COLUMNS)
+    columns = [col for col in pq.read_schema(file).names if col in wanted]
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return pd.read_parquet(file, columns=columns)
+
+STYLE_FILE_READERS = {
+    ".xlsx": read_style_sheet,
+    ".xlsm": read_style_sheet,
+    ".xls": read_style_sheet,
+    ".csv": read_style_csv,
+    ".parquet": read_style_parquet,
+}
+
+def read_style_table(file, filename=None):
+    """ 按扩展名读取款式表（Excel、CSV 或 Parquet），file 可以是路径或上传的文件对象 """
+    suffix = pathlib.Path(str(filename or getattr(file, "name", file))).suffix.lower()
+    if suffix not in STYLE_FILE_READERS:
+        raise ValueError(f"Unsupported file type: {suffix}")
+    return STYLE_FILE_READERS[suffix](file)
+
+def import_style_file(file, filename=None):
+    """
+    脚本批量导入用：读取款式表并校验转换，返回 (款式列表, 错误列表)，与页面上传使用相同的必需列和工序校验。
+    例如 styles, errors = import_style_file("season.csv")
+    """
+    return build_styles_from_dataframe(read_style_table(file, filename))
+
+def text_column(values):
+    """
+    把表格列转为文字（空单元格为空字符串）。有空单元格的数字列会被读成小数，
+    整数值去掉末尾的 .0，使 1 和 1.0 都成为 "1"
+    """
+    def to_text(value):
+        if pd.isna(value):
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+    return values.map(to_text)
+
+def build_styles_from_dataframe(df):
+    """
+    把上传表格（列见 STYLE_COLUMNS，可选列 交期）按列批量校验并转换为款式列表，
+    返回 (款式列表, 错误列表)。错误按行汇总，每项包含 Excel 行号、款号和原因；有错误的行不会生成款式
+    """
+    missing_columns = [col for col in STYLE_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+    df = df.reset_index(drop=True)
+
+    modes = df['排产模式'].astype(str).str.strip()
+    process_types = df['工序'].astype(str).str.strip()
+    # 确认用时：能转为数字的按整数处理，其余保留为字符串
+    raw_cycles = df['确认用时']
+    numeric_cycles = pd.to_numeric(raw_cycles, errors='coerce')
+    cycles = raw_cycles.astype(str).str.strip().where(
+        numeric_cycles.isna(), numeric_cycles.fillna(0).astype(int).astype(object))
+    sewing_start_dates = pd.to_datetime(df['缝纫开始日期'], errors='coerce')
+    order_quantities = pd.to_numeric(df['订单数量'], errors='coerce')
+    daily_productions = pd.to_numeric(df['日产量'], errors='coerce')
+
+    # 每种排产模式合法的 (模式, 工序) 和 (模式, 确认用时) 组合
+    valid_processes = {f"{mode}|{process}" for mode in SCHEDULE_ENGINES for process in get_process_type_options(mode)}
+    valid_cycles = {f"{mode}|{cycle}" for mode in SCHEDULE_ENGINES for cycle in get_cycle_options(mode)}
+    valid_modes = modes.isin(list(SCHEDULE_ENGINES))
+    # 始终为字符串；空白单元格为空字符串
+    style_numbers = text_column(df['款号'])
+    checks = [
+        (style_numbers.str.strip() == "", lambda i: "款号为空"),
+        (~valid_modes, lambda i: f"无效的排产模式：{modes[i]}"),
+        (valid_modes & ~(modes + "|" + process_types).isin(valid_processes),
+         lambda i: f"无效的工序类型：{process_types[i]}"),
+        (valid_modes & ~(modes + "|" + cycles.astype(str)).isin(valid_cycles),
+         lambda i: f"无效的确认用时：{cycles[i]}"),
+        (sewing_start_dates.isna(), lambda i: "缝纫开始日期无效"),
+        (~(order_quantities > 0), lambda i: "订单数量无效"),
+        (~(daily_productions > 0), lambda i: "日产量无效"),
+    ]
+    errors = []
+    invalid = pd.Series(False, index=df.index)
+    for mask, describe in checks:
+        invalid |= mask
+        # Excel 行号：表头占第1行
+        errors.extend({"行号": i + 2, "款号": style_numbers[i], "原因": describe(i)} for i in df.index[mask])
+    errors.sort(key=lambda error: error["行号"])
+
+    valid = ~invalid
+    styles_df = pd.DataFrame({
+        "style_number": style_numbers,
+        "sewing_start_date": sewing_start_dates.dt.date,
+        # 缝纫开始时间不是上午或下午时默认为上午
+        "start_time_period": df['缝纫开始时间'].where(df['缝纫开始时间'].isin(["上午", "下午"]), "上午"),
+        "process_type": process_types,
+        "cycle": cycles,
+        "order_quantity": order_quantities.fillna(0).astype(int),
+        "daily_production": daily_productions.fillna(0).astype(int),
+        "production_group": text_column(df['生产班组']),
+        "production_order": pd.to_numeric(df['生产顺序'], errors='coerce').fillna(1).astype(int),
+        "company": df['客户'].fillna("").astype(str),
+        "production_mode": modes,
+    })[valid]
+    styles = styles_df.to_dict('records')
+
+    if '交期' in df.columns:
+        delivery_dates = pd.to_datetime(df['交期'], errors='coerce')[valid]
+        for style, delivery_date in zip(styles, delivery_dates):
+            if pd.notna(delivery_date):
+                style["delivery_date"] = delivery_date.date()
+    return styles, errors
+
+STYLE_PAGE_SIZE = 100
+STYLE_SEARCH_FIELDS = ("style_number", "company", "production_group")
+
+def search_styles(styles, query):
+    """ 按款号、客户或生产班组搜索（忽略大小写的包含匹配），返回匹配款式在列表中的下标 """
+    query = query.strip().lower()
+    if not query:
+        return list(range(len(styles)))
+    return [index for index, style in enumerate(styles)
+            if any(query in str(style.get(field, "")).lower() for field in STYLE_SEARCH_FIELDS)]
+
+def style_table(styles, indices):
+    """ 把指定下标的款式转为列表展示用的表格，列名与上传表格一致，行索引为款式在列表中的下标 """
+    rows = [styles[index] for index in indices]
+    columns = {**STYLE_COLUMNS, '交期': "delivery_date"}
+    table = pd.DataFrame({col: [style.get(field) for style in rows] for col, field in columns.items()},
+                         index=list(indices))
+    # 确认用时同时有数字和文字，统一为文字显示
+    table['确认用时'] = table['确认用时'].astype(str)
+    return table
+
+def remove_styles(styles, indices):
+    """ 一次删除多个下标对应的款式，返回 (保留的款式, 删除的款式) """
+    indices = set(indices)
+    kept = [style for index, style in enumerate(styles) if index not in indices]
+    removed = [style for index, style in enumerate(styles) if index in indices]
+    return kept, removed
+
+def style_company(style):
+    """ 款式的客户（文字）：上传的款式保存在 company，页面表单添加的款式保存在 customer """
+    return str(style.get("company") or style.get("customer") or "")
+
+def style_production_group(style):
+    """ 款式的生产班组（文字），没有生产班组时为空字符串 """
+    return str(style.get("production_group") or "")
+
+def filter_styles(styles, sewing_before=None, company=None, production_group=None):
+    """
+    按条件筛选款式（缝纫开始日期早于 sewing_before、客户、生产班组，未指定的条件不筛选），返回下标；
+    客户和生产班组按文字比较，与筛选框中的选项一致
+    """
+    # 款式的缝纫开始日期可能是 date 或 datetime，统一按日期比较
+    if isinstance(sewing_before, datetime):
+        sewing_before = sewing_before.date()
+    indices = []
+    for index, style in enumerate(styles):
+        start_date = style["sewing_start_date"]
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        if sewing_before is not None and not start_date < sewing_before:
+            continue
+        if company is not None and style_company(style) != company:
+            continue
+        if production_group is not None and style_production_group(style) != production_group:
+            continue
+        indices.append(index)
+    return indices
+
+BULK_EDIT_FIELDS = {
+    "daily_production": int,
+    "production_group": str,
+    "production_order": int,
+}
+
+def bulk_update_styles(styles, indices, changes):
+    """
+    批量修改多个款式的日产量、生产班组或生产顺序（生产班组修改即为在班组间移动款式）。
+    先校验全部修改再生成新的款式列表，任何一项无效都不会修改。返回 (新的款式列表, 受影响的生产班组)
+    """
+    for field, value in changes.items():
+        if field not in BULK_EDIT_FIELDS:
+            raise ValueError(f"Invalid bulk edit field: {field}")
+        if BULK_EDIT_FIELDS[field] is int and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+            raise ValueError(f"Invalid {field}: {value}")
+        if field == "production_group" and not str(value).strip():
+            raise ValueError("Target production group must not be empty")
+    indices = set(indices)
+    updated = []
+    affected_groups = set()
+    for index, style in enumerate(styles):
+        if index in indices:
+            affected_groups.add(style.get("production_group", ""))
+            style = {**style, **{field: BULK_EDIT_FIELDS[field](value) for field, value in changes.items()}}
+            affected_groups.add(style.get("production_group", ""))
+        updated.append(style)
+    return updated, affected_groups
+
+def propagate_delays(schedule, graph, delays):
+    """
+    把 delays（{(部门, 工序): 新的时间点}）应用到排产结果，并沿依赖图推迟所有受影响的后续工序：
+    后续工序保持与紧前工序原有的间隔，只会推迟不会提前；缝纫开始前的工序只要不晚于缝纫开始
+    就不会推迟缝纫。只遍历受影响的子图，返回 (新的排产结果, 时间发生变化的工序列表)
+    """
+    nodes = graph["nodes"]
+    dependencies = graph["graph"]
+    node_index = {node: index for index, node in enumerate(nodes)}
+    times = [schedule[dept][step]["时间点"] for dept, step in nodes]
+    new_times = list(times)
+
+    changed = set()
+    for node, new_time in delays.items():
+        if node not in node_index:
+            raise ValueError(f"Invalid step: {node[0]}-{node[1]}")
+        new_times[node_index[node]] = new_time
+        changed.add(node_index[node])
+
+    order = graph["topological_order"]
+    position = {node: i for i, node in enumerate(order)}
+    for node in order[min((position[node] for node in changed), default=len(order)):]:
+        if node not in changed:
+            continue
+        for successor in dependencies.successors(node):
+            # 缝纫开始前完成即可的工序不带间隔，其余保持原有间隔
+            lag = timedelta(0) if dependencies.edges[node, successor].get("deadline") else times[successor] - times[node]
+            if new_times[node] + lag > new_times[successor]:
+                new_times[successor] = new_times[node] + lag
+                changed.add(successor)
+
+    adjusted = {dept: {step: dict(info) for step, info in steps.items()} for dept, steps in schedule.items()}
+    for index, (dept, step) in enumerate(nodes):
+        adjusted[dept][step]["时间点"] = new_times[index]
+    moved = [nodes[index] for index in order if index in changed and new_times[index] != times[index]]
+    return adjusted, moved
+
+def apply_schedule_overrides(style, schedule):
+    """
+    把款式保存的手动调整 style["schedule_overrides"]（{部门: {工序: "YYYY-MM-DD"}}，只记录被调整的工序）
+    叠加到计算出的排产结果上，并推迟受影响的后续工序；已不属于该款式的工序被忽略
+    """
+    overrides = style.get("schedule_overrides")
+    if not overrides:
+        return schedule
+    graph = compile_schedule_graph(style["production_mode"], style["cycle"], style["process_type"])
+    steps = set(graph["nodes"])
+    delays = {
+        (dept, step): datetime.strptime(str(date)[:10], "%Y-%m-%d")
+        for dept, dept_overrides in overrides.items()
+        for step, date in dept_overrides.items()
+        if (dept, step) in steps
+    }
+    return propagate_delays(schedule, graph, delays)[0]
+
+def set_schedule_override(style, department, step, new_time):
+    """ 记录款式某个工序的手动调整，随款式一起保存 """
+    style.setdefault("schedule_overrides", {}).setdefault(department, {})[step] = new_time.strftime("%Y-%m-%d")
+
+def adjust_schedule(schedule, department, delayed_step, new_end_time, graph):
+    """ 调整延误工序的完成时间，并推迟所有部门中受影响的后续工序 """
     if department not in schedule or delayed_step not in schedule[department]:
         return schedule
-    
-    delay_days = (new_end_time - schedule[department][delayed_step]["时间点"]).days
-    found_delayed_step = False
-    
-    for step, times in schedule[department].items():
-        if step == delayed_step:
-            found_delayed_step = True
-            schedule[department][step]["时间点"] = new_end_time
-        elif found_delayed_step:
-            schedule[department][step]["时间点"] += timedelta(days=delay_days)
-    
-    return schedule 
+    return propagate_delays(schedule, graph, {(department, delayed_step): new_end_time})[0]
+
+@perf_span("apply_delays")
+def apply_style_delays(styles, delays, calendar=None, base_schedules=None):
+    """
+    批量应用多个款式的延误：delays 为 [{"style_number", "production_group", "department", "step", "new_time"}, ...]，
+    款式按 (款号, 生产班组) 匹配，没有 production_group 时匹配该款号的第一个款式；同一款式的多条延误一起传播。
+    base_schedules（{(款号, 生产班组): 排产结果}）中已有的款式在其基础上继续调整，其余款式批量计算。
+    返回 {(款号, 生产班组): (新的排产结果, 时间发生变化的工序列表)}
+    """
+    base_schedules = base_schedules or {}
+    styles_by_identity = {}
+    for style in styles:
+        styles_by_identity.setdefault(style_identity(style), style)
+        styles_by_identity.setdefault(style["style_number"], style)
+    delays_by_style = {}
+    for delay in delays:
+        lookup = ((delay["style_number"], delay["production_group"]) if "production_group" in delay
+                  else delay["style_number"])
+        style = styles_by_identity.get(lookup)
+        if style is None:
+            raise ValueError(f"Invalid style_number: {delay['style_number']}")
+        delays_by_style.setdefault(style_identity(style), {})[(delay["department"], delay["step"])] = delay["new_time"]
+
+    affected_styles = [styles_by_identity[identity] for identity in delays_by_style]
+    pending_styles = [style for style in affected_styles if style_identity(style) not in base_schedules]
+    computed_schedules = iter(calculate_style_schedules(pending_styles, calendar))
+    results = {}
+    for style in affected_styles:
+        identity = style_identity(style)
+        schedule = base_schedules.get(identity) or next(computed_schedules)
+        graph = compile_schedule_graph(style["production_mode"], style["cycle"], style["process_type"])
+        results[identity] = propagate_delays(schedule, graph, delays_by_style[identity])
+    return results
+
+def style_identity(style):
+    """ 款号可以重复（不同生产班组），按 (款号, 生产班组) 区分款式 """
+    return style["style_number"], style.get("production_group", "")
+
+DELAY_SHEET_COLUMNS = ['款号', '部门', '工序', '实际完成日期']
+
+def parse_delay_sheet(df, styles):
+    """
+    把各部门报来的实际完成日期表（列：款号、部门、工序、实际完成日期，可选列 生产班组）匹配到款式和工序，
+    返回 (可以传给 apply_style_delays 的延误列表, 无法匹配的行)。
+    款号重复时按生产班组区分，无法确定是哪个款式的行作为无法匹配的行返回
+    """
+    missing_columns = [col for col in DELAY_SHEET_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+
+    styles_by_number = {}
+    for style in styles:
+        styles_by_number.setdefault(style["style_number"], []).append(style)
+    # 与上传款式时相同的方式转为文字，有空单元格的数字列中的 1.0 与款式的 "1" 匹配
+    if '生产班组' in df.columns:
+        groups = text_column(df['生产班组']).str.strip()
+    else:
+        groups = pd.Series("", index=df.index)
+    # 同一种 (排产模式, 确认用时, 工序) 的款式共用一个工序集合
+    steps_by_key = {}
+
+    delays = []
+    unmatched = []
+    style_numbers = text_column(df['款号']).str.strip()
+    departments = df['部门'].astype(str).str.strip()
+    steps = df['工序'].astype(str).str.strip()
+    dates = pd.to_datetime(df['实际完成日期'], errors='coerce').dt.normalize()
+    # Excel 行号：表头占第1行
+    for row_number, style_number, group, dept, step, date in zip(
+            range(2, len(df) + 2), style_numbers, groups, departments, steps, dates):
+        candidates = styles_by_number.get(style_number, [])
+        if group:
+            candidates = [style for style in candidates if str(style.get("production_group", "")) == group]
+        style = candidates[0] if len(candidates) == 1 else None
+        if not candidates:
+            reason = "款号不存在" if not group else "款号和生产班组不匹配"
+        elif style is None:
+            reason = "款号重复，请填写生产班组区分" if not group else "款号和生产班组重复，无法区分"
+        elif pd.isna(date):
+            reason = "实际完成日期无效"
+        else:
+            key = (style["production_mode"], style["cycle"], style["process_type"])
+            if key not in steps_by_key:
+                steps_by_key[key] = set(compile_schedule_graph(*key)["nodes"])
+            if (dept, step) in steps_by_key[key]:
+                delays.append({"style_number": style_number, "production_group": style.get("production_group", ""),
+                               "department": dept, "step": step, "new_time": date.to_pydatetime()})
+                continue
+            reason = "该款式没有此部门/工序"
+        unmatched.append({"行号": row_number, "款号": style_number, "部门": dept, "工序": step, "原因": reason})
+    return delays, unmatched
 
 # Define valid credentials (you can modify this dictionary as needed)
 VALID_CREDENTIALS = {
@@ -2824,735 +4359,682 @@ VALID_CREDENTIALS = {
     "user2": "password2"
 }
 
-# Initialize session state for login
-if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = False
-if "current_user" not in st.session_state:
-    st.session_state["current_user"] = None
-
 def login(account_id):
     st.session_state["logged_in"] = True
     st.session_state["current_user"] = account_id
+    PERF_CONTEXT.user = account_id
     # Load user's saved data
     user_data = load_user_data(account_id)
     st.session_state["all_styles"] = user_data["all_styles"]
-
-# Login page
-
-
-if not st.session_state.get("logged_in", False):
-    # ✅ 使用 st.empty() 确保所有内容填充整个页面
-    login_container = st.empty()
-
-    with login_container.container():
-        # ✅ 创建两列布局
-        col1, col2 = st.columns([1, 1])  # 左侧登录，右侧欢迎信息
-
-        # 🎨 **左侧：登录框**
+    st.session_state["rearrange_cache"] = new_rearrange_cache()
+    st.session_state["delay_affected_styles"] = []
+
+EXPORT_STATUS_LABELS = {"queued": "排队中", "running": "生成中", "done": "已完成", "failed": "失败",
+                        "interrupted": "已中断，请重新生成", "expired": "文件已清理，请重新生成"}
+
+def render_export_jobs(user_id):
+    """ 显示导出任务列表，有未完成的任务时每2秒只刷新这一部分 """
+    maybe_sweep_export_storage()
+    polling = any(job["status"] in ("queued", "running") for job in list_export_jobs(user_id))
+    st.fragment(_render_export_job_list, run_every=2 if polling else None)(user_id, polling)
+
+def _render_export_job_list(user_id, polling):
+    # 定时刷新时只重新运行这个函数，不经过 main()，需要再设置一次账号
+    PERF_CONTEXT.user = user_id
+    jobs = list_export_jobs(user_id)
+    if not jobs:
+        return
+    st.write("#### 导出任务")
+    for job in jobs:
+        col1, col2, col3 = st.columns([3, 3, 1])
         with col1:
-            st.markdown(
-                """
-                <div style="min-width: 500px; max-width: 700px; 
-                            padding: 40px;  /* ✅ 让整个左边框更美观 */
-                            background-color: white; 
-                            border-radius: 10px;">
-                    <h2 style='text-align: left; 
-                            margin-top: 40px;  
-                            margin-bottom: 10px;  
-                            font-size: 2.5em;'>
-                        登录到您的账户
-                    </h2>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            # 如果有LOGO，可以放在这里
-            # st.image("logo.png", width=120)
-
-            account_id = st.text_input("账号", key="account_input")
-            password = st.text_input("密码", type="password", key="password_input")
-
-            # ✅ 居中的登录按钮
-            col_a, col_b, col_c = st.columns([1, 2, 1])
-            with col_b:
-                button_style = """
-                <style>
-                    div[data-testid="stButton"] button {
+            st.write(f"{job['label']}（{job['style_count']} 个款号，{job['created'].replace('T', ' ')}）")
+        with col2:
+            if job["status"] == "done":
+                st.download_button(
+                    label=f"下载{job['label']}",
+                    # 点击时才读取文件
+                    data=functools.partial(read_export_job_result, user_id, job["id"]),
+                    file_name=job["file_name"],
+                    mime=EXPORT_TYPES[job["type"]]["mime"],
+                    key=f"download_export_{job['id']}"
+                )
+            elif job["status"] == "running":
+                st.progress(job["progress"], text=f"生成中 {job['progress']:.0%}")
+            elif job["status"] == "failed":
+                st.error(f"导出失败：{job['error']}")
+            elif job["status"] == "queued" and job.get("queue_position"):
+                st.write(f"排队中，前面还有 {job['queue_position']} 个任务")
+            else:
+                st.write(EXPORT_STATUS_LABELS[job["status"]])
+        with col3:
+            if job["status"] not in ("queued", "running") and st.button("删除", key=f"delete_export_{job['id']}"):
+                delete_export_job(user_id, job["id"])
+                st.rerun(scope="fragment")
+    # 所有任务结束后刷新整个页面，停止定时刷新
+    if polling and not any(job["status"] in ("queued", "running") for job in jobs):
+        st.rerun()
+
+def main():
+    """Streamlit 页面入口，使本模块可以被脚本和服务直接导入"""
+    # Initialize session state for login
+    if "logged_in" not in st.session_state:
+        st.session_state["logged_in"] = False
+    if "current_user" not in st.session_state:
+        st.session_state["current_user"] = None
+    # 未登录时不归属任何账号（登出后 current_user 可能还没有清除）
+    PERF_CONTEXT.user = st.session_state["current_user"] if st.session_state["logged_in"] else None
+
+    # Login page
+
+
+    if not st.session_state.get("logged_in", False):
+        # ✅ 使用 st.empty() 确保所有内容填充整个页面
+        login_container = st.empty()
+
+        with login_container.container():
+            # ✅ 创建两列布局
+            col1, col2 = st.columns([1, 1])  # 左侧登录，右侧欢迎信息
+
+            # 🎨 **左侧：登录框**
+            with col1:
+                st.markdown(
+                    """
+                    <div style="min-width: 500px; max-width: 700px; 
+                                padding: 40px;  /* ✅ 让整个左边框更美观 */
+                                background-color: white; 
+                                border-radius: 10px;">
+                        <h2 style='text-align: left; 
+                                margin-top: 40px;  
+                                margin-bottom: 10px;  
+                                font-size: 2.5em;'>
+                            登录到您的账户
+                        </h2>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+                # 如果有LOGO，可以放在这里
+                # st.image("logo.png", width=120)
+
+                account_id = st.text_input("账号", key="account_input")
+                password = st.text_input("密码", type="password", key="password_input")
+
+                # ✅ 居中的登录按钮
+                col_a, col_b, col_c = st.columns([1, 2, 1])
+                with col_b:
+                    button_style = """
+                    <style>
+                        div[data-testid="stButton"] button {
+                            background: linear-gradient(135deg, #6a11cb, #2575fc);
+                            color: white;
+                            border: none;
+                            padding: 0.5rem 1rem;
+                            border-radius: 5px;
+                            font-weight: bold;
+                            transition: all 0.3s ease;
+                        }
+                        div[data-testid="stButton"] button:hover {
+                            background: linear-gradient(135deg, #5a0cb1, #1e63d6);
+                            transform: translateY(-2px);
+                            box-shadow: 0 4px 12px rgba(106, 17, 203, 0.3);
+                        }
+                    </style>
+                    """
+                    st.markdown(button_style, unsafe_allow_html=True)
+                    if st.button("登录", use_container_width=True):
+                        if account_id in VALID_CREDENTIALS and password == VALID_CREDENTIALS[account_id]:
+                            st.session_state["logged_in"] = True
+                            st.session_state["current_user"] = account_id
+                            # 登录成功后的耗时记录归属该账号
+                            PERF_CONTEXT.user = account_id
+                            st.rerun()
+                        else:
+                            st.error("账号或密码错误，请重试")
+
+            # 🎨 **右侧：欢迎信息**
+            with col2:
+                st.markdown(
+                    """
+                    <div style='
                         background: linear-gradient(135deg, #6a11cb, #2575fc);
+                        padding: 70px;
+                        min-height: 500px;
+                        min-width: 450px;
                         color: white;
-                        border: none;
-                        padding: 0.5rem 1rem;
-                        border-radius: 5px;
-                        font-weight: bold;
-                        transition: all 0.3s ease;
-                    }
-                    div[data-testid="stButton"] button:hover {
-                        background: linear-gradient(135deg, #5a0cb1, #1e63d6);
-                        transform: translateY(-2px);
-                        box-shadow: 0 4px 12px rgba(106, 17, 203, 0.3);
-                    }
-                </style>
-                """
-                st.markdown(button_style, unsafe_allow_html=True)
-                if st.button("登录", use_container_width=True):
-                    if account_id in VALID_CREDENTIALS and password == VALID_CREDENTIALS[account_id]:
-                        st.session_state["logged_in"] = True
-                        st.session_state["current_user"] = account_id
-                        st.rerun()
-                    else:
-                        st.error("账号或密码错误，请重试")
+                        border-radius: 120px 40px 40px 120px;  /* ✅ 让它更符合UI */
+                        text-align: center;
+                        margin-left: 100px;
+                    '>
+                        <h1 style="margin-bottom: 10px; color: white;">欢迎回来！</h1>
+                        <p style="font-size: 18px; color: white;">请登录以访问生产流程管理系统。</p>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
 
-        # 🎨 **右侧：欢迎信息**
-        with col2:
-            st.markdown(
-                """
-                <div style='
-                    background: linear-gradient(135deg, #6a11cb, #2575fc);
-                    padding: 70px;
-                    min-height: 500px;
-                    min-width: 450px;
-                    color: white;
-                    border-radius: 120px 40px 40px 120px;  /* ✅ 让它更符合UI */
-                    text-align: center;
-                    margin-left: 100px;
-                '>
-                    <h1 style="margin-bottom: 10px; color: white;">欢迎回来！</h1>
-                    <p style="font-size: 18px; color: white;">请登录以访问生产流程管理系统。</p>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+        # ✅ 强制设置高度，防止需要滚动
+        st.markdown(
+            """
+            <style>
+            .block-container {
+                padding-top: 3vh !important;  /* 页面上方留空间 */
+                height: 90vh !important;  /* 让整个界面占满 */
+                max-width: 1600px !important; /* 控制最大宽度 */
+                display: flex;
+                justify-content: center;
+                align-items: center;
+            }
+            </style>
+            """,
+            unsafe_allow_html=True
+        )
 
-    # ✅ 强制设置高度，防止需要滚动
-    st.markdown(
-        """
-        <style>
-        .block-container {
-            padding-top: 3vh !important;  /* 页面上方留空间 */
-            height: 90vh !important;  /* 让整个界面占满 */
-            max-width: 1600px !important; /* 控制最大宽度 */
-            display: flex;
-            justify-content: center;
-            align-items: center;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
 
+    else:
+        # Main application code
+        # 以下各部分的耗时记录归属当前登录的账号
+        PERF_CONTEXT.user = st.session_state["current_user"]
+        st.title("生产流程时间管理系统")
 
-else:
-    # Main application code
-    st.title("生产流程时间管理系统")
-    
-    # Add user info and logout button in the top right
-    col1, col2, col3 = st.columns([8, 2, 1])
-    with col2:
-        st.write(f"当前用户: {st.session_state['current_user']}")
-    with col3:
-        if st.button("登出"):
-            # Save user data before logging out
-            save_user_data(st.session_state["current_user"], {
-                "all_styles": st.session_state["all_styles"]
-            })
-            st.session_state["logged_in"] = False
-            st.session_state["current_user"] = None
-            st.rerun()
-    
-    # Initialize session state
-    if "all_styles" not in st.session_state:
-        st.session_state["all_styles"] = []
+        # Add user info and logout button in the top right
+        col1, col2, col3 = st.columns([8, 2, 1])
+        with col2:
+            st.write(f"当前用户: {st.session_state['current_user']}")
+        with col3:
+            if st.button("登出"):
+                # Save user data before logging out
+                save_user_data(st.session_state["current_user"], {
+                    "all_styles": st.session_state["all_styles"]
+                })
+                st.session_state["logged_in"] = False
+                st.session_state["current_user"] = None
+                PERF_CONTEXT.user = None
+                st.rerun()
 
-    # 添加Excel上传功能
-    st.subheader("方式一：上传Excel文件")
-    uploaded_file = st.file_uploader("上传Excel文件 (必需列：款号、缝纫开始日期、缝纫开始时间、工序、确认用时、订单数量、日产量、生产班组、生产顺序、客户)", type=['xlsx', 'xls'])
+        # Initialize session state
+        if "all_styles" not in st.session_state:
+            st.session_state["all_styles"] = []
+        if "rearrange_cache" not in st.session_state:
+            st.session_state["rearrange_cache"] = new_rearrange_cache()
+        if "delay_affected_styles" not in st.session_state:
+            st.session_state["delay_affected_styles"] = []
+
+        # 管理员可在侧边栏查看各阶段耗时统计
+        if st.session_state["current_user"] in PERF_ADMIN_USERS:
+            with st.sidebar:
+                if st.checkbox("显示性能面板", value=False):
+                    st.subheader("性能")
+                    flush_perf_log()
+                    perf_user = st.selectbox("账号:", ["全部"] + sorted(VALID_CREDENTIALS.keys()), key="perf_user")
+                    perf_stats = load_perf_stats(None if perf_user == "全部" else perf_user)
+                    if perf_stats.empty:
+                        st.info("暂无耗时记录")
+                    else:
+                        st.caption("各阶段耗时 (毫秒)")
+                        st.dataframe(perf_stats, use_container_width=True)
+                    usage = export_storage_usage()
+                    st.caption(
+                        f"导出缓存 {usage['cache_bytes'] / 1024 ** 2:.1f} MB / {EXPORT_CACHE_MAX_BYTES / 1024 ** 2:.0f} MB"
+                        f"（{usage['cache_files']} 个文件），导出任务 {usage['export_jobs']} 个，"
+                        f"内存暂存 {usage['memory_bytes'] / 1024 ** 2:.1f} MB，磁盘剩余 {usage['disk_free_bytes'] / 1024 ** 3:.1f} GB"
+                    )
+                    if st.button("立即清理导出文件", key="sweep_exports"):
+                        sweep_export_storage()
+                        st.rerun()
 
+        # 添加Excel上传功能
+        st.subheader("方式一：上传Excel文件")
+        uploaded_file = st.file_uploader("上传Excel、CSV或Parquet文件 (必需列：款号、缝纫开始日期、缝纫开始时间、工序、确认用时、订单数量、日产量、生产班组、生产顺序、客户)", type=['xlsx', 'xls', 'csv', 'parquet'])
 
-    if uploaded_file is not None:
-        try:
-            df = pd.read_excel(uploaded_file)
-            required_columns = ['款号', '缝纫开始日期', '缝纫开始时间', '工序', '确认用时', '订单数量', '日产量', '生产班组', '生产顺序', '客户', '排产模式']
-            # 显示Excel可选列的说明
-            st.info("""
-            **Excel文件说明**:
-            * 必需列: 款号、缝纫开始日期、缝纫开始时间、工序、确认用时、订单数量、日产量、生产班组、排产模式、生产顺序 (同一生产班组内款式的排产顺序，相同顺序号的款式将在同一天开始生产)
-            * 可选列: 交期
-            * 缝纫开始时间列应填写"上午"或"下午"
-            * 排产模式列应为: 龙兵、贝贝、补数
-            * 工序列应为以下之一: 
-                - 龙兵: 满花局花绣花、满花局花、满花绣花、局花绣花、满花、局花、绣花
-                - 贝贝: 满花局花绣花、满花局花、满花绣花、局花绣花、满花、局花、绣花、无印绣
-                - 补数: 满花局花绣花、满花局花、满花绣花、局花绣花、满花、局花、绣花
-            * 确认用时:
-              - 龙兵: 7, 14, 30, 1个月交期+确认5天
-              - 贝贝: SC, 百货店
-              - 补数: 无库存棉纱、无库存毛坯、无库存光坯、有库存光坯
-            * 客户列可自由输入
-            """)
-            
-            # Check if all required columns exist
-            if not all(col in df.columns for col in required_columns):
-                st.error(f"Excel文件必须包含以下列：{', '.join(required_columns)}")
-            else:
-                # Convert dates to datetime if they aren't already
-                df['缝纫开始日期'] = pd.to_datetime(df['缝纫开始日期']).dt.date
-                
-                # Validate process types
-                valid_processes = ["满花局花绣花", "满花局花", "满花绣花", "局花绣花", "满花", "局花", "绣花", "无印绣"]
-                valid_processes_bushu = ["满花局花绣花", "满花局花", "满花绣花", "局花绣花", "满花", "局花", "绣花"]
-                valid_production_mode = ["龙兵", "贝贝", "补数"]
-                invalid_production_mode = df[~df['排产模式'].isin(valid_production_mode)]['排产模式'].unique()
-                invalid_processes = []
-                for idx, row in df.iterrows():
-                    production_mode = row['排产模式']
-                    process = row['工序']
-                    if production_mode == '补数' and process not in valid_processes_bushu:
-                        invalid_processes.append(process)
-                    elif production_mode in ['龙兵', '贝贝'] and process not in valid_processes:
-                        invalid_processes.append(process)
-                invalid_processes = list(set(invalid_processes))
-                
-                if len(invalid_processes) > 0:
-                    st.error(f"发现无效的工序类型：{', '.join(invalid_processes)}")
-                elif len(invalid_production_mode) > 0:
-                    st.error(f"发现无效的排产模式：{', '.join(invalid_production_mode)}")
+
+        if uploaded_file is not None:
+            try:
+                df = read_style_table(uploaded_file)
+                required_columns = list(STYLE_COLUMNS)
+                # 显示Excel可选列的说明
+                st.info("""
+                **Excel文件说明**:
+                * 必需列: 款号、缝纫开始日期、缝纫开始时间、工序、确认用时、订单数量、日产量、生产班组、排产模式、生产顺序 (同一生产班组内款式的排产顺序，相同顺序号的款式将在同一天开始生产)
+                * 可选列: 交期
+                * 缝纫开始时间列应填写"上午"或"下午"
+                * 排产模式列应为: 龙兵、贝贝、补数
+                * 工序列应为以下之一: 
+                    - 龙兵: 满花局花绣花、满花局花、满花绣花、局花绣花、满花、局花、绣花
+                    - 贝贝: 满花局花绣花、满花局花、满花绣花、局花绣花、满花、局花、绣花、无印绣
+                    - 补数: 满花局花绣花、满花局花、满花绣花、局花绣花、满花、局花、绣花
+                * 确认用时:
+                  - 龙兵: 7, 14, 30, 1个月交期+确认5天
+                  - 贝贝: SC, 百货店
+                  - 补数: 无库存棉纱、无库存毛坯、无库存光坯、有库存光坯
+                * 客户列可自由输入
+                """)
+
+                # Check if all required columns exist
+                if not all(col in df.columns for col in required_columns):
+                    st.error(f"文件必须包含以下列：{', '.join(required_columns)}")
                 else:
-                    # 检查"生产顺序"列是否存在
-                    has_production_order = '生产顺序' in df.columns
-                    if has_production_order:
+                    # 按列批量校验并转换，所有有问题的行一次性列出
+                    new_styles, errors = build_styles_from_dataframe(df)
+                    if errors:
+                        st.error(f"发现 {len(errors)} 处错误，请修改后重新上传")
+                        st.dataframe(pd.DataFrame(errors), use_container_width=True)
+                    else:
                         st.success("检测到'生产顺序'列，将根据此列对同一生产班组内的款式进行排序。")
-                        
-                    # Add new styles from Excel
-                    new_styles = []
-                    for _, row in df.iterrows():
-                        # 确保缝纫开始时间是上午或下午，默认为上午
-                        start_time = row['缝纫开始时间'] if row['缝纫开始时间'] in ["上午", "下午"] else "上午"
-                        # 获取生产顺序，如果存在
-                        production_order = int(row['生产顺序']) if '生产顺序' in df.columns and pd.notna(row['生产顺序']) else 1
 
-                        try:
-                            cycle_value = int(row['确认用时'])
-                        except (ValueError, TypeError):
-                            cycle_value = str(row['确认用时'])
+                        # 根据交期倒推最晚缝纫开始时间
+                        if any(style.get("delivery_date") for style in new_styles) and st.checkbox(
+                                "根据交期倒推最晚缝纫开始日期", value=False,
+                                help="有交期的款式使用使后整-检针装箱不晚于交期的最晚缝纫开始日期和时段"):
+                            latest_starts = solve_latest_start(new_styles)
+                            infeasible = []
+                            for style, latest_start in zip(new_styles, latest_starts):
+                                if latest_start is None:
+                                    continue
+                                style["sewing_start_date"] = latest_start["sewing_start_date"]
+                                style["start_time_period"] = latest_start["start_time_period"]
+                                if not latest_start["feasible"]:
+                                    infeasible.append(f"{style['style_number']}（最早工序 {latest_start['first_step_date']}）")
+                            if infeasible:
+                                st.warning(f"以下款号按交期倒推后最早工序已早于今天，无法按期完成：{', '.join(infeasible)}")
+
+                        if st.button("添加Excel中的款号"):
+                            st.session_state["all_styles"].extend(new_styles)
+                            mark_production_groups_dirty(st.session_state["rearrange_cache"],
+                                                         [style["production_group"] for style in new_styles])
+                            # Auto-save after adding styles
+                            save_user_data(st.session_state["current_user"], {
+                                "all_styles": st.session_state["all_styles"]
+                            })
+                            st.success(f"已从Excel添加 {len(new_styles)} 个款号")
+                            st.rerun()
+
+            except Exception as e:
+                st.error(f"读取文件时出错：{str(e)}")
+
+        st.subheader("方式二：手动输入")
+        # 创建输入表单
+        with st.form("style_input_form"):
+            # 批量输入款号，每行一个
+            style_numbers = st.text_area("请输入款号(每行一个):", "")
+            sewing_start_date = st.date_input("请选择缝纫开始日期:", min_value=datetime.today().date())
+            # 新增交期（可选）
+            delivery_date = st.date_input("交期 (可选)", value=None, min_value=None, key="delivery_date_optional")
+
+            # 添加上午/下午选择
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                start_time_period = st.selectbox("缝纫开始时间:", ["上午", "下午"])
+            with col2:
+                # 排产模式 selectbox
+                production_mode = st.selectbox("排产模式:", ["龙兵", "贝贝", "补数"], key="production_mode_selector")
+            with col3:
+                customer = st.text_input("客户 (可自由填写)", "")
+
+            # 添加新字段
+            order_quantity = st.number_input("订单数量:", min_value=1, value=100)
+            daily_production = st.number_input("日产量:", min_value=1, value=50)
+            production_group = st.text_input("生产班组号:", "")
+            production_order = st.number_input("生产顺序:", min_value=1, value=1, help="同一生产班组内款式的生产顺序")
+            # 根据选择的客户显示不同的周期选项
+            cycle_options = get_cycle_options(production_mode)
+            cycle = st.selectbox("请选择确认用时:", cycle_options)
+
+            submitted = st.form_submit_button("添加款号")
+            if submitted and style_numbers:
+                try:
+                    # Validate cycle value
+                    cycle_value = validate_cycle(production_mode, cycle)
+                    cycle_value = convert_cycle_to_int(production_mode, cycle_value)
+
+                    # 分割多行输入，去除空行和空格
+                    new_style_numbers = [s.strip() for s in style_numbers.split('\n') if s.strip()]
+
+                    # 添加新的款号信息
+                    for style_number in new_style_numbers:
                         new_style = {
-                            "style_number": str(row['款号']),
-                            "sewing_start_date": row['缝纫开始日期'],
-                            "start_time_period": start_time,
-                            "process_type": row['工序'],
+                            "style_number": style_number,
+                            "sewing_start_date": sewing_start_date,
+                            "start_time_period": start_time_period,
+                            "process_type": selected_process,
+                            "production_mode": production_mode,
+                            "customer": customer,
                             "cycle": cycle_value,
-                            "order_quantity": int(row['订单数量']),
-                            "daily_production": int(row['日产量']),
-                            "production_group": str(row['生产班组']),
-                            "production_order": production_order,
-                            "company": str(row['客户']),
-                            "production_mode": str(row['排产模式'])
+                            "order_quantity": order_quantity,
+                            "daily_production": daily_production,
+                            "production_group": production_group,
+                            "production_order": production_order
                         }
-                        if '交期' in df.columns and pd.notna(row['交期']):
-                            new_style["delivery_date"] = pd.to_datetime(row['交期']).date()
-                        new_styles.append(new_style)
-                    
-                    if st.button("添加Excel中的款号"):
-                        st.session_state["all_styles"].extend(new_styles)
-                        # Auto-save after adding styles
+                        if delivery_date:
+                            new_style["delivery_date"] = delivery_date
+                        st.session_state["all_styles"].append(new_style)
+                    mark_production_groups_dirty(st.session_state["rearrange_cache"], [production_group])
+                    # Auto-save after adding styles
+                    save_user_data(st.session_state["current_user"], {
+                        "all_styles": st.session_state["all_styles"]
+                    })
+                    st.success(f"已添加 {len(new_style_numbers)} 个款号")
+                except ValueError as e:
+                    st.error(str(e))
+
+        # 显示当前添加的所有款号
+        if st.session_state["all_styles"]:
+            st.subheader("已添加的款号:")
+
+            # 按款号/客户/生产班组搜索后分页显示，每次只渲染一页
+            search_query = st.text_input("搜索款号/客户/生产班组:", key="style_search")
+            matched_indices = search_styles(st.session_state["all_styles"], search_query)
+            page_count = max(1, -(-len(matched_indices) // STYLE_PAGE_SIZE))
+            page = st.number_input("页码:", min_value=1, max_value=page_count, value=1)
+            page_indices = matched_indices[(page - 1) * STYLE_PAGE_SIZE:page * STYLE_PAGE_SIZE]
+            st.caption(f"共 {len(st.session_state['all_styles'])} 个款号，匹配 {len(matched_indices)} 个，"
+                       f"第 {page}/{page_count} 页")
+
+            # 勾选行后可一次删除多个款号
+            selection = st.dataframe(
+                style_table(st.session_state["all_styles"], page_indices),
+                use_container_width=True,
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=f"style_table_{search_query}_{page}"
+            )
+            selected_indices = [page_indices[row] for row in selection.selection.rows]
+            if selected_indices and st.button(f"删除选中的 {len(selected_indices)} 个款号"):
+                st.session_state["all_styles"], removed_styles = remove_styles(
+                    st.session_state["all_styles"], selected_indices)
+                mark_production_groups_dirty(st.session_state["rearrange_cache"],
+                                             [style.get("production_group", "") for style in removed_styles])
+                # Auto-save after deleting styles
+                save_user_data(st.session_state["current_user"], {
+                    "all_styles": st.session_state["all_styles"]
+                })
+                st.rerun()
+
+            # 按条件批量删除或修改，整批只保存一次
+            with st.expander("批量操作"):
+                companies = sorted({style_company(style) for style in st.session_state["all_styles"]})
+                groups = sorted({style_production_group(style) for style in st.session_state["all_styles"]})
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    bulk_before = st.date_input("缝纫开始日期早于:", value=None, key="bulk_before")
+                with col2:
+                    bulk_company = st.selectbox("客户:", ["全部"] + companies, key="bulk_company")
+                with col3:
+                    bulk_group = st.selectbox("生产班组:", ["全部"] + groups, key="bulk_group")
+                bulk_indices = filter_styles(
+                    st.session_state["all_styles"],
+                    sewing_before=bulk_before,
+                    company=None if bulk_company == "全部" else bulk_company,
+                    production_group=None if bulk_group == "全部" else bulk_group
+                )
+                st.caption(f"符合条件的款号：{len(bulk_indices)} 个")
+
+                bulk_action = st.radio("操作:", ["删除", "修改日产量", "修改生产班组", "修改生产顺序"],
+                                       horizontal=True, key="bulk_action")
+                if bulk_action == "修改日产量":
+                    changes = {"daily_production": int(st.number_input("新的日产量:", min_value=1, value=50, key="bulk_daily"))}
+                elif bulk_action == "修改生产班组":
+                    changes = {"production_group": st.text_input("移动到生产班组:", "", key="bulk_target_group")}
+                elif bulk_action == "修改生产顺序":
+                    changes = {"production_order": int(st.number_input("新的生产顺序:", min_value=1, value=1, key="bulk_order"))}
+                else:
+                    changes = None
+
+                if bulk_indices and st.button(f"应用到 {len(bulk_indices)} 个款号", key="bulk_apply"):
+                    if changes is not None and "production_group" in changes and not changes["production_group"].strip():
+                        st.error("请填写要移动到的生产班组")
+                    else:
+                        if changes is None:
+                            st.session_state["all_styles"], removed_styles = remove_styles(
+                                st.session_state["all_styles"], bulk_indices)
+                            affected_groups = [style.get("production_group", "") for style in removed_styles]
+                        else:
+                            st.session_state["all_styles"], affected_groups = bulk_update_styles(
+                                st.session_state["all_styles"], bulk_indices, changes)
+                        mark_production_groups_dirty(st.session_state["rearrange_cache"], affected_groups)
+                        # Auto-save once for the whole batch
                         save_user_data(st.session_state["current_user"], {
                             "all_styles": st.session_state["all_styles"]
                         })
-                        st.success(f"已从Excel添加 {len(new_styles)} 个款号")
                         st.rerun()
-        
-        except Exception as e:
-            st.error(f"读取Excel文件时出错：{str(e)}")
-
-    st.subheader("方式二：手动输入")
-    # 创建输入表单
-    with st.form("style_input_form"):
-        # 批量输入款号，每行一个
-        style_numbers = st.text_area("请输入款号(每行一个):", "")
-        sewing_start_date = st.date_input("请选择缝纫开始日期:", min_value=datetime.today().date())
-        # 新增交期（可选）
-        delivery_date = st.date_input("交期 (可选)", value=None, min_value=None, key="delivery_date_optional")
-
-        # 添加上午/下午选择
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            start_time_period = st.selectbox("缝纫开始时间:", ["上午", "下午"])
-        with col2:
-            # 排产模式 selectbox
-            production_mode = st.selectbox("排产模式:", ["龙兵", "贝贝", "补数"], key="production_mode_selector")
-        with col3:
-            customer = st.text_input("客户 (可自由填写)", "")
-        
-        # 添加新字段
-        order_quantity = st.number_input("订单数量:", min_value=1, value=100)
-        daily_production = st.number_input("日产量:", min_value=1, value=50)
-        production_group = st.text_input("生产班组号:", "")
-        production_order = st.number_input("生产顺序:", min_value=1, value=1, help="同一生产班组内款式的生产顺序")
-        # 根据选择的客户显示不同的周期选项
-        cycle_options = get_cycle_options(production_mode)
-        cycle = st.selectbox("请选择确认用时:", cycle_options)
-        
-        submitted = st.form_submit_button("添加款号")
-        if submitted and style_numbers:
-            try:
-                # Validate cycle value
-                cycle_value = validate_cycle(production_mode, cycle)
-                cycle_value = convert_cycle_to_int(production_mode, cycle_value)
-                
-                # 分割多行输入，去除空行和空格
-                new_style_numbers = [s.strip() for s in style_numbers.split('\n') if s.strip()]
-                
-                # 添加新的款号信息
-                for style_number in new_style_numbers:
-                    new_style = {
-                        "style_number": style_number,
-                        "sewing_start_date": sewing_start_date,
-                        "start_time_period": start_time_period,
-                        "process_type": selected_process,
-                        "production_mode": production_mode,
-                        "customer": customer,
-                        "cycle": cycle_value,
-                        "order_quantity": order_quantity,
-                        "daily_production": daily_production,
-                        "production_group": production_group,
-                        "production_order": production_order
-                    }
-                    if delivery_date:
-                        new_style["delivery_date"] = delivery_date
-                    st.session_state["all_styles"].append(new_style)
-                # Auto-save after adding styles
+
+            # 添加清空所有按钮
+            if st.button("清空所有款号"):
+                st.session_state["all_styles"] = []
+                st.session_state["rearrange_cache"] = new_rearrange_cache()
+                st.session_state["delay_affected_styles"] = []
+                # Auto-save after clearing styles
                 save_user_data(st.session_state["current_user"], {
                     "all_styles": st.session_state["all_styles"]
                 })
-                st.success(f"已添加 {len(new_style_numbers)} 个款号")
-            except ValueError as e:
-                st.error(str(e))
+                st.rerun()
+
+        # 添加是否启用连续排产的选项
+        if st.session_state["all_styles"]:
+            st.subheader("生成图表")
+
+            # 添加连续排产逻辑说明
+            with st.expander("📋 查看生产班组连续排产逻辑说明"):
+                st.markdown("""
+                ### 生产班组连续排产逻辑
+
+                系统按以下规则处理同一生产班组内的款式排产:
+
+                1. **同一生产顺序的款式**:
+                   - 共享相同的缝纫开始日期和时段（上午/下午）
+                   - 生产顺序为1的款式使用原始设定的开始日期
+                   - 各自按其工序、订单数量和日产量计算结束时间
+
+                2. **连续排产规则**:
+                   - 系统会找出当前生产顺序组中结束时间最晚的款式
+                   - 该款式的缝纫结束时间（及上午/下午时段）将作为下一个生产顺序组的开始时间
+                   - 依此类推，形成连续排产
+
+                3. **实际应用**:
+                   - 生产顺序为1的款式可以手动指定开始日期
+                   - 生产顺序为2、3...的款式会自动根据前一组的结束时间进行排产
+                   - 相同生产顺序的款式将在同一天同一时段开始，可能在不同时间结束
+                """)
+
+            enable_sequential_production = st.checkbox("启用生产班组连续排产功能", value=True, 
+                                                help="启用后，同一生产班组内，下一个生产顺序(production_order)的款式将从前一个生产顺序中最晚完成的款式结束时间开始")
+            sequencing_method = SEQUENCING_METHODS[0]
+            line_capacity = 1
+            if enable_sequential_production:
+                col1, col2 = st.columns(2)
+                with col1:
+                    sequencing_method = st.radio("连续排产方式:", SEQUENCING_METHODS, horizontal=True,
+                                                 help="按产线产能排产：每条产线同一时间只生产一个款式，款式按生产顺序安排到最早空闲的产线")
+                with col2:
+                    if sequencing_method == "按产线产能排产":
+                        line_capacity = st.number_input("每个生产班组的产线数:", min_value=1, value=1)
+
+            # 添加预览按钮，预览结果缓存到款式列表或排产方式变化为止
+            if enable_sequential_production and st.button("预览生产班组排产结果"):
+                st.session_state["show_preview"] = True
+            if enable_sequential_production and st.session_state.get("show_preview"):
+                calendar_key = repr(get_factory_calendar())
+                preview_cache = st.session_state.get("preview_cache")
+                if preview_cache is None or preview_cache["key"] != (
+                        sequencing_method, line_capacity, calendar_key, styles_fingerprint(st.session_state["all_styles"])):
+                    try:
+                        preview_table = build_sequencing_preview(st.session_state["all_styles"], sequencing_method,
+                                                                 st.session_state["rearrange_cache"], line_capacity)
+                    except ValueError as e:
+                        # 例如手动调整后缝纫结束早于缝纫开始，无法按产线产能排产
+                        st.error(f"无法排产：{e}")
+                        st.session_state["show_preview"] = False
+                        preview_cache = None
+                    else:
+                        # 按生产顺序衔接会写回款式的缝纫开始时间（产能排产返回副本），按排产后的款式列表记录
+                        preview_cache = {
+                            "key": (sequencing_method, line_capacity, calendar_key,
+                                    styles_fingerprint(st.session_state["all_styles"])),
+                            "table": preview_table,
+                        }
+                        st.session_state["preview_cache"] = preview_cache
+            if enable_sequential_production and st.session_state.get("show_preview") and preview_cache is not None:
+                preview_table = preview_cache["table"]
+
+                col1, col2, col3 = st.columns([2, 2, 1])
+                with col1:
+                    preview_groups = st.multiselect("筛选生产班组:", list(dict.fromkeys(preview_table["生产班组"])))
+                with col2:
+                    preview_search = st.text_input("搜索款号/客户:", key="preview_search")
+                with col3:
+                    if st.button("关闭预览"):
+                        st.session_state["show_preview"] = False
+                        st.rerun()
+                filtered_table = preview_table
+                if preview_groups:
+                    filtered_table = filtered_table[filtered_table["生产班组"].isin(preview_groups)]
+                if preview_search.strip():
+                    keyword = preview_search.strip()
+                    filtered_table = filtered_table[
+                        filtered_table["款号"].astype(str).str.contains(keyword, case=False, regex=False)
+                        | filtered_table["客户"].astype(str).str.contains(keyword, case=False, regex=False)
+                    ]
+                st.caption("本顺序最晚结束：该款式的缝纫结束时间决定同一生产班组下一个生产顺序的开始时间")
+                st.dataframe(filtered_table, use_container_width=True, hide_index=True)
+
+            # 导出在后台任务中进行，生成期间可以继续操作页面
+            export_buttons = [
+                ("生成所有生产流程图", "timeline"),
+                ("生成部门时间线图", "department_plots"),
+                ("生成Excel报表", "excel"),
+                ("生成部门Excel报表", "department_excel"),
+            ]
+            for column, (button_label, export_type) in zip(st.columns(4), export_buttons):
+                with column:
+                    if st.button(button_label):
+                        # 根据用户选择决定是否重新排序
+                        styles_to_process = st.session_state["all_styles"]
+                        if enable_sequential_production:
+                            # 重新安排同一生产班组内款式的缝纫开始时间
+                            try:
+                                styles_to_process = sequence_styles(st.session_state["all_styles"], sequencing_method, st.session_state["rearrange_cache"], line_capacity)
+                            except ValueError as e:
+                                st.error(f"无法排产：{e}")
+                                styles_to_process = None
+                        if styles_to_process is not None:
+                            job = submit_export_job(st.session_state["current_user"], export_type, styles_to_process)
+                            if job["status"] == "done":
+                                st.success("款式没有变化，可直接下载已生成的文件")
+                            else:
+                                st.info("已提交导出任务")
+
+            render_export_jobs(st.session_state["current_user"])
+
+        # 调整生产流程：延误沿依赖图推迟所有部门中受影响的后续工序
+        if st.session_state["all_styles"]:
+            st.subheader("调整生产流程")
+
+            style_numbers = list(dict.fromkeys(style["style_number"] for style in st.session_state["all_styles"]))
+            adjust_style_number = st.selectbox("选择款号:", style_numbers, key="adjust_style_number")
+            style = next(s for s in st.session_state["all_styles"] if s["style_number"] == adjust_style_number)
+            # 已保存的手动调整会叠加在计算结果上
+            schedule = calculate_style_schedule(style)
+
+            # 选择部门和步骤
+            selected_dept = st.selectbox("选择部门:", list(schedule.keys()))
+            if selected_dept:
+                delayed_step = st.selectbox("选择延误的工序:", list(schedule[selected_dept].keys()))
+                new_end_date = st.date_input("选择新的完成时间:", min_value=datetime.today().date())
+                # 转换date为datetime
+                new_end_time = datetime.combine(new_end_date, datetime.min.time())
+
+                if st.button("调整生产时间"):
+                    set_schedule_override(style, selected_dept, delayed_step, new_end_time)
+                    adjusted = calculate_style_schedule(style)
+                    save_user_data(st.session_state["current_user"], {
+                        "all_styles": st.session_state["all_styles"]
+                    })
+                    moved = [f"{dept}-{step}" for dept, steps in adjusted.items() for step, info in steps.items()
+                             if info["时间点"] != schedule[dept][step]["时间点"]]
+                    if moved:
+                        st.info("已调整的工序：" + "、".join(moved))
+
+                    fig = plot_timeline(adjusted, style["process_type"], style["cycle"],
+                                        style_number=adjust_style_number,
+                                        production_group=style.get("production_group"))
+
+                    # Display the plot in Streamlit
+                    st.pyplot(fig)
+
+                    # Add download button for high-resolution image
+                    buf = io.BytesIO()
+                    fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+                    buf.seek(0)
+                    plt.close(fig)
+                    st.download_button(
+                        label="下载高分辨率图片",
+                        data=buf,
+                        file_name=f"{adjust_style_number}_{style['process_type']}.png",
+                        mime="image/png"
+                    )
 
-    # 显示当前添加的所有款号
-    if st.session_state["all_styles"]:
-        st.subheader("已添加的款号:")
-        
-        # 使用列表来显示所有款号，并提供删除按钮
-        for idx, style in enumerate(st.session_state["all_styles"]):
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                time_period = style.get("start_time_period", "上午")  # 默认为上午
-                production_order = style.get("production_order", "-")
-                st.write(f"{idx + 1}. 款号: {style['style_number']}, 工序: {style['process_type']}, " 
-                    f"缝纫开始日期: {style['sewing_start_date']} {time_period}, 周期: {style['cycle']}, "
-                    f"订单数量: {style.get('order_quantity', '-')}, 日产量: {style.get('daily_production', '-')}, "
-                    f"生产班组号: {style.get('production_group', '-')}, 生产顺序: {production_order}", f"客户: {style.get('company', '-')}")
-            with col2:
-                if st.button("删除", key=f"delete_{idx}"):
-                    st.session_state["all_styles"].pop(idx)
-                    # Auto-save after deleting style
+            if style.get("schedule_overrides"):
+                st.caption("已保存的调整：" + "、".join(
+                    f"{dept}-{step} {date}" for dept, steps in style["schedule_overrides"].items()
+                    for step, date in steps.items()))
+                if st.button("清除该款号的调整"):
+                    style.pop("schedule_overrides")
                     save_user_data(st.session_state["current_user"], {
                         "all_styles": st.session_state["all_styles"]
                     })
                     st.rerun()
-        
-        # 添加清空所有按钮
-        if st.button("清空所有款号"):
-            st.session_state["all_styles"] = []
-            # Auto-save after clearing styles
-            save_user_data(st.session_state["current_user"], {
-                "all_styles": st.session_state["all_styles"]
-            })
-            st.rerun()
 
-    # 添加是否启用连续排产的选项
-    if st.session_state["all_styles"]:
-        st.subheader("生成图表")
-
-        # 添加连续排产逻辑说明
-        with st.expander("📋 查看生产班组连续排产逻辑说明"):
-            st.markdown("""
-            ### 生产班组连续排产逻辑
-            
-            系统按以下规则处理同一生产班组内的款式排产:
-            
-            1. **同一生产顺序的款式**:
-               - 共享相同的缝纫开始日期和时段（上午/下午）
-               - 生产顺序为1的款式使用原始设定的开始日期
-               - 各自按其工序、订单数量和日产量计算结束时间
-            
-            2. **连续排产规则**:
-               - 系统会找出当前生产顺序组中结束时间最晚的款式
-               - 该款式的缝纫结束时间（及上午/下午时段）将作为下一个生产顺序组的开始时间
-               - 依此类推，形成连续排产
-               
-            3. **实际应用**:
-               - 生产顺序为1的款式可以手动指定开始日期
-               - 生产顺序为2、3...的款式会自动根据前一组的结束时间进行排产
-               - 相同生产顺序的款式将在同一天同一时段开始，可能在不同时间结束
-            """)
-        
-        enable_sequential_production = st.checkbox("启用生产班组连续排产功能", value=True, 
-                                            help="启用后，同一生产班组内，下一个生产顺序(production_order)的款式将从前一个生产顺序中最晚完成的款式结束时间开始")
-        
-        # 添加预览按钮
-        if enable_sequential_production and st.button("预览生产班组排产结果"):
-            # 重新安排同一生产班组内款式的缝纫开始时间
-            preview_styles = rearrange_styles_by_production_group(st.session_state["all_styles"])
-            
-            # 按生产班组分组显示排产结果
-            grouped_styles = {}
-            for style in preview_styles:
-                group = style.get("production_group", "无生产班组")
-                if group not in grouped_styles:
-                    grouped_styles[group] = []
-                grouped_styles[group].append(style)
-            
-            # 显示每个生产班组的排产结果
-            for group, styles in grouped_styles.items():
-                if group != "无生产班组":
-                    st.write(f"### 生产班组: {group}")
-                    
-                    # 按生产顺序进一步分组
-                    order_grouped_styles = {}
-                    for style in styles:
-                        order = style.get("production_order", 9999)
-                        if order not in order_grouped_styles:
-                            order_grouped_styles[order] = []
-                        order_grouped_styles[order].append(style)
-                    
-                    # 记录前一个顺序组的结束信息，用于显示连续关系
-                    prev_end_info = None
-                    
-                    # 按生产顺序排序
-                    for order in sorted(order_grouped_styles.keys()):
-                        order_styles = order_grouped_styles[order]
-                        
-                        # 如果不是第一个生产顺序，显示连续关系
-                        if prev_end_info:
-                            st.markdown(f"""
-                            <div style="text-align:center; padding: 10px; margin: 15px 0; background-color: #f0f2f6; border-radius: 5px;">
-                                ⬇️ <b>前一个生产顺序组最晚完成的款式 {prev_end_info['style']} 
-                                结束时间: {prev_end_info['date']} ({prev_end_info['remark']})</b>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        st.write(f"#### 生产顺序: {order}")
-                        
-                        # 创建数据表
-                        preview_data = []
-                        for style in order_styles:
-                            # 计算缝纫结束时间
-                            sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time())
-                            start_time_period = style.get("start_time_period", "上午")
-                            production_mode = style["production_mode"]
-                            if production_mode == '龙兵':
-                                schedule = calculate_schedule(
-                                    sewing_start_time, 
-                                    style["process_type"], 
-                                    style["cycle"], 
-                                    style["order_quantity"], 
-                                    style["daily_production"],
-                                    start_time_period
-                                )
-                            elif production_mode == '贝贝':
-                                schedule = calculate_schedule_beibei(
-                                        sewing_start_time, 
-                                        style["process_type"], 
-                                        style["cycle"], 
-                                        style["order_quantity"], 
-                                        style["daily_production"],
-                                        start_time_period
-                                    )
-                            elif production_mode == '补数':
-                                schedule = calculate_schedule_bushu(
-                                        sewing_start_time, 
-                                        style["process_type"], 
-                                        style["cycle"], 
-                                        style["order_quantity"], 
-                                        style["daily_production"],
-                                        start_time_period
-                                    )
-                            else:
-                                raise ValueError(f"Invalid production_mode: {production_mode}")
-                            
-                            sewing_end_time = schedule["缝纫"]["缝纫结束"]["时间点"]
-                            sewing_end_remark = schedule["缝纫"]["缝纫结束"].get("备注", "")
-                            
-                            preview_data.append({
-                                "款号": style["style_number"],
-                                "工序": style["process_type"],
-                                "缝纫开始日期": f"{style['sewing_start_date']} ({start_time_period})",
-                                "缝纫结束日期": f"{sewing_end_time.date()} ({sewing_end_remark})",
-                                "订单数量": style["order_quantity"],
-                                "日产量": style["daily_production"],
-                                "生产天数": round(style["order_quantity"] * 1.05 / style["daily_production"], 1),
-                                "客户": style["company"]
-                            })
-                        
-                        # 显示表格
-                        st.table(preview_data)
-                        
-                        # 如果这个组有多个款式，计算并显示组内最晚结束时间
-                        latest_end_time = None
-                        latest_end_remark = ""
-                        latest_style = None
-                        
-                        for style in order_styles:
-                            sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time())
-                            start_time_period = style.get("start_time_period", "上午")
-                            production_mode = style["production_mode"]
-                            if production_mode == '龙兵':
-                                schedule = calculate_schedule(
-                                    sewing_start_time, 
-                                    style["process_type"], 
-                                    style["cycle"], 
-                                    style["order_quantity"], 
-                                    style["daily_production"],
-                                    start_time_period
-                                )
-                            elif production_mode == '贝贝':
-                                schedule = calculate_schedule_beibei(
-                                        sewing_start_time, 
-                                        style["process_type"], 
-                                        style["cycle"], 
-                                        style["order_quantity"], 
-                                        style["daily_production"],
-                                        start_time_period
-                                    )
-                            elif production_mode == '补数':
-                                schedule = calculate_schedule_bushu(
-                                        sewing_start_time, 
-                                        style["process_type"], 
-                                        style["cycle"], 
-                                        style["order_quantity"], 
-                                        style["daily_production"],
-                                        start_time_period
-                                    )
-                            else:
-                                raise ValueError(f"Invalid production_mode: {production_mode}")
-                        
-                            
-                            end_time = schedule["缝纫"]["缝纫结束"]["时间点"]
-                            end_remark = schedule["缝纫"]["缝纫结束"].get("备注", "")
-                            
-                            if latest_end_time is None or end_time > latest_end_time:
-                                latest_end_time = end_time
-                                latest_end_remark = end_remark
-                                latest_style = style["style_number"]
-                        
-                        # 更新前一个顺序组的结束信息，用于下一个顺序组的显示
-                        prev_end_info = {
-                            "style": latest_style,
-                            "date": latest_end_time.date(),
-                            "remark": latest_end_remark
-                        }
-                        
-                        if len(order_styles) > 1:
-                            st.info(f"⚠️ 注意：该生产顺序组中，款号 **{latest_style}** 的缝纫结束时间最晚：**{latest_end_time.date()} ({latest_end_remark})**，下一个生产顺序组将从此时间开始。")
-            
-            # 显示无生产班组的款式
-            if "无生产班组" in grouped_styles and grouped_styles["无生产班组"]:
-                st.write("### 无生产班组的款式")
-                no_group_data = []
-                for style in grouped_styles["无生产班组"]:
-                    no_group_data.append({
-                        "生产顺序": style.get("production_order", "-"),
-                        "款号": style["style_number"],
-                        "工序": style["process_type"],
-                        "缝纫开始日期": f"{style['sewing_start_date']} ({style.get('start_time_period', '上午')})",
-                        "周期": style["cycle"],
-                        "订单数量": style["order_quantity"],
-                        "日产量": style["daily_production"]
-                    })
-                st.table(no_group_data)
-                
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            if st.button("生成所有生产流程图"):
-                # 根据用户选择决定是否重新排序
-                if enable_sequential_production:
-                    # 重新安排同一生产班组内款式的缝纫开始时间
-                    styles_to_process = rearrange_styles_by_production_group(st.session_state["all_styles"])
+            # 批量导入各部门的实际完成日期，一次性传播所有延误
+            st.markdown("**批量导入实际完成日期**")
+            delay_file = st.file_uploader("上传实际完成日期表 (必需列：款号、部门、工序、实际完成日期；款号重复时需要生产班组列)",
+                                          type=['xlsx', 'xls'], key="delay_file")
+            if delay_file is not None:
+                try:
+                    delays, unmatched = parse_delay_sheet(pd.read_excel(delay_file), st.session_state["all_styles"])
+                except Exception as e:
+                    st.error(f"读取实际完成日期文件时出错：{str(e)}")
                 else:
-                    styles_to_process = st.session_state["all_styles"]
-                    
-                # 创建一个临时目录来存储图片
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    # 生成所有图表
-                    for style in styles_to_process:
-                        sewing_start_time = datetime.combine(style["sewing_start_date"], datetime.min.time())
-                        start_time_period = style.get("start_time_period", "上午")  # 获取上午/下午信息
-                        production_mode = style["production_mode"]
-                        if production_mode == '龙兵':
-                            schedule = calculate_schedule(
-                                sewing_start_time, 
-                                style["process_type"], 
-                                style["cycle"], 
-                                style["order_quantity"], 
-                                style["daily_production"],
-                                start_time_period
-                            )
-                        elif production_mode == '贝贝':
-                            schedule = calculate_schedule_beibei(
-                                    sewing_start_time, 
-                                    style["process_type"], 
-                                    style["cycle"], 
-                                    style["order_quantity"], 
-                                    style["daily_production"],
-                                    start_time_period
-                                )
-                        elif production_mode == '补数':
-                            schedule = calculate_schedule_bushu(
-                                    sewing_start_time, 
-                                    style["process_type"], 
-                                    style["cycle"], 
-                                    style["order_quantity"], 
-                                    style["daily_production"],
-                                    start_time_period
-                                )
-                        else:
-                            raise ValueError(f"Invalid production_mode: {production_mode}")
-                            
-                        # 设置当前款号和生产班组用于标题显示
-                        st.session_state["style_number"] = style["style_number"]
-                        st.session_state["production_group"] = style.get("production_group", "")
-                        fig = plot_timeline(schedule, style["process_type"], style["cycle"])
-                        
-                        # 保存图片 - 简化文件名
-                        production_group = style.get("production_group", "")
-                        # Include production group in filename if available
-                        if production_group:
-                            filename = f"{style['style_number']}_{production_group}_{style['process_type']}.png"
-                        else:
-                            filename = f"{style['style_number']}_{style['process_type']}.png"
-                        filepath = os.path.join(temp_dir, filename)
-                        fig.savefig(filepath, dpi=300, bbox_inches='tight')
-                        plt.close(fig)
-                    
-                    # 创建ZIP文件
-                    zip_path = os.path.join(temp_dir, "生产流程时间表.zip")
-                    with zipfile.ZipFile(zip_path, 'w') as zipf:
-                        for file in os.listdir(temp_dir):
-                            if file.endswith('.png'):
-                                zipf.write(os.path.join(temp_dir, file), file)
-                    
-                    # 提供ZIP文件下载
-                    with open(zip_path, "rb") as f:
-                        st.download_button(
-                            label="下载所有图片(ZIP)",
-                            data=f,
-                            file_name="生产流程时间表.zip",
-                            mime="application/zip"
-                        )
-        
-        with col2:
-            if st.button("生成部门时间线图"):
-                # 根据用户选择决定是否重新排序
-                if enable_sequential_production:
-                    # 重新安排同一生产班组内款式的缝纫开始时间
-                    styles_to_process = rearrange_styles_by_production_group(st.session_state["all_styles"])
-                else:
-                    styles_to_process = st.session_state["all_styles"]
-                # 生成部门时间线图
-                #zip_path = generate_department_wise_plots(st.session_state["all_styles"])
-                zip_path = generate_department_wise_plots(styles_to_process)
-                # 提供ZIP文件下载
-                with open(zip_path, "rb") as f:
+                    if unmatched:
+                        st.warning(f"{len(unmatched)} 行无法匹配到款号或工序，已跳过")
+                        st.dataframe(pd.DataFrame(unmatched), use_container_width=True)
+                    if delays and st.button("应用实际完成日期"):
+                        results = apply_style_delays(st.session_state["all_styles"], delays, get_factory_calendar())
+                        # 实际完成日期作为手动调整随款式保存
+                        styles_by_identity = {}
+                        for existing_style in st.session_state["all_styles"]:
+                            styles_by_identity.setdefault(style_identity(existing_style), existing_style)
+                        for delay in delays:
+                            set_schedule_override(styles_by_identity[(delay["style_number"], delay["production_group"])],
+                                                  delay["department"], delay["step"], delay["new_time"])
+                        save_user_data(st.session_state["current_user"], {
+                            "all_styles": st.session_state["all_styles"]
+                        })
+                        st.session_state["delay_affected_styles"] = list(results)
+                        changed_count = sum(1 for schedule, moved in results.values() if moved)
+                        st.success(f"已应用 {len(delays)} 条实际完成日期，{changed_count} 个款号的排产发生变化")
+
+            # 只重新生成受影响款号的报表
+            affected_identities = set(st.session_state["delay_affected_styles"])
+            if affected_identities and st.button("生成受影响款号的报表"):
+                affected_styles = [style for style in st.session_state["all_styles"]
+                                   if style_identity(style) in affected_identities]
+                with generate_excel_report(affected_styles) as buffer:
                     st.download_button(
-                        label="下载部门时间线图(ZIP)",
-                        data=f,
-                        file_name="部门时间线图.zip",
-                        mime="application/zip"
+                        label="下载受影响款号的Excel报表",
+                        data=buffer.read(),
+                        file_name="调整后生产计划报表.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                     )
-        # with col3:
-        #     if st.button("生成Excel报表"):
-        #         # 根据用户选择决定是否重新排序
-        #         if enable_sequential_production:
-        #             # 重新安排同一生产班组内款式的缝纫开始时间
-        #             styles_to_process = rearrange_styles_by_production_group(st.session_state["all_styles"])
-        #         else:
-        #             styles_to_process = st.session_state["all_styles"]
-                
-        #         # 生成Excel报表
-        #         excel_path = generate_excel_report(styles_to_process)
-                
-        #         # 提供Excel文件下载
-        #         with open(excel_path, "rb") as f:
-        #             st.download_button(
-        #                 label="下载Excel报表",
-        #                 data=f,
-        #                 file_name="生产计划报表.xlsx",
-        #                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        #             )
-        with col3:
-            if st.button("生成Excel报表"):
-                # 根据用户选择决定是否重新排序
-                if enable_sequential_production:
-                    # 重新安排同一生产班组内款式的缝纫开始时间
-                    styles_to_process = rearrange_styles_by_production_group(st.session_state["all_styles"])
-                else:
-                    styles_to_process = st.session_state["all_styles"]
-                
-                # 生成Excel报表
-                excel_path = generate_excel_report(styles_to_process)
-                
-                # 提供Excel文件下载
-                with open(excel_path, "rb") as f:
-                        st.download_button(
-                            label="下载Excel报表",
-                            data=f,
-                            file_name="生产计划报表.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-        
-        with col4:
-            if st.button("生成部门Excel报表"):
-                # 根据用户选择决定是否重新排序
-                if enable_sequential_production:
-                    # 重新安排同一生产班组内款式的缝纫开始时间
-                    styles_to_process = rearrange_styles_by_production_group(st.session_state["all_styles"])
-                else:
-                    styles_to_process = st.session_state["all_styles"]
-                
-                # 生成部门Excel报表
-                excel_path = generate_department_wise_excel(styles_to_process)
-                
-                # 提供Excel文件下载
-                with open(excel_path, "rb") as f:
+                with generate_timeline_zip(affected_styles) as buffer:
                     st.download_button(
-                        label="下载部门Excel报表（ZIP文件）",
-                        data=f,
-                        file_name="部门生产计划报表.zip",
+                        label="下载受影响款号的流程图(ZIP)",
+                        data=buffer.read(),
+                        file_name="调整后生产流程时间表.zip",
                         mime="application/zip"
                     )
 
-    # 调整生产流程部分保持不变
-    if "schedule" in st.session_state:
-        st.subheader("调整生产流程")
-        
-        # 选择部门和步骤
-        selected_dept = st.selectbox("选择部门:", list(st.session_state["schedule"].keys()))
-        if selected_dept:
-            delayed_step = st.selectbox("选择延误的工序:", list(st.session_state["schedule"][selected_dept].keys()))
-            new_end_date = st.date_input("选择新的完成时间:", min_value=datetime.today().date())
-            # 转换date为datetime
-            new_end_time = datetime.combine(new_end_date, datetime.min.time())
-            
-            if st.button("调整生产时间"):
-                st.session_state["schedule"] = adjust_schedule(
-                    st.session_state["schedule"],
-                    selected_dept,
-                    delayed_step,
-                    new_end_time
-                )
-                fig = plot_timeline(st.session_state["schedule"], selected_process, cycle)
-                
-                # Display the plot in Streamlit
-                st.pyplot(fig)
-                
-                # Add download button for high-resolution image
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-                buf.seek(0)
-                st.download_button(
-                    label="下载高分辨率图片",
-                    data=buf,
-                    file_name=f"{style_number}_{selected_process}.png",
-                    mime="image/png"
-                )
+    flush_perf_log()
+
+
+if __name__ == "__main__":
+    main()
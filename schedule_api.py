@@ -0,0 +1,308 @@
+"""
+本地排产 HTTP/JSON 接口，供 ERP 等内部系统批量查询
+
+与排产引擎在同一进程中运行，一次请求可以提交任意数量的款式，按依赖图批量计算；
+计算结果按款式内容缓存在进程内（工厂日历变化后自动失效），所有连接共用。
+使用 HTTP/1.1 长连接，客户端可以在同一连接上连续发送请求。
+
+接口:
+    GET  /health
+    POST /schedules
+        {"styles": [...], "detail": "full" | "sewing", "sequencing": "按生产顺序衔接", "line_capacity": 1}
+        款式字段可以使用上传表格的列名（款号、缝纫开始日期、缝纫开始时间、工序、确认用时、订单数量、
+        日产量、排产模式，可选 生产班组、生产顺序、客户、交期），也可以使用对应的英文字段名
+        （见 production_test.STYLE_COLUMNS），可附带 schedule_overrides（{部门: {工序: "YYYY-MM-DD"}}）；
+        校验与页面上传相同，任何一个款式有错误时整个请求返回 400 和错误列表。
+        line_capacity 为正整数；请求格式错误返回 400，服务端异常返回 500，错误响应均为 {"error": ...}。
+        默认返回紧凑 JSON:
+            {"schedules": [{"style_number": ..., "sewing_end": ..., "milestones": [[部门, 工序, 时间点, 备注], ...]}]}
+        detail=sewing 时只返回缝纫开始/结束；请求头 Accept: application/vnd.apache.arrow.stream
+        或 ?format=arrow 时返回 Arrow IPC 流（每个工序一行，需要 pyarrow）
+
+用法:
+    python schedule_api.py
+    python schedule_api.py --host 0.0.0.0 --port 8765 --cache-size 50000
+"""
+import os
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import argparse
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import production_test as engine
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+DEFAULT_CACHE_SIZE = 20000
+# 上传表格中与排产无关、接口请求可以省略的列及其默认值
+OPTIONAL_COLUMNS = {'生产班组': "", '生产顺序': 1, '客户': ""}
+FIELD_COLUMNS = {field: column for column, field in engine.STYLE_COLUMNS.items()}
+FIELD_COLUMNS["delivery_date"] = '交期'
+
+# 按款式内容缓存的排产结果：{摘要: 排产结果}，超过容量时删除最久未使用的结果
+_SCHEDULE_CACHE = OrderedDict()
+_SCHEDULE_CACHE_LOCK = threading.Lock()
+_SCHEDULE_CACHE_STATE = {"calendar": None, "max_size": DEFAULT_CACHE_SIZE}
+
+
+def _invalid_overrides_reason(overrides):
+    """检查手动调整的格式 {部门: {工序: "YYYY-MM-DD"}}，格式正确时返回 None"""
+    if not isinstance(overrides, dict):
+        return "schedule_overrides must be an object of {department: {step: \"YYYY-MM-DD\"}}"
+    for dept, steps in overrides.items():
+        if not isinstance(steps, dict):
+            return f"schedule_overrides[{dept!r}] must be an object of {{step: \"YYYY-MM-DD\"}}"
+        for step, value in steps.items():
+            try:
+                if not isinstance(value, str):
+                    raise ValueError
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return f"schedule_overrides[{dept!r}][{step!r}] must be a date in YYYY-MM-DD format"
+    return None
+
+
+def parse_styles(rows):
+    """把请求中的款式转为排产用的款式列表，返回 (款式列表, 错误列表)，错误中的 index 为款式在请求中的下标"""
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("styles must be a list of objects")
+    if not rows:
+        return [], []
+    records = [{FIELD_COLUMNS.get(key, key): value for key, value in row.items()} for row in rows]
+    df = pd.DataFrame.from_records(records)
+    for column, default in OPTIONAL_COLUMNS.items():
+        df[column] = df[column].fillna(default) if column in df.columns else default
+    styles, errors = engine.build_styles_from_dataframe(df)
+    errors = [{"index": error["行号"] - 2, "style_number": error["款号"], "reason": error["原因"]} for error in errors]
+    for index, row in enumerate(rows):
+        reason = _invalid_overrides_reason(row["schedule_overrides"]) if row.get("schedule_overrides") else None
+        if reason:
+            errors.append({"index": index, "style_number": row.get("style_number", row.get('款号', "")), "reason": reason})
+    errors.sort(key=lambda error: error["index"])
+    if not errors:
+        for style, row in zip(styles, rows):
+            if row.get("schedule_overrides"):
+                style["schedule_overrides"] = row["schedule_overrides"]
+    return styles, errors
+
+
+def _style_key(style):
+    return hashlib.sha1(json.dumps(style, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).digest()
+
+
+def cached_style_schedules(styles):
+    """批量计算排产结果，已缓存的款式直接使用缓存，其余款式一起批量计算；返回 (排产结果列表, 命中数)"""
+    calendar = engine.get_factory_calendar()
+    keys = [_style_key(style) for style in styles]
+    results = [None] * len(styles)
+    with _SCHEDULE_CACHE_LOCK:
+        # get_factory_calendar 在日历文件修改后才返回新的对象
+        if calendar is not _SCHEDULE_CACHE_STATE["calendar"]:
+            _SCHEDULE_CACHE.clear()
+            _SCHEDULE_CACHE_STATE["calendar"] = calendar
+        for index, key in enumerate(keys):
+            schedule = _SCHEDULE_CACHE.get(key)
+            if schedule is not None:
+                _SCHEDULE_CACHE.move_to_end(key)
+                results[index] = schedule
+    missing = [index for index, schedule in enumerate(results) if schedule is None]
+    computed = engine.calculate_style_schedules([styles[index] for index in missing], calendar)
+    with _SCHEDULE_CACHE_LOCK:
+        for index, schedule in zip(missing, computed):
+            results[index] = schedule
+            _SCHEDULE_CACHE[keys[index]] = schedule
+        while len(_SCHEDULE_CACHE) > _SCHEDULE_CACHE_STATE["max_size"]:
+            _SCHEDULE_CACHE.popitem(last=False)
+    return results, len(styles) - len(missing)
+
+
+def _format_time(value):
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="minutes")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def schedule_rows(styles, schedules, detail):
+    """把排产结果展开为 (款号, 部门, 工序, 时间点, 备注) 行"""
+    for style, schedule in zip(styles, schedules):
+        for dept, steps in schedule.items():
+            if detail == "sewing" and dept != "缝纫":
+                continue
+            for step, info in steps.items():
+                yield style["style_number"], dept, step, info["时间点"], info.get("备注", "")
+
+
+def encode_json(styles, schedules, detail):
+    """紧凑 JSON：每个款式一项，工序按 [部门, 工序, 时间点, 备注] 数组列出"""
+    items = []
+    for style, schedule in zip(styles, schedules):
+        sewing_end = schedule["缝纫"]["缝纫结束"]
+        item = {
+            "style_number": style["style_number"],
+            "sewing_start": _format_time(schedule["缝纫"]["缝纫开始"]["时间点"]),
+            "sewing_end": _format_time(sewing_end["时间点"]),
+            "sewing_end_period": sewing_end.get("备注", ""),
+        }
+        if detail != "sewing":
+            item["milestones"] = [[dept, step, _format_time(info["时间点"]), info.get("备注", "")]
+                                  for dept, steps in schedule.items() for step, info in steps.items()]
+        items.append(item)
+    # NaN 不是合法的 JSON，出现时按服务端错误处理，不返回无法解析的响应
+    return json.dumps({"schedules": items}, ensure_ascii=False, separators=(",", ":"),
+                      allow_nan=False).encode('utf-8')
+
+
+def encode_arrow(styles, schedules, detail):
+    """Arrow IPC 流：每个工序一行"""
+    import pyarrow as pa
+
+    columns = list(zip(*schedule_rows(styles, schedules, detail))) or [()] * 5
+    types = [pa.string(), pa.string(), pa.string(), pa.timestamp("s"), pa.string()]
+    names = ["style_number", "department", "step", "time", "remark"]
+    table = pa.table({name: pa.array(column, type) for name, column, type in zip(names, columns, types)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+class ScheduleRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 默认保持连接，每个响应都带 Content-Length
+    protocol_version = "HTTP/1.1"
+    server_version = "ScheduleAPI/1.0"
+
+    def log_message(self, format, *args):
+        # 访问日志由性能日志代替
+        pass
+
+    def send_body(self, status, body, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, errors=None):
+        payload = {"error": message}
+        if errors:
+            payload["errors"] = errors
+        self.send_body(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    def handle_safely(self, handler):
+        """执行请求处理，未预料的异常返回 500 JSON 并关闭连接，不让服务线程带着异常退出"""
+        try:
+            handler()
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            self.close_connection = True
+            # 响应可能已经发出一部分或连接已断开，此时只能关闭连接
+            try:
+                self.send_error_json(500, "Internal server error")
+            except OSError:
+                pass
+
+    def do_GET(self):
+        self.handle_safely(self.handle_get)
+
+    def do_POST(self):
+        self.handle_safely(self.handle_post)
+
+    def handle_get(self):
+        if urlparse(self.path).path == "/health":
+            self.send_body(200, b'{"status":"ok"}')
+        else:
+            self.send_error_json(404, "Not found")
+
+    def handle_post(self):
+        url = urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            # 无法确定请求体的长度，连接不能继续使用
+            self.close_connection = True
+            self.send_error_json(400, "Invalid Content-Length")
+            return
+        # 先读完请求体，出错时连接仍然可以继续使用
+        body = self.rfile.read(length)
+        if url.path != "/schedules":
+            self.send_error_json(404, "Not found")
+            return
+        started = time.perf_counter()
+        engine.PERF_CONTEXT.user = "api"
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request body must be a JSON object")
+            detail = request.get("detail", "full")
+            if detail not in ("full", "sewing"):
+                raise ValueError(f"Invalid detail: {detail}")
+            line_capacity = request.get("line_capacity", 1)
+            if isinstance(line_capacity, bool) or not isinstance(line_capacity, int) or line_capacity < 1:
+                raise ValueError(f"line_capacity must be a positive integer: {line_capacity!r}")
+            styles, errors = parse_styles(request.get("styles", []))
+            if errors:
+                self.send_error_json(400, f"{len(errors)} invalid styles", errors)
+                return
+            if request.get("sequencing"):
+                styles = engine.sequence_styles(styles, request["sequencing"], line_capacity=line_capacity)
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+
+        use_arrow = (parse_qs(url.query).get("format") == ["arrow"]
+                     or ARROW_MIME in self.headers.get("Accept", ""))
+        schedules, hits = cached_style_schedules(styles)
+        if use_arrow:
+            try:
+                response = encode_arrow(styles, schedules, detail)
+            except ImportError:
+                self.send_error_json(406, "Arrow output requires pyarrow")
+                return
+            self.send_body(200, response, ARROW_MIME)
+        else:
+            self.send_body(200, encode_json(styles, schedules, detail))
+        engine.record_perf_timing("api_schedules", time.perf_counter() - started,
+                                  styles=len(styles), cache_hits=hits, format="arrow" if use_arrow else "json")
+        engine.flush_perf_log()
+
+
+def serve(host, port, cache_size=DEFAULT_CACHE_SIZE):
+    _SCHEDULE_CACHE_STATE["max_size"] = cache_size
+    server = ThreadingHTTPServer((host, port), ScheduleRequestHandler)
+    server.daemon_threads = True
+    print(f"排产接口已启动: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地排产 HTTP/JSON 接口")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只允许本机访问")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="缓存的款式排产结果数量上限")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.cache_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+测试在临时目录中导入 production_test，user_data（账号数据、导出缓存、性能日志）不会写入仓库目录
+"""
+import atexit
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+_WORK_DIR = tempfile.mkdtemp(prefix="production_test_")
+os.chdir(_WORK_DIR)
+atexit.register(shutil.rmtree, _WORK_DIR, True)
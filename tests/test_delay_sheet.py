@@ -0,0 +1,38 @@
+"""实际完成日期表与款式的匹配"""
+from datetime import date, datetime
+
+import pandas as pd
+
+import production_test as engine
+
+
+def make_style(style_number, production_group):
+    return {
+        "style_number": style_number,
+        "sewing_start_date": date(2025, 3, 3),
+        "start_time_period": "上午",
+        "process_type": "满花",
+        "cycle": 14,
+        "order_quantity": 1000,
+        "daily_production": 100,
+        "production_group": production_group,
+        "production_order": 1,
+        "company": "客户A",
+        "production_mode": "龙兵",
+    }
+
+
+def test_numeric_group_column_with_blanks_matches_text_group():
+    styles = [make_style("1001", "1"), make_style("1001", "2")]
+    # 有空单元格的数字列被读成小数：1001.0、1.0
+    df = pd.DataFrame({
+        "款号": [1001.0, 1001.0],
+        "部门": ["缝纫", "缝纫"],
+        "工序": ["缝纫结束", "缝纫结束"],
+        "实际完成日期": ["2025-04-01", "2025-04-02"],
+        "生产班组": [1.0, None],
+    })
+    delays, unmatched = engine.parse_delay_sheet(df, styles)
+    assert [(delay["style_number"], delay["production_group"]) for delay in delays] == [("1001", "1")]
+    assert delays[0]["new_time"] == datetime(2025, 4, 1)
+    assert [(row["行号"], row["原因"]) for row in unmatched] == [(3, "款号重复，请填写生产班组区分")]
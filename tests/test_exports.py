@@ -0,0 +1,68 @@
+"""导出：缓存的图片在读取前被清理时重新绘制，后台导出任务按账号排队"""
+import threading
+import time
+import zipfile
+from datetime import date
+
+import matplotlib.pyplot as plt
+
+import production_test as engine
+
+STYLE = {
+    "style_number": "S1",
+    "sewing_start_date": date(2025, 3, 3),
+    "start_time_period": "上午",
+    "process_type": "满花",
+    "cycle": 14,
+    "order_quantity": 1000,
+    "daily_production": 100,
+    "production_group": "A1",
+    "production_order": 1,
+    "company": "客户A",
+    "production_mode": "龙兵",
+}
+
+
+def test_timeline_zip_redraws_image_evicted_by_another_process(monkeypatch, tmp_path):
+    # 模拟另一个进程在 export_cache_get 之后删除了缓存的图片
+    monkeypatch.setattr(engine, "export_cache_get", lambda key, suffix: tmp_path / f"{key}{suffix}")
+    with engine.generate_timeline_zip([dict(STYLE)]) as buffer:
+        with zipfile.ZipFile(buffer) as zipf:
+            assert zipf.namelist() == ["S1_A1_满花.png"]
+            assert zipf.read("S1_A1_满花.png").startswith(b"\x89PNG")
+    assert plt.get_fignums() == []
+
+
+def test_export_jobs_queue_per_account(monkeypatch):
+    release = threading.Event()
+    started = []
+    finished = threading.Event()
+
+    def fake_run(job_dir, job, styles):
+        started.append(job["user_id"])
+        if job["user_id"] == "slow":
+            release.wait(10)
+        with engine._EXPORT_JOBS_LOCK:
+            engine._ACTIVE_EXPORT_JOBS.discard(str(job_dir))
+        if job["user_id"] == "other":
+            finished.set()
+
+    monkeypatch.setattr(engine, "_run_export_job", fake_run)
+    monkeypatch.setattr(engine, "export_cache_get", lambda key, suffix: None)
+    first = engine.submit_export_job("slow", "excel", [dict(STYLE)])
+    second = engine.submit_export_job("slow", "excel", [dict(STYLE, style_number="S2")])
+    engine.submit_export_job("other", "excel", [dict(STYLE)])
+    # 另一个账号的任务不用等待 slow 账号的大导出
+    assert finished.wait(10)
+    assert started.count("slow") == 1
+    positions = {job["id"]: job.get("queue_position") for job in engine.list_export_jobs("slow")}
+    assert positions[second["id"]] == 1
+    release.set()
+    for _ in range(100):
+        if not engine._EXPORT_ACCOUNT_QUEUES:
+            break
+        time.sleep(0.05)
+    assert started.count("slow") == 2
+    assert engine._EXPORT_ACCOUNT_QUEUES == {}
+    assert first["id"] != second["id"]
+    assert engine._ACTIVE_EXPORT_JOBS == set()
@@ -0,0 +1,122 @@
+"""排产接口：JSON/Arrow 输出、请求错误和长连接复用"""
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import schedule_api
+
+STYLE = {
+    "款号": "A1",
+    "缝纫开始日期": "2025-03-03",
+    "缝纫开始时间": "上午",
+    "工序": "满花",
+    "确认用时": 14,
+    "订单数量": 1000,
+    "日产量": 100,
+    "排产模式": "龙兵",
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), schedule_api.ScheduleRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def connection(server):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=30)
+    yield connection
+    connection.close()
+
+
+def post(connection, payload, path="/schedules", headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    connection.request("POST", path, body, {"Content-Type": "application/json", **(headers or {})})
+    response = connection.getresponse()
+    return response, response.read()
+
+
+def test_json_response(connection):
+    response, body = post(connection, {"styles": [STYLE], "detail": "sewing"})
+    assert response.status == 200
+    schedules = json.loads(body)["schedules"]
+    assert [item["style_number"] for item in schedules] == ["A1"]
+    assert schedules[0]["sewing_start"].startswith("2025-03-03")
+    assert "milestones" not in schedules[0]
+
+
+def test_valid_overrides_are_applied(connection):
+    style = dict(STYLE, schedule_overrides={"缝纫": {"缝纫结束": "2025-04-30"}})
+    response, body = post(connection, {"styles": [style], "detail": "sewing"})
+    assert response.status == 200
+    assert json.loads(body)["schedules"][0]["sewing_end"].startswith("2025-04-30")
+
+
+def test_arrow_response(connection):
+    pa = pytest.importorskip("pyarrow")
+    response, body = post(connection, {"styles": [STYLE]}, headers={"Accept": schedule_api.ARROW_MIME})
+    assert response.status == 200
+    assert response.getheader("Content-Type") == schedule_api.ARROW_MIME
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.column_names == ["style_number", "department", "step", "time", "remark"]
+    assert set(table.column("style_number").to_pylist()) == {"A1"}
+
+
+@pytest.mark.parametrize("payload", [
+    {"styles": [dict(STYLE, schedule_overrides={"缝纫": {"缝纫结束": "03/20/2025"}})]},
+    {"styles": [dict(STYLE, schedule_overrides={"缝纫": "2025-03-20"})]},
+    {"styles": [STYLE], "sequencing": "按生产顺序衔接", "line_capacity": 0},
+    {"styles": [STYLE], "sequencing": "按生产顺序衔接", "line_capacity": "2"},
+    {"styles": [dict(STYLE, 确认用时="abc")]},
+    {"styles": [dict(STYLE, 款号=None)]},
+    {"styles": [dict(STYLE, 款号="  ")]},
+    {"styles": {}},
+])
+def test_invalid_request_returns_400(connection, payload):
+    response, body = post(connection, payload)
+    assert response.status == 400
+    assert "error" in json.loads(body)
+
+
+def test_invalid_content_length_returns_400(connection):
+    connection.putrequest("POST", "/schedules")
+    connection.putheader("Content-Length", "abc")
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400
+    assert json.loads(response.read())["error"] == "Invalid Content-Length"
+
+
+def test_unexpected_error_returns_500(connection, monkeypatch):
+    def fail(styles):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(schedule_api, "cached_style_schedules", fail)
+    response, body = post(connection, {"styles": [STYLE]})
+    assert response.status == 500
+    assert json.loads(body) == {"error": "Internal server error"}
+
+
+def test_connection_is_reused(connection):
+    post(connection, {"styles": [STYLE]})
+    sock = connection.sock
+    assert sock is not None
+    # 错误响应之后连接仍然可以继续使用
+    response, _ = post(connection, {"styles": [STYLE], "detail": "bad"})
+    assert response.status == 400
+    response, body = post(connection, {"styles": [STYLE], "detail": "sewing"})
+    assert response.status == 200
+    assert connection.sock is sock
+    connection.request("GET", "/health")
+    response = connection.getresponse()
+    assert json.loads(response.read()) == {"status": "ok"}
+    assert connection.sock is sock
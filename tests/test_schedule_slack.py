@@ -0,0 +1,45 @@
+"""工序浮动时间与关键路径"""
+from datetime import date
+
+import production_test as engine
+
+
+def all_combinations():
+    styles = []
+    for mode in ("龙兵", "贝贝", "补数"):
+        for process_type in engine.get_process_type_options(mode):
+            for cycle in engine.get_cycle_options(mode):
+                styles.append({
+                    "style_number": f"{mode}-{process_type}-{cycle}",
+                    "sewing_start_date": date(2025, 3, 3),
+                    "start_time_period": "上午",
+                    "process_type": process_type,
+                    "cycle": cycle,
+                    "order_quantity": 1000,
+                    "daily_production": 100,
+                    "production_group": "A1",
+                    "production_order": 1,
+                    "company": "客户A",
+                    "production_mode": mode,
+                })
+    return styles
+
+
+def test_critical_path_has_no_slack():
+    styles = all_combinations()
+    results = engine.calculate_schedule_slack(styles)
+    assert len(results) == len(styles)
+    for style, result in zip(styles, results):
+        assert result["critical_path"], style["style_number"]
+        assert all(slack >= 0 for slack in result["slack"].values()), style["style_number"]
+        on_path = {step: result["slack"][step] for step in result["critical_path"]}
+        assert set(on_path.values()) == {0}, (style["style_number"], on_path)
+
+
+def test_critical_path_ends_at_last_step():
+    style = all_combinations()[0]
+    result = engine.calculate_schedule_slack([style])[0]
+    schedule = engine.calculate_style_schedule(style)
+    last_time = max(info["时间点"] for steps in schedule.values() for info in steps.values())
+    dept, step = result["critical_path"][-1]
+    assert schedule[dept][step]["时间点"] == last_time
@@ -0,0 +1,80 @@
+"""生产班组连续排产与手动调整的衔接"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import production_test as engine
+
+
+def make_style(style_number, order, sewing_start_date=date(2025, 3, 3)):
+    return {
+        "style_number": style_number,
+        "sewing_start_date": sewing_start_date,
+        "start_time_period": "上午",
+        "process_type": "满花",
+        "cycle": 14,
+        "order_quantity": 1000,
+        "daily_production": 100,
+        "production_group": "A1",
+        "production_order": order,
+        "company": "客户A",
+        "production_mode": "龙兵",
+    }
+
+
+def sewing_end(style):
+    return engine.calculate_style_schedule(style)["缝纫"]["缝纫结束"]["时间点"]
+
+
+def test_override_on_first_tier_moves_second_tier():
+    first, second = make_style("S1", 1), make_style("S2", 2)
+    styles = [first, second]
+    cache = engine.new_rearrange_cache()
+    engine.rearrange_styles_by_production_group(styles, cache)
+    assert second["sewing_start_date"] == sewing_end(first).date()
+
+    delayed_end = sewing_end(first) + timedelta(days=10)
+    engine.set_schedule_override(first, "缝纫", "缝纫结束", delayed_end)
+    # 使用同一个增量缓存：调整必须使第一个生产顺序组的缓存失效
+    engine.rearrange_styles_by_production_group(styles, cache)
+    assert sewing_end(first) == datetime.combine(delayed_end.date(), datetime.min.time())
+    assert second["sewing_start_date"] == delayed_end.date()
+
+
+def test_override_holds_production_line_in_capacity_scheduling():
+    first, second = make_style("S1", 1), make_style("S2", 2)
+    natural_end = sewing_end(first)
+    engine.set_schedule_override(first, "缝纫", "缝纫结束", natural_end + timedelta(days=5))
+    _, placed_second = engine.schedule_production_lines([first, second], line_capacity=1)
+    assert placed_second["style_number"] == "S2"
+    assert placed_second["sewing_start_date"] >= (natural_end + timedelta(days=5)).date()
+
+
+def test_capacity_scheduling_keeps_requested_starts():
+    first, second = make_style("S1", 1), make_style("S2", 2)
+    placed = engine.schedule_production_lines([first, second], line_capacity=1)
+    assert placed[1]["sewing_start_date"] > date(2025, 3, 3)
+    # 传入的款式不被修改，不保存产线号
+    assert second["sewing_start_date"] == date(2025, 3, 3)
+    assert "production_line" not in first and "production_line" not in second
+    # 删除占用产线的款式后，后面的款式回到自身的开始时间
+    placed = engine.schedule_production_lines([second], line_capacity=1)
+    assert placed[0]["sewing_start_date"] == date(2025, 3, 3)
+
+
+
+def test_preview_flags_the_style_that_chains_the_next_tier():
+    early, late, next_tier = make_style("S1", 1), make_style("S2", 1), make_style("S3", 2)
+    # S1 本来结束较早，调整后成为该组最晚结束的款式
+    engine.set_schedule_override(early, "缝纫", "缝纫结束", sewing_end(late) + timedelta(days=3))
+    preview = engine.build_sequencing_preview([early, late, next_tier])
+    flagged = preview.loc[preview["生产顺序"] == 1].set_index("款号")["本顺序最晚结束"]
+    assert flagged.to_dict() == {"S1": True, "S2": False}
+    assert next_tier["sewing_start_date"] == (sewing_end(late) + timedelta(days=3)).date()
+
+
+def test_capacity_scheduling_rejects_override_ending_before_start():
+    first, second = make_style("S1", 1), make_style("S2", 2)
+    engine.set_schedule_override(first, "缝纫", "缝纫结束", datetime(2025, 2, 20))
+    with pytest.raises(ValueError, match="S1"):
+        engine.schedule_production_lines([first, second], line_capacity=1)
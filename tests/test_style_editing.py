@@ -0,0 +1,35 @@
+"""款式列表的批量筛选与批量修改"""
+from datetime import date, datetime
+
+import pytest
+
+import production_test as engine
+
+
+def make_style(**fields):
+    return {"sewing_start_date": date(2025, 3, 3), "production_group": "A1", "company": "客户A", **fields}
+
+
+def test_filter_compares_company_and_group_as_text():
+    styles = [
+        make_style(company=None, production_group=1),
+        make_style(company=None, customer="客户B", production_group=None),
+        make_style(sewing_start_date=datetime(2025, 3, 1, 8)),
+    ]
+    assert engine.filter_styles(styles, company="客户B") == [1]
+    assert engine.filter_styles(styles, company="") == [0]
+    assert engine.filter_styles(styles, production_group="1") == [0]
+    assert engine.filter_styles(styles, production_group="") == [1]
+    assert engine.filter_styles(styles, sewing_before=date(2025, 3, 2)) == [2]
+
+
+@pytest.mark.parametrize("changes", [
+    {"production_group": ""},
+    {"production_group": "  "},
+    {"daily_production": True},
+    {"production_order": 0},
+])
+def test_bulk_update_rejects_invalid_changes(changes):
+    styles = [make_style()]
+    with pytest.raises(ValueError):
+        engine.bulk_update_styles(styles, [0], changes)